@@ -0,0 +1,91 @@
+"""Холодное открытие и первый запрос: JSON-индекс против бинарного (mmap).
+
+Запуск из каталога ``scripts/``::
+
+    python benchmarks/bench_index_open.py --docs 5000
+
+Каждый замер выполняется в отдельном процессе, чтобы учесть стоимость
+открытия индекса и прирост резидентной памяти, как у короткоживущего
+MCP-сервера. Память читается из ``/proc/self/statm``, то есть только в Linux.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from bitrix24_docs_etl.binary_index import write_binary_index
+from bitrix24_docs_etl.index import IndexBuilder
+
+WORDS = (
+    "метод сделка контакт задача пользователь поле параметр вебхук событие список добавить обновить "
+    "удалить получить фильтр значение тип строка число дата ответ ошибка пример запрос сущность "
+    "смарт-процесс лид компания воронка стадия счёт товар каталог склад чат бот звонок телефония"
+).split()
+
+PROBE = """
+import json, os, sys, time
+from pathlib import Path
+from bitrix24_docs_etl.binary_index import BinaryIndex
+from bitrix24_docs_etl.index import load_inverted_index
+from bitrix24_docs_etl.search import search_index
+
+def rss_kb():
+    # Текущий (а не пиковый) резидентный объём: /proc/self/statm, в страницах.
+    with open("/proc/self/statm") as handle:
+        return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+path = Path(sys.argv[1])
+before = rss_kb()
+started = time.perf_counter()
+index = BinaryIndex(path) if path.suffix == ".bin" else load_inverted_index(path)
+opened = time.perf_counter()
+search_index(index, sys.argv[2])
+queried = time.perf_counter()
+after = rss_kb()
+print(json.dumps({"open_ms": (opened - started) * 1000, "query_ms": (queried - opened) * 1000,
+                  "rss_delta_mb": (after - before) / 1024}))
+"""
+
+
+def build(docs: int, directory: Path) -> tuple[Path, Path]:
+    rng = random.Random(24)
+    builder = IndexBuilder()
+    for number in range(docs):
+        title = f"crm.item{number}.add"
+        lines = [f"# {' '.join(rng.choices(WORDS, k=4))}"]
+        lines += [" ".join(rng.choices(WORDS, k=14)) + f" FIELD_{rng.randrange(5000)}" for _ in range(30)]
+        builder.add({"slug": f"doc_{number}", "url": f"https://example/{number}", "title": title}, title, "\n".join(lines))
+    index = builder.build()
+    json_path = directory / "inverted_index.json"
+    json_path.write_text(json.dumps(index.to_json(), ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    return json_path, write_binary_index(index, directory / "inverted_index.bin")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--query", default="вебхук field_42")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = build(args.docs, Path(tmpdir))
+        for path in paths:
+            output = subprocess.run(
+                [sys.executable, "-c", PROBE, str(path), args.query], check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output)
+            size_mb = path.stat().st_size / 1024 / 1024
+            print(
+                f"{path.suffix:<6} {size_mb:7.1f} MB  open {result['open_ms']:8.1f} ms  "
+                f"query {result['query_ms']:7.1f} ms  RSS +{result['rss_delta_mb']:.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
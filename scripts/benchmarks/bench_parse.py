@@ -0,0 +1,81 @@
+"""Сравнение однопроходного разбора HTML с прежним трёхкратным.
+
+Запуск из каталога ``scripts/``::
+
+    python benchmarks/bench_parse.py --pages 300
+    python benchmarks/bench_parse.py --corpus data/raw
+
+Без ``--corpus`` используется синтетический корпус страниц, похожих на
+apidocs.bitrix24.ru.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+from markdownify import markdownify
+
+from bitrix24_docs_etl.parse import parse_html
+
+SOURCE_URL = "https://apidocs.bitrix24.ru/api-reference/crm/deals/crm-deal-add.html"
+
+
+def synthetic_page(number: int) -> str:
+    nav = "".join(f'<li><a href="/api-reference/crm/section-{i}.html">Раздел {i}</a></li>' for i in range(60))
+    rows = "".join(
+        f"<tr><td>FIELD_{i}</td><td>string</td><td>Описание поля {i} для метода {number}</td></tr>" for i in range(25)
+    )
+    return f"""<!DOCTYPE html><html><head><title>crm.deal.add #{number}</title>
+<script>window.__data = {{"page": {number}}};</script><style>body {{ color: red; }}</style></head>
+<body><header><a href="/">Bitrix24</a></header><nav><ul>{nav}</ul></nav>
+<main><h1>Добавить сделку crm.deal.add</h1>
+<p>Метод <code>crm.deal.add</code> добавляет сделку. См. <a href="crm-deal-update.html#fields">crm.deal.update</a>.</p>
+<h2>Параметры метода</h2><table><tr><th>Поле</th><th>Тип</th><th>Описание</th></tr>{rows}</table>
+<h2>Пример</h2><pre><code>BX24.callMethod("crm.deal.add", {{ fields: {{ TITLE: "Сделка {number}" }} }});</code></pre>
+</main><footer><a href="/about">О проекте</a></footer></body></html>"""
+
+
+def legacy_parse(html_text: str) -> tuple[str | None, list[str], str, str]:
+    soup = BeautifulSoup(html_text, "lxml")
+    title = soup.title.string.strip() if soup.title and soup.title.string else None
+    soup = BeautifulSoup(html_text, "lxml")
+    links = sorted({urljoin(SOURCE_URL, tag["href"]) for tag in soup.find_all("a", href=True)})
+    soup = BeautifulSoup(html_text, "lxml")
+    for tag in soup(["script", "style", "noscript", "nav", "footer", "header"]):
+        tag.decompose()
+    target = soup.find("main") or soup.body or soup
+    markdown_text = markdownify(str(target), heading_style="ATX")
+    return title, links, markdown_text, target.get_text(" ", strip=True)
+
+
+def measure(label: str, func, pages: list[str]) -> float:
+    started = time.process_time()
+    for html_text in pages:
+        func(html_text)
+    elapsed = time.process_time() - started
+    print(f"{label:<12} {elapsed:8.3f} s CPU  {len(pages) / elapsed:8.1f} стр/с")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200, help="Размер синтетического корпуса")
+    parser.add_argument("--corpus", type=Path, help="Каталог с *.html вместо синтетического корпуса")
+    args = parser.parse_args()
+
+    if args.corpus:
+        pages = [path.read_text(encoding="utf-8") for path in sorted(args.corpus.glob("*.html"))]
+    else:
+        pages = [synthetic_page(number) for number in range(args.pages)]
+
+    legacy = measure("legacy x3", legacy_parse, pages)
+    single = measure("single pass", lambda html_text: parse_html(html_text, SOURCE_URL), pages)
+    print(f"Ускорение: {legacy / single:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Нагрузочный тест сервиса ``bitrix24-docs serve``.
+
+Запуск из каталога ``scripts/`` при работающем сервисе::
+
+    bitrix24-docs serve &
+    python benchmarks/bench_serve.py --concurrency 16 --requests 2000
+
+Клиенты держат соединения открытыми (keep-alive) и по кругу отправляют
+запросы из ``eval/queries.json``. Печатаются пропускная способность и
+перцентили задержки со стороны клиента и со стороны сервиса (``/stats``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from itertools import cycle
+from pathlib import Path
+
+import httpx
+
+QUERIES_FILE = Path(__file__).resolve().parents[1] / "eval" / "queries.json"
+
+
+async def worker(client: httpx.AsyncClient, queries, remaining: list[int], mode: str, latencies: list[float]) -> int:
+    errors = 0
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        query = next(queries)
+        started = time.perf_counter()
+        response = await client.get("/search", params={"q": query, "mode": mode, "limit": 5})
+        latencies.append((time.perf_counter() - started) * 1000)
+        errors += response.status_code != 200
+    return errors
+
+
+async def run(args: argparse.Namespace) -> None:
+    payload = json.loads(QUERIES_FILE.read_text(encoding="utf-8"))
+    queries = cycle([item["query"] for item in payload["queries"]])
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30.0) as client:
+        before = (await client.get("/stats")).json()
+        latencies: list[float] = []
+        remaining = [args.requests]
+        started = time.perf_counter()
+        errors = await asyncio.gather(
+            *(worker(client, queries, remaining, args.mode, latencies) for _ in range(args.concurrency))
+        )
+        elapsed = time.perf_counter() - started
+        server = (await client.get("/stats")).json()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{len(latencies)} запросов, {args.concurrency} соединений, ошибок {sum(errors)}: "
+        f"{len(latencies) / elapsed:.0f} запр/с"
+    )
+    print(f"клиент  p50 {statistics.median(latencies):6.2f} мс  p99 {p99:6.2f} мс  max {latencies[-1]:6.2f} мс")
+    print(
+        f"сервис  p50 {server['p50_ms']:6.2f} мс  p99 {server['p99_ms']:6.2f} мс  max {server['max_ms']:6.2f} мс "
+        f"(запросов с начала теста {server['requests'] - before['requests'] - 1})"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--mode", default="hybrid", choices=("lexical", "dense", "hybrid"))
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Задержка k-NN запроса к векторному индексу (IVF против полного перебора).
+
+Запуск из каталога ``scripts/``::
+
+    python benchmarks/bench_vectors.py --vectors 100000 --dim 256
+
+Векторы синтетические (шум вокруг случайных центров), поэтому измеряется
+только индекс: время запроса без эмбеддинга и recall@10 относительно
+точного перебора.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bitrix24_docs_etl.vectors import VectorIndex, write_vector_index
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int = 500) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, count)] + rng.normal(scale=0.6, size=(count, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def measure(index: VectorIndex, queries: np.ndarray, nprobe: int) -> tuple[list[float], list[set[int]]]:
+    timings: list[float] = []
+    results: list[set[int]] = []
+    for query in queries:
+        started = time.perf_counter()
+        hits = index.nearest(query, 10, nprobe=nprobe)
+        timings.append((time.perf_counter() - started) * 1000)
+        results.append({row for row, _ in hits})
+    return timings, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.vectors, args.dim)
+    records = [{"id": str(row), "key": str(row)} for row in range(args.vectors)]
+    queries = vectors[np.random.default_rng(1).choice(args.vectors, args.queries, replace=False)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        flat_dir = Path(tmp) / "flat"
+        write_vector_index(flat_dir, records, vectors, "bench", nlist=0)
+        flat = VectorIndex(flat_dir)
+        flat_times, exact = measure(flat, queries, args.nprobe)
+        exact_ids = [{flat.units[row]["id"] for row in rows} for rows in exact]
+        print(f"flat        p50 {statistics.median(flat_times):6.2f} мс  p99 {np.percentile(flat_times, 99):6.2f} мс")
+
+        for dtype in ("float16", "int8"):
+            directory = Path(tmp) / dtype
+            started = time.perf_counter()
+            nlist = write_vector_index(directory, records, vectors, "bench", dtype=dtype)
+            build = time.perf_counter() - started
+            index = VectorIndex(directory)
+            times, found = measure(index, queries, args.nprobe)
+            recall = statistics.mean(
+                len({index.units[row]["id"] for row in rows} & truth) / 10 for rows, truth in zip(found, exact_ids)
+            )
+            print(
+                f"ivf {dtype:7} p50 {statistics.median(times):6.2f} мс  p99 {np.percentile(times, 99):6.2f} мс  "
+                f"recall@10 {recall:.3f}  nlist {nlist}, сборка {build:.1f} с"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""Замеры производительности конвейера на синтетическом корпусе.
+
+``run_bench`` генерирует N HTML-страниц, похожих на apidocs.bitrix24.ru, и
+N Markdown-файлов в раскладке b24restdocs, отдаёт страницы локальным
+HTTP-сервером и меряет этапы: обход, сохранение, нормализацию, импорт
+Markdown и построение индекса. Этапы запускаются в отдельных процессах со
+своим каталогом данных (``BITRIX24_DOCS_DATA_DIR``): так пиковый RSS
+относится к этапу, а не ко всему прогону, а сервер не тратит процессорное
+время замеряемого процесса. Обход и сохранение идут в одном процессе —
+сохранению нужны загруженные страницы.
+
+Отчёт — JSON со временем, процессорным временем, пиковым RSS и скоростью
+каждого этапа; ``compare_baseline`` сравнивает его с сохранённым эталоном.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterator, Mapping, Sequence
+
+from . import storage
+
+if TYPE_CHECKING:
+    from .fetch import FetchResult
+
+# Этапы конвейера, HTTP-сервер и subprocess импортируются в функциях:
+# CLI читает отсюда только константы для своих опций.
+
+BENCH_VERSION = 1
+BENCH_SIZES = (100, 1000, 10_000)
+BENCH_STAGES = ("crawl", "persist", "normalize", "ingest_markdown", "index")
+# Этапы, которые выполняются в одном процессе.
+BENCH_GROUPS = (("crawl", "persist"), ("normalize",), ("ingest_markdown",), ("index",))
+BENCH_WORKERS = 8
+# Допустимое ухудшение скорости и рост пикового RSS относительно эталона.
+BENCH_TOLERANCE = 0.25
+# Скорость этапов короче этого (в эталоне) не сравнивается: слишком шумно.
+BENCH_MIN_SECONDS = 0.1
+BASELINE_FILE = storage.BASE_DIR / "benchmarks" / "pipeline_baseline.json"
+DOCS_PER_SECTION = 100
+
+
+@dataclass(slots=True)
+class StageResult:
+    size: int
+    stage: str
+    # Сколько документов этап обработал: индекс видит и HTML, и Markdown.
+    docs: int
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss_mb: float
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.docs / self.wall_seconds if self.wall_seconds else 0.0
+
+    def to_dict(self) -> dict[str, object]:
+        return {**asdict(self), "docs_per_second": round(self.docs_per_second, 1)}
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> StageResult:
+        return cls(**{name: data[name] for name in cls.__dataclass_fields__})  # type: ignore[arg-type]
+
+
+@dataclass(slots=True)
+class BenchReport:
+    results: list[StageResult] = field(default_factory=list)
+    python: str = field(default_factory=platform.python_version)
+    machine: str = field(default_factory=platform.platform)
+    cpus: int = field(default_factory=lambda: os.cpu_count() or 1)
+    created_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "version": BENCH_VERSION,
+            "python": self.python,
+            "machine": self.machine,
+            "cpus": self.cpus,
+            "created_at": self.created_at,
+            "results": [result.to_dict() for result in self.results],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> BenchReport:
+        if data.get("version") != BENCH_VERSION:
+            raise ValueError(f"Неподдерживаемая версия отчёта: {data.get('version')}")
+        return cls(
+            results=[StageResult.from_dict(item) for item in data["results"]],  # type: ignore[union-attr]
+            python=str(data["python"]),
+            machine=str(data["machine"]),
+            cpus=int(data["cpus"]),  # type: ignore[arg-type]
+            created_at=str(data["created_at"]),
+        )
+
+
+@dataclass(slots=True)
+class Regression:
+    size: int
+    stage: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        """Относительное изменение метрики: −0.3 — на 30% меньше эталона."""
+
+        return self.current / self.baseline - 1 if self.baseline else 0.0
+
+
+def load_report(path: Path) -> BenchReport:
+    return BenchReport.from_dict(json.loads(path.read_text(encoding="utf-8")))
+
+
+def save_report(report: BenchReport, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report.to_dict(), ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def compare_baseline(report: BenchReport, baseline: BenchReport, tolerance: float = BENCH_TOLERANCE) -> list[Regression]:
+    """Этапы, где скорость упала или пиковый RSS вырос больше чем на ``tolerance``.
+
+    Размеры корпуса, которых нет в эталоне, не сравниваются; скорость — только
+    для этапов не короче ``BENCH_MIN_SECONDS``.
+    """
+
+    expected = {(result.size, result.stage): result for result in baseline.results}
+    regressions: list[Regression] = []
+    for result in report.results:
+        reference = expected.get((result.size, result.stage))
+        if reference is None:
+            continue
+        if (
+            reference.wall_seconds >= BENCH_MIN_SECONDS
+            and result.docs_per_second < reference.docs_per_second * (1 - tolerance)
+        ):
+            regressions.append(
+                Regression(result.size, result.stage, "docs_per_second", reference.docs_per_second, result.docs_per_second)
+            )
+        if result.peak_rss_mb > reference.peak_rss_mb * (1 + tolerance):
+            regressions.append(Regression(result.size, result.stage, "peak_rss_mb", reference.peak_rss_mb, result.peak_rss_mb))
+    return regressions
+
+
+def run_bench(
+    sizes: Sequence[int] = BENCH_SIZES,
+    workers: int = BENCH_WORKERS,
+    progress: Callable[[int, str], None] | None = None,
+) -> BenchReport:
+    """Прогоняет все этапы на корпусах заданных размеров во временных каталогах."""
+
+    import tempfile
+
+    report = BenchReport()
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="bitrix24-bench-") as tmp:
+            data_dir = Path(tmp) / "data"
+            repo_path = Path(tmp) / "synthetic"
+            write_markdown_corpus(repo_path, size)
+            with serve_pages(synthetic_site(size)) as base_url:
+                for group in BENCH_GROUPS:
+                    if progress is not None:
+                        progress(size, "+".join(group))
+                    report.results.extend(_run_group(group, size, base_url, repo_path, data_dir, workers))
+    return report
+
+
+def synthetic_site(size: int) -> dict[str, bytes]:
+    """Ровно ``size`` страниц: главная → разделы → страницы методов."""
+
+    sections = max(1, min(size - 1, size // DOCS_PER_SECTION))
+    section_paths = [f"/api-reference/section-{number}/" for number in range(sections)]
+    methods: list[list[str]] = [[] for _ in range(sections)]
+    for number in range(size - 1 - sections):
+        methods[number % sections].append(f"{section_paths[number % sections]}method-{number}.html")
+
+    site = {"/": _html_page("REST API Bitrix24", section_paths, section_paths, "Справочник методов REST API.")}
+    for number, (path, children) in enumerate(zip(section_paths, methods)):
+        site[path] = _html_page(f"Раздел {number}", section_paths, children, f"Методы раздела {number}.")
+    for children in methods:
+        for position, path in enumerate(children):
+            method = path.rsplit("/", 1)[-1].removesuffix(".html")
+            neighbours = children[max(0, position - 2) : position] + children[position + 1 : position + 3]
+            site[path] = _html_page(f"crm.{method}.add", section_paths, neighbours, _method_body(method))
+    return {path: html.encode("utf-8") for path, html in site.items()}
+
+
+def write_markdown_corpus(repo_path: Path, size: int) -> None:
+    """``size`` Markdown-файлов в ``api-reference/`` и ``tutorials/``, как в b24restdocs."""
+
+    for number in range(size):
+        folder = "tutorials" if number % 10 == 9 else f"api-reference/section-{number // DOCS_PER_SECTION}"
+        path = repo_path / folder / f"method-{number}.md"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(_markdown_page(number), encoding="utf-8")
+
+
+@contextmanager
+def serve_pages(pages: Mapping[str, bytes]) -> Iterator[str]:
+    """Локальный HTTP-сервер с keep-alive; возвращает базовый URL."""
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class CorpusHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:  # noqa: N802
+            body = pages.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # noqa: A002
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CorpusHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _html_page(title: str, nav: Sequence[str], links: Sequence[str], body: str) -> str:
+    nav_items = "".join(f'<li><a href="{path}">{path.strip("/").rsplit("/", 1)[-1]}</a></li>' for path in nav[:60])
+    anchors = "".join(f'<li><a href="{path}">{path.rsplit("/", 1)[-1]}</a></li>' for path in links)
+    return f"""<!DOCTYPE html><html><head><title>{title}</title>
+<script>window.__data = {{"title": "{title}"}};</script><style>body {{ color: #333; }}</style></head>
+<body><header><a href="/">Bitrix24</a></header><nav><ul>{nav_items}</ul></nav>
+<main><h1>{title}</h1>{body}<h2>См. также</h2><ul>{anchors}</ul></main>
+<footer><a href="https://example.com/about">О проекте</a></footer></body></html>"""
+
+
+def _method_body(method: str) -> str:
+    rows = "".join(
+        f"<tr><td>FIELD_{i}</td><td>string</td><td>Описание поля {i} для метода {method}</td></tr>" for i in range(25)
+    )
+    return f"""<p>Метод <code>crm.{method}.add</code> добавляет запись. Права доступа: CRM.</p>
+<h2>Параметры метода</h2><table><tr><th>Поле</th><th>Тип</th><th>Описание</th></tr>{rows}</table>
+<h2>Пример</h2><pre><code>BX24.callMethod("crm.{method}.add", {{ fields: {{ TITLE: "{method}" }} }});</code></pre>"""
+
+
+def _markdown_page(number: int) -> str:
+    rows = "\n".join(f"| FIELD_{i} | string | Описание поля {i} для метода {number} |" for i in range(25))
+    return f"""# Добавить запись crm.item{number}.add
+
+> Scope: [`crm`](../../scopes/permissions.md) | Кто может выполнять метод: пользователь с правами на CRM
+
+Метод `crm.item{number}.add` добавляет запись в раздел {number // DOCS_PER_SECTION}.
+
+## Параметры метода
+
+| Название | Тип | Описание |
+|----------|-----|----------|
+{rows}
+
+## Пример
+
+```js
+BX24.callMethod("crm.item{number}.add", {{ fields: {{ TITLE: "Запись {number}" }} }});
+```
+"""
+
+
+def _run_group(
+    group: Sequence[str], size: int, base_url: str, repo_path: Path, data_dir: Path, workers: int
+) -> list[StageResult]:
+    import subprocess
+
+    env = {
+        **os.environ,
+        "BITRIX24_DOCS_DATA_DIR": str(data_dir),
+        "BITRIX24_DOCS_STORE": storage.STORE_BACKEND,
+        "BITRIX24_DOCS_STORE_HTML": "1" if storage.STORE_HTML_IN_DB else "0",
+    }
+    command = [
+        sys.executable, "-m", __name__, *group,
+        "--size", str(size), "--base-url", base_url, "--repo", str(repo_path), "--workers", str(workers),
+    ]  # fmt: skip
+    completed = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True)
+    return [StageResult.from_dict(item) for item in json.loads(completed.stdout)]
+
+
+def _measure(stage: str, size: int, func: Callable[[], int]) -> StageResult:
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    docs = func()
+    return StageResult(
+        size=size,
+        stage=stage,
+        docs=docs,
+        wall_seconds=round(time.perf_counter() - wall_started, 4),
+        cpu_seconds=round(time.process_time() - cpu_started, 4),
+        peak_rss_mb=round(_peak_rss_mb(), 1),
+    )
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss в Linux наследуется от родителя через fork/exec, а VmHWM —
+    # пик именно этого процесса.
+    try:
+        for line in Path("/proc/self/status").read_text(encoding="ascii").splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_stages(stages: Sequence[str], size: int, base_url: str, repo_path: Path, workers: int) -> list[StageResult]:
+    import asyncio
+
+    from .crawl import BitrixCrawler
+    from .github_ingest import import_local_docs
+    from .index import build_simple_index
+    from .normalize import normalize_all
+
+    fetched: list[FetchResult] = []
+
+    def crawl() -> int:
+        crawler = BitrixCrawler(base_url, max_pages=size, max_depth=2, workers=workers)
+        result = asyncio.run(crawler.crawl([None]))
+        fetched.extend(result.raw_pages.values())
+        return result.stats.fetched
+
+    runners: dict[str, Callable[[], int]] = {
+        "crawl": crawl,
+        "persist": lambda: len(storage.persist_fetch_results(fetched)),
+        "normalize": lambda: normalize_all().processed,
+        "ingest_markdown": lambda: import_local_docs(repo_path, workers=workers).imported,
+        "index": lambda: build_simple_index().documents,
+    }
+    try:
+        return [_measure(stage, size, runners[stage]) for stage in stages]
+    finally:
+        storage.close_store()
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Точка входа дочернего процесса: печатает результаты этапов JSON-ом."""
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("stages", nargs="+", choices=BENCH_STAGES)
+    parser.add_argument("--size", type=int, required=True)
+    parser.add_argument("--base-url", required=True)
+    parser.add_argument("--repo", type=Path, required=True)
+    parser.add_argument("--workers", type=int, default=BENCH_WORKERS)
+    args = parser.parse_args(argv)
+    results = _run_stages(args.stages, args.size, args.base_url, args.repo, args.workers)
+    print(json.dumps([result.to_dict() for result in results]))
+
+
+if __name__ == "__main__":
+    main()
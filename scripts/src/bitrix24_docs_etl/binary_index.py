@@ -0,0 +1,268 @@
+"""Компактный бинарный формат инвертированного индекса с доступом через mmap.
+
+Файл открывается без чтения целиком: при открытии разбирается только
+заголовок, а словарь термов, постинги и карточки документов декодируются по
+мере обращения. Память процесса растёт с числом затронутых термов, а не с
+размером корпуса.
+
+Структура файла (все смещения абсолютные, little-endian)::
+
+    заголовок   HEADER
+    term_table  uint32[term_count]    смещения записей словаря
+    terms       varint len, bytes, varint df, varint postings_off/len, positions_off/len
+    postings    по документу: varint Δdoc_id, tf_title, tf_headings, tf_body
+    positions   по документу: varint count, Δпозиции
+    doc_table   uint32[doc_count + 1] смещения карточек документов
+    lengths     uint32[doc_count * 3] длины полей
+    docs        JSON-карточки документов (UTF-8)
+
+Термы отсортированы по байтам UTF-8, поиск терма — двоичный по term_table.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+import weakref
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterator, Mapping, Sequence
+
+if TYPE_CHECKING:
+    from .index import InvertedIndex
+
+MAGIC = b"B24IDX\x00\x01"
+HEADER = struct.Struct("<8sIII3d8Q")
+_U32 = struct.Struct("<I")
+_LENGTHS = struct.Struct("<3I")
+
+
+class BinaryIndex:
+    """Индекс, открытый через mmap; реализует тот же интерфейс, что ``InvertedIndex``."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = path.open("rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        # mmap и файл закрываются и тогда, когда индекс просто перестали
+        # использовать (например, открыто новое поколение сегментов).
+        self._finalizer = weakref.finalize(self, _release, self._mm, self._file)
+        header = HEADER.unpack_from(self._mm, 0)
+        if header[0] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} не является бинарным индексом Bitrix24")
+        self._doc_count, self._term_count = header[1], header[2]
+        averages = header[4:7]
+        (
+            self._term_table,
+            self._terms,
+            self._postings,
+            self._positions,
+            self._doc_table,
+            self._lengths,
+            self._docs,
+            _end,
+        ) = header[7:]
+        self.avg_field_lengths = tuple(averages)
+        self._documents: dict[int, Mapping[str, object]] = {}
+        self._postings_cache: dict[tuple[str, bool], list[list]] = {}
+
+    def __enter__(self) -> "BinaryIndex":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._finalizer()
+
+    @property
+    def doc_count(self) -> int:
+        return self._doc_count
+
+    @property
+    def term_count(self) -> int:
+        return self._term_count
+
+    def terms(self) -> Iterator[str]:
+        for ordinal in range(self._term_count):
+            yield self._term_entry(ordinal)[0].decode("utf-8")
+
+    def postings(self, term: str, positions: bool = True) -> Sequence[list]:
+        key = (term, positions)
+        cached = self._postings_cache.get(key)
+        if cached is not None:
+            return cached
+        entry = self._lookup(term.encode("utf-8"))
+        if entry is None:
+            return ()
+        _, df, postings_offset, postings_length, positions_offset, positions_length = entry
+        numbers = _decode_varints(self._mm, self._postings + postings_offset, postings_length)
+        result: list[list] = []
+        doc_id = 0
+        for index in range(df):
+            doc_id += numbers[index * 4]
+            result.append([doc_id, numbers[index * 4 + 1], numbers[index * 4 + 2], numbers[index * 4 + 3]])
+        if positions:
+            stream = _decode_varints(self._mm, self._positions + positions_offset, positions_length)
+            cursor = 0
+            for posting in result:
+                count = stream[cursor]
+                deltas = stream[cursor + 1 : cursor + 1 + count]
+                cursor += count + 1
+                absolute: list[int] = []
+                current = 0
+                for delta in deltas:
+                    current += delta
+                    absolute.append(current)
+                posting.append(absolute)
+        self._postings_cache[key] = result
+        return result
+
+    def document(self, doc_id: int) -> Mapping[str, object]:
+        document = self._documents.get(doc_id)
+        if document is None:
+            start, end = struct.unpack_from("<2I", self._mm, self._doc_table + doc_id * 4)
+            document = json.loads(self._mm[self._docs + start : self._docs + end])
+            self._documents[doc_id] = document
+        return document
+
+    def field_lengths(self, doc_id: int) -> Sequence[int]:
+        return _LENGTHS.unpack_from(self._mm, self._lengths + doc_id * _LENGTHS.size)
+
+    def _lookup(self, term: bytes) -> tuple | None:
+        low, high = 0, self._term_count - 1
+        while low <= high:
+            middle = (low + high) // 2
+            entry = self._term_entry(middle)
+            if entry[0] == term:
+                return entry
+            if entry[0] < term:
+                low = middle + 1
+            else:
+                high = middle - 1
+        return None
+
+    def _term_entry(self, ordinal: int) -> tuple:
+        offset = self._terms + _U32.unpack_from(self._mm, self._term_table + ordinal * 4)[0]
+        length, offset = _read_varint(self._mm, offset)
+        term = self._mm[offset : offset + length]
+        offset += length
+        values = []
+        for _ in range(5):
+            value, offset = _read_varint(self._mm, offset)
+            values.append(value)
+        return (term, *values)
+
+
+def write_binary_index(index: "InvertedIndex", path: Path) -> Path:
+    """Сохраняет ``InvertedIndex`` в бинарном формате (атомарно, через временный файл)."""
+
+    encoded_terms = sorted((term.encode("utf-8"), term) for term in index.terms())
+    term_table = bytearray()
+    terms = bytearray()
+    postings = bytearray()
+    positions = bytearray()
+    for encoded, term in encoded_terms:
+        term_postings = index.postings(term)
+        postings_start, positions_start = len(postings), len(positions)
+        previous = 0
+        for doc_id, tf_title, tf_headings, tf_body, term_positions in term_postings:
+            _write_varints(postings, (doc_id - previous, tf_title, tf_headings, tf_body))
+            previous = doc_id
+            _write_varint(positions, len(term_positions))
+            last = 0
+            for position in term_positions:
+                _write_varint(positions, position - last)
+                last = position
+        term_table += _U32.pack(len(terms))
+        _write_varint(terms, len(encoded))
+        terms += encoded
+        _write_varints(
+            terms,
+            (
+                len(term_postings),
+                postings_start,
+                len(postings) - postings_start,
+                positions_start,
+                len(positions) - positions_start,
+            ),
+        )
+
+    doc_table = bytearray()
+    lengths = bytearray()
+    docs = bytearray()
+    for doc_id in range(index.doc_count):
+        document = {key: value for key, value in index.document(doc_id).items() if key != "lengths"}
+        doc_table += _U32.pack(len(docs))
+        docs += json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        lengths += _LENGTHS.pack(*index.field_lengths(doc_id))
+    doc_table += _U32.pack(len(docs))
+
+    sections = [term_table, terms, postings, positions, doc_table, lengths, docs]
+    offsets = []
+    cursor = HEADER.size
+    for section in sections:
+        offsets.append(cursor)
+        cursor += len(section)
+    header = HEADER.pack(
+        MAGIC,
+        index.doc_count,
+        len(encoded_terms),
+        len(index.avg_field_lengths),
+        *index.avg_field_lengths,
+        *offsets,
+        cursor,
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with tmp_path.open("wb") as handle:
+        handle.write(header)
+        for section in sections:
+            handle.write(section)
+    tmp_path.replace(path)
+    return path
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _write_varints(buffer: bytearray, values: Sequence[int]) -> None:
+    for value in values:
+        _write_varint(buffer, value)
+
+
+def _read_varint(data: mmap.mmap, offset: int) -> tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def _decode_varints(data: mmap.mmap, offset: int, length: int) -> list[int]:
+    values: list[int] = []
+    result = 0
+    shift = 0
+    for byte in data[offset : offset + length]:
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            values.append(result)
+            result = 0
+            shift = 0
+        else:
+            shift += 7
+    return values
+
+
+def _release(mm: mmap.mmap, file: BinaryIO) -> None:
+    mm.close()
+    file.close()
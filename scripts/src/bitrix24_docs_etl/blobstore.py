@@ -0,0 +1,268 @@
+"""Хранилище сжатых блобов с адресацией по содержимому.
+
+Блоб — файл ``<каталог>/<первые 2 символа>/<sha256>`` с телом, сжатым zlib
+(или zstd, нужен пакет ``zstandard``: ``pip install -e .[zstd]``). Имя — хэш
+несжатого содержимого, поэтому одинаковые страницы (варианты URL с разными
+query-строками, зеркальные разделы) хранятся один раз, а повторная запись
+того же содержимого ничего не пишет на диск.
+
+Первая строка файла — кодек и идентификатор словаря, затем сжатые данные.
+Словарь — типовые фрагменты разметки сайта (шапка, меню, подвал), которые
+есть почти в каждой странице; с ним сжатие страниц одного шаблона заметно
+лучше. Словари лежат в ``dictionaries/<id>.dict`` и не меняются: блоб,
+сжатый со старым словарём, читается, пока жив этот словарь. Текущий словарь
+(им сжимаются новые блобы) указан в ``dictionaries/current``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from . import metrics
+
+if TYPE_CHECKING:
+    import zstandard
+
+CODECS = ("zlib", "zstd")
+DEFAULT_CODEC = "zlib"
+# Уровень 6 сжимает HTML почти как 9, но заметно быстрее.
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 6
+# zlib видит назад не больше 32 КБ, поэтому больший словарь бесполезен.
+DICTIONARY_SIZE = 32 * 1024
+DICTIONARY_SAMPLES = 200
+# Фрагмент попадает в словарь, если он есть хотя бы в этой доле страниц выборки.
+DICTIONARY_MIN_SHARE = 0.5
+DICTIONARY_DIR_NAME = "dictionaries"
+_NO_DICTIONARY = "-"
+# Текст до тега вместе с тегом: так шаблон режется на повторяющиеся куски.
+_FRAGMENT = re.compile(rb"[^<]*<[^>]*>")
+
+
+@dataclass(slots=True)
+class BlobStats:
+    stored: int = 0
+    deduplicated: int = 0
+    bytes_in: int = 0
+    bytes_written: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """Во сколько раз записано меньше, чем пришло (с учётом дедупликации)."""
+
+        return self.bytes_in / self.bytes_written if self.bytes_written else 0.0
+
+
+class BlobStore:
+    """Сжатые неизменяемые блобы по SHA-256 содержимого."""
+
+    def __init__(self, directory: Path, codec: str = DEFAULT_CODEC) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"Неизвестный кодек: {codec}")
+        if codec == "zstd":
+            _require_zstd()
+        self.directory = directory
+        self.codec = codec
+        self.stats = BlobStats()
+        self._dictionaries: dict[str, bytes] = {}
+        self._current: str | None = None
+        self._current_loaded = False
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def put(self, data: bytes, digest: str | None = None) -> str:
+        """Сохраняет данные, если такого блоба ещё нет; возвращает его хэш."""
+
+        digest = digest or self.digest(data)
+        self.stats.bytes_in += len(data)
+        if self.exists(digest):
+            self.stats.deduplicated += 1
+            return digest
+        self._write(digest, data)
+        self.stats.stored += 1
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Распакованное содержимое блоба; ``FileNotFoundError``, если его нет."""
+
+        header, _, payload = self.path(digest).read_bytes().partition(b"\n")
+        codec, dictionary_id = header.decode("ascii").split(" ")
+        dictionary = self._dictionary(dictionary_id)
+        if codec == "zlib":
+            decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+            return decompressor.decompress(payload) + decompressor.flush()
+        if codec == "zstd":
+            return _zstd_decompressor(dictionary).decompress(payload)
+        raise ValueError(f"Неизвестный кодек блоба {digest}: {codec}")
+
+    def recompress(self, digest: str) -> bool:
+        """Пересжимает блоб текущим кодеком и словарём; ``True``, если файл переписан."""
+
+        header = self._header()
+        with self.path(digest).open("rb") as handle:
+            if handle.readline() == header:
+                return False
+        self._write(digest, self.get(digest))
+        return True
+
+    def iter_digests(self) -> Iterator[str]:
+        if not self.directory.exists():
+            return
+        for bucket in sorted(self.directory.iterdir()):
+            if bucket.is_dir() and bucket.name != DICTIONARY_DIR_NAME:
+                yield from sorted(path.name for path in bucket.iterdir() if not path.name.endswith(".tmp"))
+
+    def prune(self, keep: Iterable[str]) -> int:
+        """Удаляет блобы, на которые больше никто не ссылается, и неиспользуемые словари."""
+
+        keep = set(keep)
+        removed = 0
+        used_dictionaries = {self.current_dictionary()}
+        for digest in list(self.iter_digests()):
+            path = self.path(digest)
+            if digest in keep:
+                with path.open("rb") as handle:
+                    used_dictionaries.add(handle.readline().split()[1].decode("ascii"))
+                continue
+            path.unlink()
+            removed += 1
+        for path in self._dictionary_dir().glob("*.dict"):
+            if path.stem not in used_dictionaries:
+                path.unlink()
+                self._dictionaries.pop(path.stem, None)
+        return removed
+
+    def disk_usage(self) -> int:
+        if not self.directory.exists():
+            return 0
+        return sum(path.stat().st_size for path in self.directory.rglob("*") if path.is_file())
+
+    def current_dictionary(self) -> str | None:
+        if not self._current_loaded:
+            pointer = self._dictionary_dir() / "current"
+            self._current = pointer.read_text(encoding="ascii").strip() if pointer.exists() else None
+            self._current_loaded = True
+        return self._current
+
+    def set_dictionary(self, dictionary: bytes) -> str:
+        """Делает словарь текущим для новых блобов; возвращает его идентификатор."""
+
+        dictionary_id = hashlib.sha256(dictionary).hexdigest()[:16]
+        directory = self._dictionary_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{dictionary_id}.dict"
+        if not path.exists():
+            _write_atomic(path, dictionary)
+        _write_atomic(directory / "current", dictionary_id.encode("ascii"))
+        self._dictionaries[dictionary_id] = dictionary
+        self._current, self._current_loaded = dictionary_id, True
+        return dictionary_id
+
+    def _write(self, digest: str, data: bytes) -> None:
+        dictionary = self._dictionary(self.current_dictionary() or _NO_DICTIONARY)
+        if self.codec == "zstd":
+            payload = _zstd_compressor(dictionary).compress(data)
+        else:
+            compressor = zlib.compressobj(ZLIB_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(ZLIB_LEVEL)
+            payload = compressor.compress(data) + compressor.flush()
+        content = self._header() + payload
+        path = self.path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with metrics.timer("disk_write"):
+            _write_atomic(path, content)
+        metrics.record_written(len(content))
+        self.stats.bytes_written += len(content)
+
+    def _header(self) -> bytes:
+        return f"{self.codec} {self.current_dictionary() or _NO_DICTIONARY}\n".encode("ascii")
+
+    def _dictionary(self, dictionary_id: str) -> bytes | None:
+        if dictionary_id == _NO_DICTIONARY:
+            return None
+        if dictionary_id not in self._dictionaries:
+            self._dictionaries[dictionary_id] = (self._dictionary_dir() / f"{dictionary_id}.dict").read_bytes()
+        return self._dictionaries[dictionary_id]
+
+    def _dictionary_dir(self) -> Path:
+        return self.directory / DICTIONARY_DIR_NAME
+
+
+def build_dictionary(samples: Iterable[bytes], size: int = DICTIONARY_SIZE) -> bytes:
+    """Словарь из фрагментов разметки, общих для большинства страниц выборки.
+
+    Фрагменты идут в порядке первой страницы, где они встретились: в этом
+    порядке они стоят и в шаблоне, так что совпадения получаются длиннее.
+    Если общего больше ``size``, отбрасываются самые редкие фрагменты.
+    """
+
+    counts: Counter[bytes] = Counter()
+    order: dict[bytes, int] = {}
+    pages = 0
+    for sample in samples:
+        pages += 1
+        fragments = _FRAGMENT.findall(sample)
+        counts.update(set(fragments))
+        for fragment in fragments:
+            order.setdefault(fragment, len(order))
+    threshold = max(2, pages * DICTIONARY_MIN_SHARE)
+    common = [fragment for fragment, count in counts.items() if count >= threshold]
+    common.sort(key=lambda fragment: (-counts[fragment], order[fragment]))
+    chosen: list[bytes] = []
+    total = 0
+    for fragment in common:
+        if total + len(fragment) <= size:
+            chosen.append(fragment)
+            total += len(fragment)
+    chosen.sort(key=order.__getitem__)
+    return b"".join(chosen)
+
+
+def _write_atomic(path: Path, content: bytes) -> None:
+    # Блоб с этим именем мог записать параллельный процесс: замена безопасна,
+    # содержимое то же.
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(content)
+    tmp_path.replace(path)
+
+
+def _require_zstd() -> None:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError("Для кодека zstd нужен пакет zstandard: pip install -e .[zstd]") from exc
+
+
+def _zstd_compressor(dictionary: bytes | None) -> zstandard.ZstdCompressor:
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_zstd_dictionary(dictionary))
+
+
+def _zstd_decompressor(dictionary: bytes | None) -> zstandard.ZstdDecompressor:
+    _require_zstd()
+    import zstandard
+
+    return zstandard.ZstdDecompressor(dict_data=_zstd_dictionary(dictionary))
+
+
+def _zstd_dictionary(dictionary: bytes | None) -> zstandard.ZstdCompressionDict | None:
+    import zstandard
+
+    if dictionary is None:
+        return None
+    return zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
@@ -0,0 +1,173 @@
+"""Контрольные точки обхода: продолжение после прерывания.
+
+Снимок (``path``) хранит состояние BFS на начало текущего уровня: глубину,
+список путей уровня и множество посещённых до него URL. Он переписывается
+атомарно только в начале уровня и при прерывании — между уровнями, когда
+загрузки не идут. Статус каждой обработанной страницы дописывается строкой
+в журнал ``<имя>.journal.jsonl``: загруженные — с заголовком и ссылками,
+чтобы при продолжении построить следующий уровень без повторной загрузки,
+неудачные — чтобы попробовать их снова. Журнал сбрасывается на диск каждые
+``every`` страниц, поэтому после прерывания повторяется не больше ``every``
+страниц, а запись стоит O(1) на страницу, а не переписывание всего состояния.
+
+Страница считается обработанной, когда её принял ``sink`` краулера, то есть
+уже сохранена; без ``sink`` контрольная точка помнит только список страниц.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, TextIO
+
+CHECKPOINT_VERSION = 2
+CHECKPOINT_EVERY = 100
+
+FETCHED = "fetched"
+FAILED = "failed"
+
+
+@dataclass(slots=True)
+class CrawlCheckpoint:
+    path: Path
+    every: int = CHECKPOINT_EVERY
+    base_url: str = ""
+    max_depth: int = 0
+    depth: int = 0
+    level: list[str | None] = field(default_factory=list)
+    visited: set[str] = field(default_factory=set)
+    # URL-ключ → {"status", "url", "title", "links"}.
+    pages: dict[str, dict[str, object]] = field(default_factory=dict)
+    resumed: bool = False
+    saves: int = 0
+    _pending: int = 0
+    _journal: TextIO | None = None
+    # Журнал текущего обхода уже начат: дописывать, а не начинать заново.
+    _journal_started: bool = False
+
+    @classmethod
+    def load(cls, path: Path, every: int = CHECKPOINT_EVERY) -> CrawlCheckpoint | None:
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия контрольной точки: {data.get('version')}")
+        checkpoint = cls(
+            path=path,
+            every=every,
+            base_url=data["base_url"],
+            max_depth=data["max_depth"],
+            depth=data["depth"],
+            level=data["level"],
+            visited=set(data["visited"]),
+            resumed=True,
+            _journal_started=True,
+        )
+        checkpoint.pages = _read_journal(checkpoint.journal_path)
+        return checkpoint
+
+    @property
+    def journal_path(self) -> Path:
+        return self.path.with_name(f"{self.path.stem}.journal.jsonl")
+
+    def check(self, base_url: str, max_depth: int) -> None:
+        """Продолжать можно только тот же обход."""
+
+        if (self.base_url, self.max_depth) != (base_url, max_depth):
+            raise ValueError(
+                f"Контрольная точка {self.path} сделана для {self.base_url} с глубиной {self.max_depth}, "
+                f"а не для {base_url} с глубиной {max_depth}"
+            )
+
+    def fetched(self) -> Iterable[tuple[str, dict[str, object]]]:
+        return ((key, page) for key, page in self.pages.items() if page["status"] == FETCHED)
+
+    def done(self, key: str) -> dict[str, object] | None:
+        page = self.pages.get(key)
+        return page if page is not None and page["status"] == FETCHED else None
+
+    def start_level(self, depth: int, level: list[str | None], visited: set[str]) -> None:
+        self.depth = depth
+        self.level = list(level)
+        self.visited = set(visited)
+        self.save()
+
+    def record(self, key: str, url: str, title: str | None = None, links: Iterable[str] = (), failed: bool = False) -> None:
+        page: dict[str, object] = {
+            "status": FAILED if failed else FETCHED,
+            "url": url,
+            "title": title,
+            "links": list(links),
+        }
+        self.pages[key] = page
+        self._open_journal().write(json.dumps({"key": key, **page}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._pending += 1
+        if self._pending >= self.every:
+            self._flush()
+
+    def save(self) -> None:
+        """Сбрасывает журнал и атомарно переписывает снимок уровня."""
+
+        if self._journal_started:
+            self._flush()
+        else:
+            # Новый обход: журнал прошлого, незавершённого, к нему не относится.
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.journal_path.write_bytes(b"")
+            self._journal_started = True
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "base_url": self.base_url,
+            "max_depth": self.max_depth,
+            "depth": self.depth,
+            "level": self.level,
+            "visited": sorted(self.visited),
+        }
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        tmp_path.replace(self.path)
+        self.saves += 1
+
+    def close(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self._pending = 0
+
+    def clear(self) -> None:
+        """Удаляет снимок и журнал после успешного завершения обхода."""
+
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self.journal_path.unlink(missing_ok=True)
+
+    def _open_journal(self) -> TextIO:
+        if self._journal is None:
+            if not self._journal_started:
+                self.save()
+            self._journal = self.journal_path.open("a", encoding="utf-8")
+        return self._journal
+
+    def _flush(self) -> None:
+        if self._journal is not None:
+            self._journal.flush()
+        self._pending = 0
+
+
+def _read_journal(path: Path) -> dict[str, dict[str, object]]:
+    pages: dict[str, dict[str, object]] = {}
+    if not path.exists():
+        return pages
+    data = path.read_bytes()
+    complete = data[: data.rfind(b"\n") + 1]
+    if len(complete) != len(data):
+        # Строка, оборванная при аварийном завершении: отрезаем, чтобы
+        # дописывать журнал дальше с целой строки.
+        with path.open("r+b") as handle:
+            handle.truncate(len(complete))
+    for line in complete.decode("utf-8").splitlines():
+        record = json.loads(line)
+        pages[record.pop("key")] = record
+    return pages
@@ -0,0 +1,233 @@
+"""Разбиение нормализованного Markdown на фрагменты по заголовкам.
+
+Каждый заголовок открывает фрагмент, который длится до следующего заголовка
+любого уровня, поэтому разделы метода, таблицы параметров и примеры кода
+попадают в отдельные фрагменты. У фрагмента есть стабильный идентификатор
+``<slug>#<якорь>``, якорь для ссылки на раздел страницы и ссылка на
+родительский раздел. Слишком длинные разделы делятся по абзацам, при этом
+таблицы и блоки кода не разрываются.
+
+Фрагменты документа лежат в ``processed/chunks/<slug>.jsonl``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import time
+from dataclasses import asdict, dataclass, field
+
+from . import metrics
+from .storage import ProcessedDocument, load_chunk_hash, load_processed_documents, prune_chunks, save_chunks
+
+CHUNK_MAX_CHARS = 2000
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_ANCHOR_ATTR_RE = re.compile(r"\s*\{#([\w\-.]+)\}\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_ANCHOR_DROP_RE = re.compile(r"[^\w\- ]+", re.UNICODE)
+
+
+@dataclass(slots=True)
+class Chunk:
+    id: str
+    slug: str
+    url: str
+    title: str | None
+    heading: str | None
+    heading_path: list[str]
+    level: int
+    anchor: str
+    parent: str | None
+    position: int
+    kind: str
+    markdown: str
+    part: int = 1
+
+    def to_dict(self) -> dict[str, object]:
+        return asdict(self)
+
+
+@dataclass(slots=True)
+class ChunkStats:
+    documents: int = 0
+    chunked: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    removed: int = 0
+    source_chars: int = 0
+    chunk_chars: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def average_chunk_chars(self) -> float:
+        return self.chunk_chars / self.chunks if self.chunks else 0.0
+
+    @property
+    def average_document_chars(self) -> float:
+        return self.source_chars / self.chunked if self.chunked else 0.0
+
+
+@dataclass(slots=True)
+class _Section:
+    heading: str | None
+    level: int
+    anchor: str
+    lines: list[str] = field(default_factory=list)
+
+
+def chunk_all(force: bool = False, max_chars: int = CHUNK_MAX_CHARS) -> ChunkStats:
+    """Строит фрагменты для всех документов из processed/markdown.
+
+    Документ пропускается, если его фрагменты построены из того же Markdown
+    (сверяется SHA-256). Фрагменты удалённых документов стираются.
+    """
+
+    started = time.perf_counter()
+    stats = ChunkStats()
+    slugs: set[str] = set()
+    for doc in load_processed_documents():
+        slugs.add(doc.slug)
+        update_chunks(doc, stats, force=force, max_chars=max_chars)
+    stats.removed = prune_chunks(slugs)
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def update_chunks(
+    doc: ProcessedDocument,
+    stats: ChunkStats,
+    force: bool = False,
+    max_chars: int = CHUNK_MAX_CHARS,
+) -> bool:
+    """Перестраивает фрагменты одного документа, если изменился его Markdown."""
+
+    stats.documents += 1
+    markdown = doc.markdown_path.read_text(encoding="utf-8")
+    source_hash = hashlib.sha256(markdown.encode("utf-8")).hexdigest()
+    if not force and load_chunk_hash(doc.slug) == source_hash:
+        stats.skipped += 1
+        return False
+    with metrics.timer("chunk", doc.slug):
+        chunks = chunk_document(doc, markdown, max_chars=max_chars)
+    save_chunks(doc.slug, source_hash, [chunk.to_dict() for chunk in chunks])
+    stats.chunked += 1
+    stats.chunks += len(chunks)
+    stats.source_chars += len(markdown)
+    stats.chunk_chars += sum(len(chunk.markdown) for chunk in chunks)
+    return True
+
+
+def chunk_document(doc: ProcessedDocument, markdown: str, max_chars: int = CHUNK_MAX_CHARS) -> list[Chunk]:
+    chunks: list[Chunk] = []
+    # Стек открытых разделов: (уровень, заголовок, id фрагмента).
+    stack: list[tuple[int, str, str]] = []
+    base_url = doc.url.split("#", 1)[0]
+    for section in split_sections(markdown):
+        while stack and stack[-1][0] >= section.level:
+            stack.pop()
+        chunk_id = f"{doc.slug}#{section.anchor}" if section.anchor else doc.slug
+        parent = stack[-1][2] if stack else None
+        heading_path = [heading for _, heading, _ in stack]
+        if section.heading:
+            heading_path.append(section.heading)
+            stack.append((section.level, section.heading, chunk_id))
+        heading_line = [f"{'#' * section.level} {section.heading}"] if section.heading else []
+        for part, body in enumerate(_split_body(section.lines, max_chars), start=1):
+            text = "\n".join(heading_line + body).strip()
+            if not text:
+                continue
+            chunks.append(
+                Chunk(
+                    id=chunk_id if part == 1 else f"{chunk_id}~{part}",
+                    slug=doc.slug,
+                    url=f"{base_url}#{section.anchor}" if section.anchor else base_url,
+                    title=doc.title,
+                    heading=section.heading,
+                    heading_path=heading_path,
+                    level=section.level,
+                    anchor=section.anchor,
+                    parent=parent,
+                    position=len(chunks),
+                    kind=_chunk_kind(body),
+                    markdown=text,
+                    part=part,
+                )
+            )
+    return chunks
+
+
+def split_sections(markdown: str) -> list[_Section]:
+    """Делит Markdown на разделы по ATX-заголовкам вне блоков кода."""
+
+    sections = [_Section(heading=None, level=0, anchor="")]
+    used_anchors: dict[str, int] = {}
+    in_fence = False
+    for line in markdown.splitlines():
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING_RE.match(line)
+        if match is None:
+            sections[-1].lines.append(line)
+            continue
+        heading, anchor = _heading_anchor(match.group(2))
+        count = used_anchors.get(anchor, 0)
+        used_anchors[anchor] = count + 1
+        if count:
+            anchor = f"{anchor}-{count}"
+        sections.append(_Section(heading=heading, level=len(match.group(1)), anchor=anchor))
+    return sections
+
+
+def _heading_anchor(raw_heading: str) -> tuple[str, str]:
+    """Возвращает текст заголовка и якорь: явный ``{#id}`` или как у GitHub."""
+
+    explicit = _ANCHOR_ATTR_RE.search(raw_heading)
+    if explicit:
+        return raw_heading[: explicit.start()].strip(), explicit.group(1)
+    heading = raw_heading.strip()
+    anchor = _ANCHOR_DROP_RE.sub("", heading.lower()).strip().replace(" ", "-")
+    return heading, anchor or "section"
+
+
+def _split_body(lines: list[str], max_chars: int) -> list[list[str]]:
+    """Склеивает блоки (абзацы, таблицы, код) в части не длиннее ``max_chars``."""
+
+    blocks = _blocks(lines)
+    parts: list[list[str]] = []
+    current: list[str] = []
+    size = 0
+    for block in blocks:
+        block_size = sum(len(line) + 1 for line in block)
+        if current and size + block_size > max_chars:
+            parts.append(current)
+            current, size = [], 0
+        current.extend(block)
+        size += block_size
+    if current or not parts:
+        parts.append(current)
+    return parts
+
+
+def _blocks(lines: list[str]) -> list[list[str]]:
+    blocks: list[list[str]] = []
+    current: list[str] = []
+    in_fence = False
+    for line in lines:
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        current.append(line)
+        if not in_fence and not line.strip():
+            blocks.append(current)
+            current = []
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def _chunk_kind(lines: list[str]) -> str:
+    if any(_FENCE_RE.match(line) for line in lines):
+        return "code"
+    if sum(1 for line in lines if line.lstrip().startswith("|")) >= 2:
+        return "table"
+    return "text"
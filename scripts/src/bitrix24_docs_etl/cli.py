@@ -4,31 +4,148 @@ from __future__ import annotations
 
 import json
 import logging
+import time
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Mapping, Optional
 
-import asyncio
 import click
-from rich.console import Console
-from rich.table import Table
 
-from . import fetch
-from .crawl import BitrixCrawler
-from .github_ingest import import_github_docs
-from .index import build_simple_index
-from .normalize import normalize_all
-from .storage import DATA_DIR, persist_fetch_results
+from . import metrics
+from .bench import BASELINE_FILE, BENCH_SIZES, BENCH_TOLERANCE, BENCH_WORKERS
+from .checkpoint import CHECKPOINT_EVERY, CrawlCheckpoint
+from .github_ingest import INGEST_WORKERS
+from .httpcache import DEFAULT_HTTP_CACHE_TTL, HttpCache
+from .hybrid import FUSIONS, MODES
+from .pack import PACK_FILE_NAME, CorpusPack, write_pack
+from .querycache import DEFAULT_MAX_BYTES, DEFAULT_MAX_ENTRIES, DEFAULT_TTL, QueryCache
+from .serve import DEFAULT_HOST, DEFAULT_PORT, SERVE_WORKERS
+from .stream import STREAM_QUEUE_SIZE
+from .vectors import DEFAULT_EMBEDDER, DEFAULT_NPROBE, DTYPES
+from .storage import (
+    CRAWL_CHECKPOINT_FILE,
+    DATA_DIR,
+    HTTP_CACHE_DIR,
+    RAW_CODECS,
+    STORE_BACKENDS,
+    RefreshSummary,
+    compact_raw_html,
+    configure_store,
+    load_raw_meta,
+    load_raw_metadata,
+    persist_fetch_results,
+    summarize_refresh,
+)
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+    from .bench import BenchReport
+    from .chunk import ChunkStats
+    from .crawl import BitrixCrawler, CrawlResult, CrawlStats
+    from .fetch import FetchResult
+    from .normalize import NormalizationStats
+    from .segments import SegmentUpdateStats
+    from .serve import SearchService
+    from .stream import StreamStats
+
+# Здесь только лёгкие модули, нужные для описания опций. Реализации команд
+# (httpx, BeautifulSoup, markdownify, NumPy, asyncio) и rich импортируются
+# внутри команд: ``--help`` и ``index`` не ждут загрузки обходчика.
+
+
+class _LazyConsole:
+    """``rich.Console``, который создаётся при первом выводе."""
+
+    _console: Console | None = None
+
+    def load(self) -> Console:
+        """Сам ``Console`` — для rich-объектов, которым он нужен как менеджер контекста."""
+
+        if self._console is None:
+            from rich.console import Console
+
+            self._console = Console()
+        return self._console
 
-console = Console()
+    def __getattr__(self, name: str) -> object:
+        return getattr(self.load(), name)
+
+
+console = _LazyConsole()
 logger = logging.getLogger(__name__)
 
 
 @click.group()
 @click.option("--log", "log_level", default="INFO", help="Уровень логирования (DEBUG/INFO/WARNING)")
-def cli(log_level: str) -> None:
+@click.option(
+    "--store",
+    type=click.Choice(STORE_BACKENDS),
+    default="files",
+    show_default=True,
+    envvar="BITRIX24_DOCS_STORE",
+    help="Где хранить метаданные документов: JSON-файлы или SQLite (data/docstore.sqlite3)",
+)
+@click.option(
+    "--store-html",
+    is_flag=True,
+    envvar="BITRIX24_DOCS_STORE_HTML",
+    help="Хранить HTML в SQLite сжатым вместо data/raw/*.html (только с --store sqlite)",
+)
+@click.option(
+    "--raw-codec",
+    type=click.Choice(RAW_CODECS),
+    default="zlib",
+    show_default=True,
+    envvar="BITRIX24_DOCS_RAW_CODEC",
+    help="Чем сжимать HTML страниц в data/raw/blobs (zstd — нужен пакет zstandard)",
+)
+@click.option(
+    "--metrics-json",
+    type=click.Path(dir_okay=False, path_type=Path),
+    envvar="BITRIX24_DOCS_METRICS_JSON",
+    help="Записать отчёт о запуске (этапы, операции над документами, HTTP, диск) в JSON",
+)
+@click.option(
+    "--metrics-prom",
+    type=click.Path(dir_okay=False, path_type=Path),
+    envvar="BITRIX24_DOCS_METRICS_PROM",
+    help="Записать метрики запуска в текстовом формате Prometheus (textfile collector)",
+)
+@click.option("--profile", "profile_stage", type=click.Choice(metrics.STAGES), help="Снять cProfile и tracemalloc для этапа")
+@click.option(
+    "--profile-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=DATA_DIR / "profiles",
+    show_default=True,
+    help="Куда сохранять результаты --profile",
+)
+@click.pass_context
+def cli(
+    ctx: click.Context,
+    log_level: str,
+    store: str,
+    store_html: bool,
+    raw_codec: str,
+    metrics_json: Optional[Path],
+    metrics_prom: Optional[Path],
+    profile_stage: Optional[str],
+    profile_dir: Path,
+) -> None:
     """Инструменты для загрузки и проверки документации Bitrix24."""
 
     logging.basicConfig(level=log_level.upper(), format="[%(levelname)s] %(message)s")
+    configure_store(store, html_in_db=store_html, raw_codec=raw_codec)
+    if metrics_json or metrics_prom or profile_stage:
+        metrics.start_run(ctx.invoked_subcommand or "", profile_stage, profile_dir)
+        # Отчёт пишется и при ошибке команды: run_success будет 0.
+        ctx.call_on_close(lambda: _write_metrics(metrics_json, metrics_prom))
+
+
+@cli.result_callback()
+def _mark_success(result: object, **_: object) -> None:
+    run = metrics.active()
+    if run is not None:
+        run.success = True
 
 
 @cli.command("check")
@@ -37,6 +154,10 @@ def cli(log_level: str) -> None:
 def check_command(output_json: bool, save: Optional[Path]) -> None:
     """Проверяет доступность основного раздела и robots.txt."""
 
+    from rich.table import Table
+
+    from . import fetch
+
     result = fetch.check_source_sync()
     if output_json:
         console.print_json(data=result)
@@ -46,6 +167,8 @@ def check_command(output_json: bool, save: Optional[Path]) -> None:
         table.add_column("Значение")
         table.add_row("reachable", str(result["reachable"]))
         table.add_row("robots_status", str(result["robots_status"]))
+        table.add_row("crawl_delay", str(result.get("crawl_delay")))
+        table.add_row("sitemaps", ", ".join(result.get("sitemaps") or []) or "—")
         table.add_row("title", str(result.get("title")))
         console.print(table)
     if save:
@@ -57,18 +180,85 @@ def check_command(output_json: bool, save: Optional[Path]) -> None:
 @cli.command("crawl")
 @click.option("--max-pages", default=100, show_default=True, help="Максимум страниц")
 @click.option("--max-depth", default=2, show_default=True, help="Максимальная глубина обхода")
+@click.option("--workers", default=1, show_default=True, help="Число параллельных воркеров обхода")
+@click.option("--per-host", type=int, help="Максимум одновременных запросов к одному хосту (по умолчанию = --workers)")
+@click.option("--rate", type=float, help="Максимум запросов в секунду к одному хосту")
 @click.option("--json", "output_json", is_flag=True, help="Выводить результат в JSON")
 @click.option("--save", is_flag=True, help="Сохранить HTML и метаданные в data/raw")
+@click.option("--full", is_flag=True, help="Не использовать ETag/Last-Modified и скачать все страницы заново")
+@click.option("--normalize-on-fetch", is_flag=True, help="Строить Markdown сразу при загрузке (без повторного разбора HTML)")
+@click.option("--http-cache", is_flag=True, envvar="BITRIX24_DOCS_HTTP_CACHE", help="Кэшировать ответы сайта в data/http_cache")
+@click.option("--http-cache-ttl", default=DEFAULT_HTTP_CACHE_TTL, show_default=True, help="Свежесть ответа без Cache-Control, с")
+@click.option("--offline", is_flag=True, help="Брать страницы только из HTTP-кэша, без сети")
+@click.option("--max-connections", type=int, help="Размер пула HTTP-соединений (по умолчанию = числу одновременных запросов)")
+@click.option("--http2", is_flag=True, help="Использовать HTTP/2 (нужен пакет h2)")
+@click.option("--retries", default=3, show_default=True, help="Повторов при таймаутах, 429 и 5xx")
+@click.option("--ignore-robots", is_flag=True, help="Не учитывать запреты и Crawl-delay из robots.txt")
+@click.option("--sitemap", is_flag=True, help="Взять список страниц из sitemap.xml (с --max-depth 0 — без обхода ссылок)")
+@click.option("--resume", is_flag=True, help="Продолжить прерванный обход с последней контрольной точки")
+@click.option("--checkpoint-every", default=CHECKPOINT_EVERY, show_default=True, help="Сбрасывать журнал контрольной точки на диск каждые N страниц")
 @click.option("--manifest", type=click.Path(dir_okay=False, path_type=Path), help="Путь для сохранения manifest.json")
-def crawl_command(max_pages: int, max_depth: int, output_json: bool, save: bool, manifest: Optional[Path]) -> None:
+def crawl_command(
+    max_pages: int,
+    max_depth: int,
+    workers: int,
+    per_host: Optional[int],
+    rate: Optional[float],
+    output_json: bool,
+    save: bool,
+    full: bool,
+    normalize_on_fetch: bool,
+    http_cache: bool,
+    http_cache_ttl: float,
+    offline: bool,
+    max_connections: Optional[int],
+    http2: bool,
+    retries: int,
+    ignore_robots: bool,
+    sitemap: bool,
+    resume: bool,
+    checkpoint_every: int,
+    manifest: Optional[Path],
+) -> None:
     """Собирает список страниц Bitrix24 с главной."""
 
-    crawler = BitrixCrawler(max_pages=max_pages, max_depth=max_depth)
-    result = asyncio.run(crawler.crawl([None]))
-    stored_meta = []
+    import asyncio
+
+    from rich.table import Table
+
+    from .crawl import BitrixCrawler
+    from .retry import RetryPolicy
+
+    if resume and not save:
+        raise click.UsageError("--resume работает только вместе с --save")
+    known_pages = load_raw_metadata() if save and not full else {}
+    cache = _http_cache(http_cache, http_cache_ttl, offline)
+    crawler = BitrixCrawler(
+        max_pages=max_pages,
+        max_depth=max_depth,
+        workers=workers,
+        per_host_concurrency=per_host,
+        rate_limit=rate,
+        known_pages=known_pages,
+        normalize=normalize_on_fetch and save,
+        http_cache=cache,
+        offline=offline,
+        max_connections=max_connections,
+        http2=http2,
+        retry=RetryPolicy(attempts=retries + 1),
+        robots=not ignore_robots,
+        sitemap=sitemap,
+        checkpoint=_checkpoint(resume, checkpoint_every) if save else None,
+    )
+    with metrics.stage("crawl") as stage:
+        if save:
+            result, stored_meta = _crawl_and_persist(crawler)
+        else:
+            result = asyncio.run(crawler.crawl([None]))
+        stage.documents = result.stats.fetched
     if save:
-        stored_meta = persist_fetch_results(result.iter_fetch_results())
         console.print(f"[green]Сохранено страниц: {len(stored_meta)}")
+        _print_refresh_summary(summarize_refresh(stored_meta, result.gone))
         if manifest:
             manifest.parent.mkdir(parents=True, exist_ok=True)
             manifest.write_text(json.dumps(stored_meta, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -84,65 +274,349 @@ def crawl_command(max_pages: int, max_depth: int, output_json: bool, save: bool,
             table.add_row(str(idx), page.url, page.title or "—")
         console.print(table)
         console.print(f"[green]Всего страниц: {len(result.pages)}")
+        _print_crawl_stats(result.stats, cache)
 
 
 @cli.command("normalize")
 @click.option("--limit", type=int, help="Ограничить количество документов")
 @click.option("--force", is_flag=True, help="Пересоздать уже нормализованные файлы")
-def normalize_command(limit: int | None, force: bool) -> None:
+@click.option("--workers", type=click.IntRange(min=1), default=1, show_default=True, help="Число процессов для конвертации HTML")
+@click.option("--chunksize", type=click.IntRange(min=1), default=8, show_default=True, help="Документов в одной порции для процесса")
+def normalize_command(limit: int | None, force: bool, workers: int, chunksize: int) -> None:
     """Конвертирует HTML из data/raw в Markdown и JSON."""
 
-    stats = normalize_all(limit=limit, force=force)
+    from rich.table import Table
+
+    stats = _normalize(limit=limit, force=force, workers=workers, chunksize=chunksize)
     table = Table(title="Нормализация документации")
     table.add_column("Метрика")
     table.add_column("Значение")
     table.add_row("Всего рассмотрено", str(stats.total))
     table.add_row("Создано/обновлено", str(stats.processed))
     table.add_row("Пропущено", str(stats.skipped))
+    table.add_row("Время, с", f"{stats.elapsed:.2f}")
+    table.add_row("Документов/с", f"{stats.docs_per_second:.1f}")
+    for stage, seconds in stats.stage_seconds.items():
+        table.add_row(f"  {stage}", f"{seconds:.2f} с ({stats.stage_throughput(stage):.1f} док/с)")
     console.print(table)
 
 
-@cli.command("index")
-@click.option("--limit", type=int, help="Ограничить количество документов в индексе")
-def index_command(limit: int | None) -> None:
-    """Строит простой JSON-индекс на основе нормализованных документов."""
+@cli.command("chunk")
+@click.option("--force", is_flag=True, help="Перестроить фрагменты всех документов")
+@click.option("--max-chars", default=2000, show_default=True, help="Максимальная длина фрагмента (символов)")
+def chunk_command(force: bool, max_chars: int) -> None:
+    """Разбивает нормализованный Markdown на фрагменты по заголовкам."""
+
+    _print_chunk_stats(_chunk(force=force, max_chars=max_chars))
 
-    stats = build_simple_index(limit=limit)
+
+@cli.command("compact-raw")
+@click.option("--no-dictionary", is_flag=True, help="Не строить общий словарь разметки для сжатия")
+def compact_raw_command(no_dictionary: bool) -> None:
+    """Переносит data/raw/*.html в сжатые блобы и удаляет блобы без ссылок."""
+
+    try:
+        stats = compact_raw_html(dictionary=not no_dictionary)
+    except ValueError as exc:
+        raise click.ClickException(str(exc)) from exc
+    console.print(
+        f"[green]Страниц {stats.documents}: перенесено из raw/*.html {stats.migrated}, "
+        f"пересжато {stats.recompressed}, удалено блобов {stats.pruned}"
+    )
+    if stats.dictionary:
+        console.print(f"[cyan]Словарь {stats.dictionary}")
+    ratio = stats.bytes_before / stats.bytes_after if stats.bytes_after else 0.0
+    console.print(
+        f"[cyan]HTML на диске: {stats.bytes_before / 1024 / 1024:.1f} МБ → {stats.bytes_after / 1024 / 1024:.1f} МБ "
+        f"({ratio:.1f}×)"
+    )
+
+
+@cli.command("export")
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=DATA_DIR / PACK_FILE_NAME,
+    show_default=True,
+    help="Файл упакованного корпуса",
+)
+@click.option("--prefix", help="Упаковать только документы, slug которых начинается с префикса")
+def export_command(output: Path, prefix: str | None) -> None:
+    """Упаковывает нормализованные документы в один файл для раздачи (serve --pack)."""
+
+    with metrics.stage("export") as stage:
+        stats = write_pack(output, prefix=prefix)
+        stage.documents = stats.documents
+    console.print(
+        f"[green]Упаковано документов {stats.documents} в {stats.path}: "
+        f"{stats.bytes / 1024 / 1024:.1f} МБ за {stats.elapsed:.2f} с"
+    )
+
+
+@cli.command("index")
+@click.option("--limit", type=int, help="Ограничить количество документов в simple_index.json")
+@click.option("--full", is_flag=True, help="Перестроить поисковый индекс с нуля одним сегментом")
+def index_command(limit: int | None, full: bool) -> None:
+    """Строит JSON-индекс и обновляет сегментный поисковый индекс."""
+
+    from .index import build_simple_index
+    from .segments import update_index
+
+    with metrics.stage("index") as stage:
+        stats = build_simple_index(limit=limit)
+        segment_stats = update_index(full=full)
+        stage.documents = stats.documents
     console.print(f"[green]Создан индекс с {stats.documents} документами: {stats.output_path}")
+    _print_segment_stats(segment_stats)
+
+
+@cli.command("embed")
+@click.option("--embedder", default=DEFAULT_EMBEDDER, show_default=True, help="hashing, hashing-<dim> или st:<модель>")
+@click.option("--documents", is_flag=True, help="Векторизовать документы целиком, а не фрагменты")
+@click.option("--dtype", type=click.Choice(DTYPES), default="float16", show_default=True, help="Тип хранения векторов")
+@click.option("--batch-size", default=64, show_default=True, help="Текстов в одной порции эмбеддера")
+@click.option("--nlist", type=int, help="Число кластеров IVF (по умолчанию √N, для малых корпусов — полный перебор)")
+def embed_command(embedder: str, documents: bool, dtype: str, batch_size: int, nlist: Optional[int]) -> None:
+    """Строит векторный индекс по фрагментам processed/chunks."""
+
+    from .vectors import build_vector_index
+
+    with metrics.stage("embed") as stage:
+        stats = build_vector_index(
+            embedder_name=embedder,
+            use_chunks=not documents,
+            dtype=dtype,
+            batch_size=batch_size,
+            nlist=nlist,
+        )
+        stage.documents = stats.embedded
+    console.print(
+        f"[green]Векторный индекс: {stats.units} векторов (dim {stats.dim}, IVF {stats.nlist or 'нет'}), "
+        f"посчитано {stats.embedded}, из кэша {stats.cached} за {stats.elapsed:.2f} с: {stats.output_path}"
+    )
+
+
+@cli.command("search")
+@click.argument("query")
+@click.option("--limit", default=10, show_default=True, help="Максимум результатов")
+@click.option("--mode", type=click.Choice(MODES), default="lexical", show_default=True)
+@click.option("--section", "sections", multiple=True, help="Искать только в разделе (crm, tasks, user, …); можно повторять")
+@click.option("--fusion", type=click.Choice(FUSIONS), default="rrf", show_default=True, help="Слияние выдач в режиме hybrid")
+@click.option("--nprobe", default=DEFAULT_NPROBE, show_default=True, help="Сколько кластеров IVF просматривать (dense)")
+@click.option("--timings", is_flag=True, help="Показать время этапов поиска")
+@click.option("--json", "output_json", is_flag=True, help="Вывести результат в JSON")
+def search_command(
+    query: str,
+    limit: int,
+    mode: str,
+    sections: tuple[str, ...],
+    fusion: str,
+    nprobe: int,
+    timings: bool,
+    output_json: bool,
+) -> None:
+    """Ищет по локальному индексу: BM25 (lexical), векторный (dense) или оба (hybrid)."""
+
+    from rich.table import Table
+
+    from .hybrid import hybrid_search
+    from .search import search
+    from .vectors import VectorIndex
+
+    started = time.perf_counter()
+    stage_timings: dict[str, float] = {}
+    if mode == "hybrid" or sections:
+        result = hybrid_search(query, limit=limit, mode=mode, sections=sections, fusion=fusion, nprobe=nprobe)
+        hits = result.hits
+        stage_timings = result.timings
+        if not result.dense_available:
+            console.print("[yellow]Векторный индекс не найден, используется только BM25 (см. bitrix24-docs embed)")
+    elif mode == "dense":
+        hits = VectorIndex().search(query, limit=limit, nprobe=nprobe)
+    else:
+        hits = search(query, limit=limit)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if output_json:
+        payload: object = [hit.to_dict() for hit in hits]
+        if timings:
+            payload = {"hits": payload, "timings_ms": {name: round(value, 3) for name, value in stage_timings.items()}}
+        console.print_json(data=payload)
+        return
+    table = Table(title=f"Результаты поиска: {query}")
+    table.add_column("#")
+    table.add_column("Оценка")
+    table.add_column("Slug")
+    table.add_column("Заголовок")
+    for idx, hit in enumerate(hits, start=1):
+        heading = getattr(hit, "heading", None)
+        title = f"{hit.title or '—'} › {heading}" if heading and heading != hit.title else hit.title or "—"
+        table.add_row(str(idx), f"{hit.score:.4f}" if mode == "hybrid" else f"{hit.score:.2f}", hit.slug, title)
+    console.print(table)
+    console.print(f"[green]Найдено {len(hits)} за {elapsed_ms:.1f} мс (с загрузкой индекса)")
+    if timings and stage_timings:
+        console.print("Этапы: " + ", ".join(f"{name} {value:.2f} мс" for name, value in stage_timings.items()))
+
+
+@cli.command("evaluate")
+@click.option(
+    "--queries",
+    "queries_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="JSON с размеченными запросами (по умолчанию eval/queries.json)",
+)
+@click.option("--k", default=10, show_default=True, help="Глубина выдачи для recall@k и MRR")
+@click.option("--fusion", type=click.Choice(FUSIONS), default="rrf", show_default=True)
+@click.option("--nprobe", default=DEFAULT_NPROBE, show_default=True, help="Сколько кластеров IVF просматривать (dense)")
+@click.option("--json", "output_json", is_flag=True, help="Вывести результат в JSON")
+def evaluate_command(queries_path: Optional[Path], k: int, fusion: str, nprobe: int, output_json: bool) -> None:
+    """Качество ранжирования на размеченных запросах: recall@k и MRR по режимам поиска."""
+
+    from rich.table import Table
+
+    from .hybrid import evaluate, load_labelled_queries
+
+    reports = evaluate(load_labelled_queries(queries_path), k=k, fusion=fusion, nprobe=nprobe)
+    if output_json:
+        console.print_json(data=[report.to_dict() for report in reports])
+        return
+    table = Table(title=f"Оценка поиска ({reports[0].queries if reports else 0} запросов)")
+    table.add_column("Режим")
+    table.add_column(f"Recall@{k}", justify="right")
+    table.add_column("MRR", justify="right")
+    table.add_column("Среднее, мс", justify="right")
+    table.add_column("Не найдено", justify="right")
+    for report in reports:
+        table.add_row(report.mode, f"{report.recall:.3f}", f"{report.mrr:.3f}", f"{report.mean_ms:.2f}", str(len(report.misses)))
+    console.print(table)
+    if len(reports) < 3:
+        console.print("[yellow]Векторный индекс не найден, dense и hybrid не оценивались (см. bitrix24-docs embed)")
 
 
 @cli.command("pipeline")
 @click.option("--max-pages", default=100, show_default=True, help="Максимум страниц для обхода")
 @click.option("--max-depth", default=2, show_default=True, help="Глубина обхода")
+@click.option("--workers", default=1, show_default=True, help="Число параллельных воркеров обхода")
+@click.option("--per-host", type=int, help="Максимум одновременных запросов к одному хосту (по умолчанию = --workers)")
+@click.option("--rate", type=float, help="Максимум запросов в секунду к одному хосту")
+@click.option("--full", is_flag=True, help="Не использовать ETag/Last-Modified и скачать все страницы заново")
+@click.option("--normalize-on-fetch", is_flag=True, help="Строить Markdown сразу при загрузке (без повторного разбора HTML)")
+@click.option("--http-cache", is_flag=True, envvar="BITRIX24_DOCS_HTTP_CACHE", help="Кэшировать ответы сайта в data/http_cache")
+@click.option("--http-cache-ttl", default=DEFAULT_HTTP_CACHE_TTL, show_default=True, help="Свежесть ответа без Cache-Control, с")
+@click.option("--offline", is_flag=True, help="Брать страницы только из HTTP-кэша, без сети")
+@click.option("--max-connections", type=int, help="Размер пула HTTP-соединений (по умолчанию = числу одновременных запросов)")
+@click.option("--http2", is_flag=True, help="Использовать HTTP/2 (нужен пакет h2)")
+@click.option("--retries", default=3, show_default=True, help="Повторов при таймаутах, 429 и 5xx")
+@click.option("--ignore-robots", is_flag=True, help="Не учитывать запреты и Crawl-delay из robots.txt")
+@click.option("--sitemap", is_flag=True, help="Взять список страниц из sitemap.xml (с --max-depth 0 — без обхода ссылок)")
+@click.option("--resume", is_flag=True, help="Продолжить прерванный обход с последней контрольной точки")
+@click.option("--checkpoint-every", default=CHECKPOINT_EVERY, show_default=True, help="Сбрасывать журнал контрольной точки на диск каждые N страниц")
 @click.option("--manifest", type=click.Path(dir_okay=False, path_type=Path), help="Путь для manifest.json")
 @click.option("--skip-crawl", is_flag=True, help="Пропустить этап crawl")
 @click.option("--skip-normalize", is_flag=True, help="Пропустить этап normalize")
+@click.option("--skip-chunk", is_flag=True, help="Пропустить этап chunk")
 @click.option("--skip-index", is_flag=True, help="Пропустить этап index")
 @click.option("--normalize-limit", type=int, help="Ограничить количество документов при нормализации")
 @click.option("--normalize-force", is_flag=True, help="Пересоздать нормализованные файлы")
+@click.option("--normalize-workers", type=click.IntRange(min=1), default=1, show_default=True, help="Число процессов для нормализации")
 @click.option("--index-limit", type=int, help="Ограничить количество документов в индексе")
+@click.option("--stream", is_flag=True, help="Сохранять, нормализовать и индексировать страницы сразу после загрузки")
+@click.option("--queue-size", type=click.IntRange(min=1), default=STREAM_QUEUE_SIZE, show_default=True, help="Размер очередей между этапами (--stream)")
 def pipeline_command(
     max_pages: int,
     max_depth: int,
+    workers: int,
+    per_host: Optional[int],
+    rate: Optional[float],
+    full: bool,
+    normalize_on_fetch: bool,
+    http_cache: bool,
+    http_cache_ttl: float,
+    offline: bool,
+    max_connections: Optional[int],
+    http2: bool,
+    retries: int,
+    ignore_robots: bool,
+    sitemap: bool,
+    resume: bool,
+    checkpoint_every: int,
     manifest: Optional[Path],
     skip_crawl: bool,
     skip_normalize: bool,
+    skip_chunk: bool,
     skip_index: bool,
     normalize_limit: Optional[int],
     normalize_force: bool,
+    normalize_workers: int,
     index_limit: Optional[int],
+    stream: bool,
+    queue_size: int,
 ) -> None:
-    """Запускает связку crawl → normalize → index."""
+    """Запускает связку crawl → normalize → chunk → index."""
+
+    import asyncio
+
+    from .crawl import BitrixCrawler
+    from .index import build_simple_index
+    from .retry import RetryPolicy
+    from .segments import update_index
+    from .stream import run_stream
 
     manifest_path = manifest or (DATA_DIR / "raw" / "manifest.json")
+    if stream and (skip_crawl or skip_normalize):
+        raise click.UsageError("--stream нельзя сочетать с --skip-crawl и --skip-normalize")
 
     if skip_crawl:
         console.print("[yellow]Этап crawl пропущен")
     else:
-        crawler = BitrixCrawler(max_pages=max_pages, max_depth=max_depth)
-        crawl_result = asyncio.run(crawler.crawl([None]))
-        stored_meta = persist_fetch_results(crawl_result.iter_fetch_results())
+        known_pages = {} if full else load_raw_metadata()
+        cache = _http_cache(http_cache, http_cache_ttl, offline)
+        crawler = BitrixCrawler(
+            max_pages=max_pages,
+            max_depth=max_depth,
+            workers=workers,
+            per_host_concurrency=per_host,
+            rate_limit=rate,
+            known_pages=known_pages,
+            normalize=normalize_on_fetch,
+            http_cache=cache,
+            offline=offline,
+            max_connections=max_connections,
+            http2=http2,
+            retry=RetryPolicy(attempts=retries + 1),
+            robots=not ignore_robots,
+            sitemap=sitemap,
+            checkpoint=_checkpoint(resume, checkpoint_every),
+        )
+        if stream:
+            with metrics.stage("stream") as stage:
+                stream_stats = asyncio.run(
+                    run_stream(
+                        crawler,
+                        manifest_path=manifest_path,
+                        normalize_workers=normalize_workers,
+                        force=normalize_force,
+                        chunk=not skip_chunk,
+                        index=not skip_index,
+                        queue_size=queue_size,
+                    )
+                )
+                stage.documents = stream_stats.persisted
+            for name, seconds in stream_stats.stage_seconds.items():
+                metrics.add_stage(f"stream.{name}", seconds)
+            _print_stream_stats(stream_stats, cache)
+            console.print(f"[green]Manifest записан в {manifest_path}")
+            if not skip_index:
+                with metrics.stage("index") as stage:
+                    stats = build_simple_index(limit=index_limit)
+                    stage.documents = stats.documents
+                console.print(f"[green]Index завершён: документов {stats.documents}, файл {stats.output_path}")
+            return
+        with metrics.stage("crawl") as stage:
+            crawl_result, stored_meta = _crawl_and_persist(crawler)
+            stage.documents = crawl_result.stats.fetched
         console.print(f"[green]Crawl завершён: сохранено страниц {len(stored_meta)}")
+        _print_crawl_stats(crawl_result.stats, cache)
+        _print_refresh_summary(summarize_refresh(stored_meta, crawl_result.gone))
         manifest_path.parent.mkdir(parents=True, exist_ok=True)
         manifest_path.write_text(json.dumps(stored_meta, ensure_ascii=False, indent=2), encoding="utf-8")
         console.print(f"[green]Manifest записан в {manifest_path}")
@@ -150,16 +624,26 @@ def pipeline_command(
     if skip_normalize:
         console.print("[yellow]Этап normalize пропущен")
     else:
-        stats = normalize_all(limit=normalize_limit, force=normalize_force)
+        stats = _normalize(limit=normalize_limit, force=normalize_force, workers=normalize_workers)
         console.print(
             f"[green]Normalize завершён: создано {stats.processed}, пропущено {stats.skipped}, всего {stats.total}",
         )
+        console.print(f"[cyan]Normalize: {stats.elapsed:.2f} с ({stats.docs_per_second:.1f} док/с)")
+
+    if skip_chunk:
+        console.print("[yellow]Этап chunk пропущен")
+    else:
+        _print_chunk_stats(_chunk())
 
     if skip_index:
         console.print("[yellow]Этап index пропущен")
     else:
-        stats = build_simple_index(limit=index_limit)
+        with metrics.stage("index") as stage:
+            stats = build_simple_index(limit=index_limit)
+            segment_stats = update_index()
+            stage.documents = stats.documents
         console.print(f"[green]Index завершён: документов {stats.documents}, файл {stats.output_path}")
+        _print_segment_stats(segment_stats)
 
 
 @cli.command("import-github")
@@ -171,12 +655,319 @@ def pipeline_command(
     help="URL репозитория с документацией",
 )
 @click.option("--branch", default="main", show_default=True)
-def import_github_command(repo_url: str, branch: str) -> None:
+@click.option("--full", is_flag=True, help="Импортировать все файлы, а не только изменения с прошлого импорта")
+@click.option("--workers", default=INGEST_WORKERS, show_default=True, help="Число потоков для чтения и записи файлов")
+def import_github_command(repo_url: str, branch: str, full: bool, workers: int) -> None:
     """Импортирует Markdown из официального репозитория документации Bitrix24."""
 
-    stats = import_github_docs(repo_url=repo_url, branch=branch)
+    from rich.progress import Progress
+
+    from .github_ingest import import_github_docs
+
+    with Progress(transient=True, console=console.load()) as progress:
+        task = progress.add_task("Импорт Markdown", total=None)
+
+        def report(done: int, total: int) -> None:
+            progress.update(task, completed=done, total=total)
+
+        with metrics.stage("import") as stage:
+            stats = import_github_docs(repo_url=repo_url, branch=branch, full=full, workers=workers, progress=report)
+            stage.documents = stats.imported
+    console.print(
+        f"[green]Импортировано документов: {stats.imported} из {stats.repo_url}@{stats.branch} ({stats.commit_range})"
+    )
+    console.print(f"[cyan]Добавлено {stats.added}, изменено {stats.modified}, удалено {stats.deleted}")
+
+
+@cli.command("bench")
+@click.option(
+    "--sizes",
+    default=",".join(str(size) for size in BENCH_SIZES),
+    show_default=True,
+    help="Размеры синтетического корпуса через запятую",
+)
+@click.option("--workers", default=BENCH_WORKERS, show_default=True, help="Воркеров обхода и импорта Markdown")
+@click.option("--output", type=click.Path(path_type=Path), help="Записать отчёт в JSON-файл")
+@click.option(
+    "--baseline",
+    type=click.Path(path_type=Path),
+    default=BASELINE_FILE,
+    show_default=True,
+    help="Эталонный отчёт для сравнения",
+)
+@click.option("--tolerance", default=BENCH_TOLERANCE, show_default=True, help="Допустимое ухудшение относительно эталона")
+@click.option("--update-baseline", is_flag=True, help="Записать результаты как новый эталон")
+@click.option("--json", "output_json", is_flag=True, help="Вывести отчёт в формате JSON")
+def bench_command(
+    sizes: str,
+    workers: int,
+    output: Optional[Path],
+    baseline: Path,
+    tolerance: float,
+    update_baseline: bool,
+    output_json: bool,
+) -> None:
+    """Меряет этапы конвейера на синтетическом корпусе и сравнивает с эталоном."""
+
+    from rich.table import Table
+
+    from .bench import compare_baseline, load_report, run_bench, save_report
+
+    try:
+        corpus_sizes = [int(size) for size in sizes.split(",") if size.strip()]
+    except ValueError as exc:
+        raise click.BadParameter(f"ожидаются числа через запятую: {sizes}", param_hint="--sizes") from exc
+    if not corpus_sizes or min(corpus_sizes) < 2:
+        raise click.BadParameter("размер корпуса — не меньше 2 документов", param_hint="--sizes")
+
+    with console.status("Замеры...") as status:
+        report = run_bench(
+            corpus_sizes,
+            workers=workers,
+            progress=lambda size, stage: status.update(f"Корпус {size}: {stage}"),
+        )
+    if output:
+        save_report(report, output)
+    if output_json:
+        console.print_json(data=report.to_dict())
+    else:
+        _print_bench_report(report)
+    if output:
+        console.print(f"[green]Отчёт записан в {output}")
+
+    if update_baseline:
+        save_report(report, baseline)
+        console.print(f"[green]Эталон обновлён: {baseline}")
+        return
+    if not baseline.exists():
+        console.print(f"[yellow]Эталона {baseline} нет: сравнение пропущено")
+        return
+    regressions = compare_baseline(report, load_report(baseline), tolerance)
+    if regressions:
+        table = Table(title="Регрессии относительно эталона", style="red")
+        table.add_column("Документов", justify="right")
+        table.add_column("Этап")
+        table.add_column("Метрика")
+        table.add_column("Эталон", justify="right")
+        table.add_column("Сейчас", justify="right")
+        table.add_column("Изменение", justify="right")
+        for item in regressions:
+            table.add_row(
+                str(item.size), item.stage, item.metric, f"{item.baseline:.1f}", f"{item.current:.1f}", f"{item.change:+.0%}"
+            )
+        console.print(table)
+        raise click.ClickException(f"Найдено регрессий: {len(regressions)} (допуск {tolerance:.0%})")
+    console.print(f"[green]Регрессий нет (допуск {tolerance:.0%}, эталон {baseline})")
+
+
+@cli.command("serve")
+@click.option("--host", default=DEFAULT_HOST, show_default=True)
+@click.option("--port", default=DEFAULT_PORT, show_default=True)
+@click.option("--workers", default=SERVE_WORKERS, show_default=True, help="Потоков для выполнения поиска")
+@click.option("--cache-entries", default=DEFAULT_MAX_ENTRIES, show_default=True, help="Максимум запросов в кэше (0 — без кэша)")
+@click.option("--cache-mb", default=DEFAULT_MAX_BYTES // (1024 * 1024), show_default=True, help="Максимальный размер кэша, МБ")
+@click.option("--cache-ttl", default=DEFAULT_TTL, show_default=True, help="Время жизни записи кэша, с")
+@click.option(
+    "--pack",
+    "pack_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Отдавать документы из упакованного корпуса (bitrix24-docs export)",
+)
+def serve_command(
+    host: str, port: int, workers: int, cache_entries: int, cache_mb: int, cache_ttl: float, pack_path: Path | None
+) -> None:
+    """HTTP-сервис поиска по локальному индексу (JSON: /search, /fetch, /stats)."""
+
+    from .serve import run_server
+
+    def ready(service: SearchService, address: str) -> None:
+        console.print(f"[green]Сервис поиска слушает {address} (Ctrl+C — остановить)")
+
+    try:
+        pack = CorpusPack(pack_path) if pack_path is not None else None
+    except ValueError as exc:
+        raise click.ClickException(str(exc)) from exc
+    try:
+        cache: QueryCache[Mapping[str, object]] = QueryCache(cache_entries, cache_mb * 1024 * 1024, cache_ttl)
+        service = run_server(host=host, port=port, workers=workers, cache=cache, on_ready=ready, pack=pack)
+    except FileNotFoundError as exc:
+        raise click.ClickException(f"Индекс не найден ({exc}): выполните bitrix24-docs index") from exc
+    finally:
+        if pack is not None:
+            pack.close()
+    summary = service.latency_summary()
+    console.print(
+        f"[cyan]Обработано запросов {summary.requests} (ошибок {summary.errors}): "
+        f"p50 {summary.p50_ms:.2f} мс, p99 {summary.p99_ms:.2f} мс, max {summary.max_ms:.2f} мс"
+    )
+    cache_stats = service.cache.stats()
+    console.print(
+        f"[cyan]Кэш: попаданий {cache_stats.hits}, промахов {cache_stats.misses} ({cache_stats.hit_ratio:.0%}), "
+        f"вытеснено {cache_stats.evictions}, устарело {cache_stats.expirations}, сбросов {cache_stats.invalidations}"
+    )
+
+
+def _normalize(**options: object) -> NormalizationStats:
+    from .normalize import normalize_all
+
+    with metrics.stage("normalize") as stage:
+        stats = normalize_all(**options)  # type: ignore[arg-type]
+        stage.documents = stats.processed
+    for name, seconds in stats.stage_seconds.items():
+        metrics.add_stage(f"normalize.{name}", seconds)
+    return stats
+
+
+def _chunk(**options: object) -> ChunkStats:
+    from .chunk import chunk_all
+
+    with metrics.stage("chunk") as stage:
+        stats = chunk_all(**options)  # type: ignore[arg-type]
+        stage.documents = stats.chunked
+    return stats
+
+
+def _write_metrics(json_path: Optional[Path], prom_path: Optional[Path]) -> None:
+    run = metrics.stop_run()
+    if run is None:
+        return
+    if json_path:
+        run.write_json(json_path)
+        console.print(f"[green]Отчёт о запуске записан в {json_path}")
+    if prom_path:
+        run.write_prometheus(prom_path)
+        console.print(f"[green]Метрики Prometheus записаны в {prom_path}")
+    for stage, files in run.profiles.items():
+        console.print(f"[cyan]Профиль этапа {stage}: {files['report']} (cProfile: {files['pstats']})")
+
+
+def _checkpoint(resume: bool, every: int) -> CrawlCheckpoint:
+    if resume:
+        loaded = CrawlCheckpoint.load(CRAWL_CHECKPOINT_FILE, every)
+        if loaded is not None:
+            console.print(f"[cyan]Продолжение обхода: уровень {loaded.depth}, обработано страниц {len(loaded.pages)}")
+            return loaded
+        console.print("[yellow]Контрольной точки нет: обход начнётся заново")
+    return CrawlCheckpoint(CRAWL_CHECKPOINT_FILE, every)
+
+
+def _crawl_and_persist(crawler: BitrixCrawler) -> tuple[CrawlResult, list[dict[str, object]]]:
+    """Обход, при котором каждая страница сохраняется сразу после загрузки.
+
+    Контрольная точка отмечает страницу только после записи, поэтому после
+    прерывания ничего не теряется; страницы прошлого запуска берутся из raw/meta.
+    """
+
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    stored: list[dict[str, object]] = []
+    writer = ThreadPoolExecutor(1, thread_name_prefix="crawl-store")
+
+    async def persist(page: FetchResult) -> None:
+        loop = asyncio.get_running_loop()
+        stored.extend(await loop.run_in_executor(writer, persist_fetch_results, [page]))
+
+    try:
+        result = asyncio.run(crawler.crawl([None], sink=persist))
+    finally:
+        writer.shutdown()
+    for url in result.restored:
+        meta = load_raw_meta(url)
+        if meta is not None:
+            stored.append({**meta, "change": "unchanged"})
+    order = {url: position for position, url in enumerate(result.pages)}
+    stored.sort(key=lambda meta: order.get(str(meta["url"]), len(order)))
+    return result, stored
+
+
+def _http_cache(enabled: bool, ttl: float, offline: bool) -> HttpCache | None:
+    if not (enabled or offline):
+        return None
+    return HttpCache(HTTP_CACHE_DIR, default_ttl=ttl)
+
+
+def _print_crawl_stats(stats: CrawlStats, cache: HttpCache | None = None) -> None:
+    console.print(
+        f"[cyan]Загружено {stats.fetched}, ошибок {stats.failed} за {stats.elapsed:.2f} с "
+        f"({stats.pages_per_second:.1f} стр/с)"
+    )
+    if stats.resumed:
+        console.print(f"[cyan]Взято из контрольной точки: {stats.resumed}")
+    if stats.sitemap_urls or stats.disallowed:
+        console.print(f"[cyan]Из sitemap: {stats.sitemap_urls}, запрещено robots.txt: {stats.disallowed}")
+    if stats.retries or stats.breaker_trips:
+        console.print(f"[yellow]Повторов запросов {stats.retries}, пауз из-за перегрузки хоста {stats.breaker_trips}")
+    if cache is not None:
+        console.print(
+            f"[cyan]HTTP-кэш: из кэша {cache.stats.hits}, перепроверено {cache.stats.revalidated}, "
+            f"сохранено {cache.stats.stored}"
+        )
+
+
+def _print_stream_stats(stats: StreamStats, cache: HttpCache | None = None) -> None:
+    console.print(
+        f"[green]Потоковый pipeline: сохранено {stats.persisted}, нормализовано {stats.normalized} "
+        f"за {stats.elapsed:.2f} с"
+    )
+    _print_crawl_stats(stats.crawl, cache)
+    _print_refresh_summary(stats.refresh)
+    busy = ", ".join(f"{stage} {seconds:.2f} с" for stage, seconds in stats.stage_seconds.items())
+    console.print(f"[cyan]Занятость этапов: {busy}; узкое место — {stats.bottleneck}")
+    if stats.chunks.documents:
+        _print_chunk_stats(stats.chunks)
+    if stats.index is not None:
+        _print_segment_stats(stats.index)
+
+
+def _print_chunk_stats(stats: ChunkStats) -> None:
+    console.print(
+        f"[green]Chunk: документов {stats.documents}, разбито {stats.chunked}, без изменений {stats.skipped}, "
+        f"фрагментов {stats.chunks}, удалено {stats.removed} за {stats.elapsed:.2f} с"
+    )
+    if stats.chunks:
+        console.print(
+            f"[cyan]Средний фрагмент {stats.average_chunk_chars:.0f} симв. "
+            f"против {stats.average_document_chars:.0f} симв. на документ"
+        )
+
+
+def _print_segment_stats(stats: SegmentUpdateStats) -> None:
+    console.print(
+        f"[green]Поисковый индекс: добавлено {stats.added}, изменено {stats.changed}, удалено {stats.deleted}, "
+        f"без изменений {stats.unchanged}; сегментов {stats.segments}"
+        f"{' (после слияния)' if stats.merged else ''}, поколение {stats.generation}, {stats.elapsed * 1000:.0f} мс"
+    )
+
+
+def _print_bench_report(report: BenchReport) -> None:
+    from rich.table import Table
+
+    table = Table(title=f"Замеры конвейера (Python {report.python}, CPU {report.cpus})")
+    table.add_column("Корпус", justify="right")
+    table.add_column("Этап")
+    table.add_column("Документов", justify="right")
+    table.add_column("Время, с", justify="right")
+    table.add_column("CPU, с", justify="right")
+    table.add_column("Пик RSS, МБ", justify="right")
+    table.add_column("Док/с", justify="right")
+    for result in report.results:
+        table.add_row(
+            str(result.size),
+            result.stage,
+            str(result.docs),
+            f"{result.wall_seconds:.2f}",
+            f"{result.cpu_seconds:.2f}",
+            f"{result.peak_rss_mb:.1f}",
+            f"{result.docs_per_second:.1f}",
+        )
+    console.print(table)
+
+
+def _print_refresh_summary(summary: RefreshSummary) -> None:
     console.print(
-        f"[green]Импортировано документов: {stats.imported} из {stats.repo_url}@{stats.branch}"
+        f"[cyan]Новых {summary.new}, изменённых {summary.changed}, "
+        f"без изменений {summary.unchanged}, пропавших {summary.gone}"
     )
 
 
@@ -4,13 +4,23 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from collections import deque
-from dataclasses import dataclass
-from typing import Iterable, Optional
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, replace
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Mapping, Optional
+from urllib.parse import urlparse
 
+import httpx
+
+from .checkpoint import CrawlCheckpoint
+from .discovery import SITEMAP_PATH, RobotsPolicy, discover_sitemap_urls, load_robots
 from .fetch import BASE_URL, BitrixDocumentationFetcher, FetchResult
+from .httpcache import CacheMissError, HttpCache
+from .retry import CircuitBreaker, RetryPolicy
 
 LOGGER = logging.getLogger(__name__)
+# Ответы, по которым страница прошлого обхода считается удалённой с сайта.
+GONE_STATUSES = frozenset({404, 410})
 
 
 @dataclass(slots=True)
@@ -20,10 +30,37 @@ class PageSummary:
     links: tuple[str, ...]
 
 
+@dataclass(slots=True)
+class CrawlStats:
+    """Счётчики обхода для подбора числа воркеров."""
+
+    fetched: int = 0
+    not_modified: int = 0
+    from_cache: int = 0
+    failed: int = 0
+    retries: int = 0
+    breaker_trips: int = 0
+    sitemap_urls: int = 0
+    disallowed: int = 0
+    resumed: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return self.fetched / self.elapsed
+
+
 @dataclass(slots=True)
 class CrawlResult:
     pages: dict[str, PageSummary]
     raw_pages: dict[str, FetchResult]
+    stats: CrawlStats = field(default_factory=CrawlStats)
+    # URL страниц, загруженных до прерывания (из контрольной точки).
+    restored: list[str] = field(default_factory=list)
+    # URL страниц прошлого обхода, ответивших 404/410 (см. GONE_STATUSES).
+    gone: list[str] = field(default_factory=list)
 
     def to_manifest(self) -> list[dict[str, object]]:
         return [
@@ -39,8 +76,47 @@ class CrawlResult:
         return self.raw_pages.values()
 
 
+class HostRateLimiter:
+    """Ограничивает число одновременных запросов и их частоту для каждого хоста."""
+
+    def __init__(self, concurrency: int = 4, rate: float | None = None) -> None:
+        self.concurrency = max(1, concurrency)
+        self.interval = 1.0 / rate if rate else 0.0
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._next_slot: dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        host = urlparse(url).netloc
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.concurrency)
+        async with semaphore:
+            if self.interval:
+                now = asyncio.get_running_loop().time()
+                start = max(now, self._next_slot.get(host, now))
+                self._next_slot[host] = start + self.interval
+                if start > now:
+                    await asyncio.sleep(start - now)
+            yield
+
+
 class BitrixCrawler:
-    """Простой очередной обход страниц Bitrix24."""
+    """Обход страниц Bitrix24 в ширину пулом асинхронных воркеров.
+
+    Страницы очередного уровня BFS раздаются ``workers`` воркерам из общей
+    очереди, а следующий уровень собирается только после завершения текущего.
+    Поэтому глубина считается так же, как при последовательном обходе, а
+    порядок страниц в ``CrawlResult`` не зависит от порядка ответов сервера.
+
+    С ``robots`` запрещённые robots.txt страницы пропускаются, а Crawl-delay
+    ограничивает частоту запросов. С ``sitemap`` страницы из sitemap сразу
+    попадают в нулевой уровень: при ``max_depth=0`` весь сайт обходится
+    одним плоским проходом.
+
+    С ``checkpoint`` состояние обхода периодически сохраняется на диск, а
+    загруженная из файла контрольная точка продолжает прерванный обход.
+    """
 
     def __init__(
         self,
@@ -48,47 +124,224 @@ class BitrixCrawler:
         max_pages: int = 200,
         max_depth: int = 3,
         delay: float = 0.0,
+        workers: int = 1,
+        per_host_concurrency: int | None = None,
+        rate_limit: float | None = None,
+        known_pages: Mapping[str, Mapping[str, object]] | None = None,
+        normalize: bool = False,
+        http_cache: HttpCache | None = None,
+        offline: bool = False,
+        max_connections: int | None = None,
+        http2: bool = False,
+        retry: RetryPolicy | None = None,
+        robots: bool = False,
+        sitemap: bool = False,
+        checkpoint: CrawlCheckpoint | None = None,
     ) -> None:
         self.base_url = base_url
         self.max_pages = max_pages
         self.max_depth = max_depth
-        self.delay = delay
+        self.workers = max(1, workers)
+        self.per_host_concurrency = per_host_concurrency or self.workers
+        # delay оставлен для совместимости: это минимальный интервал между
+        # запросами к одному хосту, то есть тот же лимит частоты.
+        if rate_limit is None and delay:
+            rate_limit = 1.0 / delay
+        self.rate_limit = rate_limit
+        # Метаданные прошлого обхода (URL → raw/meta) для условных запросов.
+        self.known_pages = known_pages or {}
+        # Строить Markdown сразу при загрузке, пока страница уже разобрана.
+        self.normalize = normalize
+        # Дисковый HTTP-кэш; offline — только из кэша, без сети.
+        self.http_cache = http_cache
+        self.offline = offline
+        # Пул соединений не меньше числа одновременных запросов, иначе воркеры
+        # ждут свободное соединение, а лишние keep-alive закрываются.
+        self.max_connections = max_connections or max(self.workers, self.per_host_concurrency)
+        self.http2 = http2
+        self.retry = retry or RetryPolicy()
+        self.robots = robots
+        self.sitemap = sitemap
+        self.checkpoint = checkpoint
+
+    async def crawl(
+        self,
+        start_paths: Iterable[str | None],
+        sink: Callable[[FetchResult], Awaitable[None]] | None = None,
+    ) -> CrawlResult:
+        """Обходит сайт.
+
+        С ``sink`` каждая страница передаётся ему сразу после загрузки, а в
+        ``CrawlResult.raw_pages`` не копится: HTML не держится в памяти до
+        конца обхода. Медленный ``sink`` притормаживает воркеров.
+        """
 
-    async def crawl(self, start_paths: Iterable[str | None]) -> CrawlResult:
-        fetcher = BitrixDocumentationFetcher(self.base_url)
+        fetcher = BitrixDocumentationFetcher(
+            self.base_url,
+            normalize=self.normalize,
+            cache=self.http_cache,
+            offline=self.offline,
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            http2=self.http2,
+            retry=self.retry,
+            breaker=CircuitBreaker(),
+        )
         visited: set[str] = set()
+        blocked: set[str] = set()
         pages: dict[str, PageSummary] = {}
         raw_pages: dict[str, FetchResult] = {}
-        queue: deque[tuple[str | None, int]] = deque((path, 0) for path in start_paths)
+        stats = CrawlStats()
+        level: list[str | None] = list(start_paths)
+        depth = 0
+        restored: list[str] = []
+        gone: list[str] = []
+        started = time.perf_counter()
+        checkpoint = self.checkpoint
+        if checkpoint is not None and checkpoint.resumed:
+            checkpoint.check(self.base_url, self.max_depth)
+            depth, level, visited = checkpoint.depth, list(checkpoint.level), set(checkpoint.visited)
+            for _, page in checkpoint.fetched():
+                url = str(page["url"])
+                pages[url] = PageSummary(url, page["title"], tuple(page["links"]))  # type: ignore[arg-type]
+                restored.append(url)
+            stats.resumed = len(restored)
+        elif checkpoint is not None:
+            checkpoint.base_url, checkpoint.max_depth = self.base_url, self.max_depth
 
         try:
-            while queue and len(visited) < self.max_pages:
-                path, depth = queue.popleft()
-                key = self._normalize_key(path)
-                if key in visited:
-                    continue
-                try:
-                    result = await fetcher.fetch(path)
-                except Exception:  # noqa: BLE001
-                    LOGGER.exception("Не удалось загрузить %s", path or self.base_url)
-                    visited.add(key)
-                    continue
-
-                visited.add(key)
-                pages[result.url] = PageSummary(result.url, result.title, result.links)
-                raw_pages[result.url] = result
-                LOGGER.debug("Страница %s: найдено ссылок %d", result.url, len(result.links))
-
-                if depth < self.max_depth:
-                    for link in result.links:
-                        if link.startswith(self.base_url):
-                            queue.append((link, depth + 1))
-                if self.delay:
-                    await asyncio.sleep(self.delay)
+            # Офлайн robots.txt взять неоткуда: правила применялись при наполнении кэша.
+            policy = await load_robots(fetcher) if self.robots and not self.offline else None
+            limiter = HostRateLimiter(self.per_host_concurrency, self._polite_rate(policy))
+            if self.sitemap and not restored:
+                sitemaps = (policy.sitemaps if policy is not None else ()) or (self.base_url + SITEMAP_PATH,)
+                seeds = await discover_sitemap_urls(fetcher, sitemaps, self.max_pages, slot=limiter.slot)
+                level.extend(url for url in seeds if url.startswith(self.base_url))
+                stats.sitemap_urls = len(seeds)
+            while level and len(visited) < self.max_pages:
+                if checkpoint is not None:
+                    checkpoint.start_level(depth, level, visited)
+                batch = self._select_batch(level, visited, policy, blocked)
+                results = await self._fetch_batch(fetcher, limiter, batch, sink, gone)
+                next_level: list[str | None] = []
+                for result in results:
+                    if result is None:
+                        stats.failed += 1
+                        continue
+                    if isinstance(result, PageSummary):
+                        # Загружена до прерывания: ссылки взяты из контрольной точки.
+                        summary = result
+                    else:
+                        stats.fetched += 1
+                        if result.not_modified:
+                            stats.not_modified += 1
+                        if result.from_cache:
+                            stats.from_cache += 1
+                        summary = PageSummary(result.url, result.title, result.links)
+                        if sink is None:
+                            raw_pages[result.url] = result
+                        LOGGER.debug("Страница %s: найдено ссылок %d", result.url, len(result.links))
+                    pages[summary.url] = summary
+                    if depth < self.max_depth:
+                        next_level.extend(link for link in summary.links if link.startswith(self.base_url))
+                level = next_level
+                depth += 1
+        except BaseException:
+            # При Ctrl+C или отмене не теряем страницы после последнего сохранения.
+            if checkpoint is not None:
+                checkpoint.save()
+                checkpoint.close()
+            raise
         finally:
             await fetcher.aclose()
+        if checkpoint is not None:
+            checkpoint.clear()
+
+        stats.disallowed = len(blocked)
+        stats.retries = fetcher.retries
+        stats.breaker_trips = fetcher.breaker.trips if fetcher.breaker is not None else 0
+        stats.elapsed = time.perf_counter() - started
+        return CrawlResult(pages, raw_pages, stats, restored, gone)
+
+    def _select_batch(
+        self,
+        level: list[str | None],
+        visited: set[str],
+        policy: RobotsPolicy | None = None,
+        blocked: set[str] | None = None,
+    ) -> list[str | None]:
+        """Отбирает непосещённые и разрешённые robots.txt пути уровня с учётом ``max_pages``."""
+
+        batch: list[str | None] = []
+        for path in level:
+            if len(visited) >= self.max_pages:
+                break
+            key = self._normalize_key(path)
+            if key in visited:
+                continue
+            if policy is not None and not policy.allows(key):
+                if blocked is not None and key not in blocked:
+                    LOGGER.debug("Запрещено robots.txt: %s", key)
+                    blocked.add(key)
+                continue
+            visited.add(key)
+            batch.append(path)
+        return batch
+
+    def _polite_rate(self, policy: RobotsPolicy | None) -> float | None:
+        """Лимит частоты: заданный или из Crawl-delay, если тот строже."""
+
+        delay = policy.crawl_delay if policy is not None else None
+        if not delay:
+            return self.rate_limit
+        return min(self.rate_limit, 1.0 / delay) if self.rate_limit else 1.0 / delay
+
+    async def _fetch_batch(
+        self,
+        fetcher: BitrixDocumentationFetcher,
+        limiter: HostRateLimiter,
+        batch: list[str | None],
+        sink: Callable[[FetchResult], Awaitable[None]] | None = None,
+        gone: list[str] | None = None,
+    ) -> list[FetchResult | PageSummary | None]:
+        results: list[FetchResult | PageSummary | None] = [None] * len(batch)
+        frontier = iter(enumerate(batch))
+        checkpoint = self.checkpoint
+
+        async def worker() -> None:
+            for position, path in frontier:
+                key = self._normalize_key(path)
+                done = checkpoint.done(key) if checkpoint is not None else None
+                if done is not None:
+                    results[position] = PageSummary(str(done["url"]), done["title"], tuple(done["links"]))  # type: ignore[arg-type]
+                    continue
+                result: FetchResult | None = None
+                async with limiter.slot(key):
+                    try:
+                        result = await fetcher.fetch(path, self.known_pages.get(key))
+                    except CacheMissError:
+                        LOGGER.warning("Страницы нет в HTTP-кэше (offline): %s", key)
+                    except httpx.HTTPStatusError as exc:
+                        if exc.response.status_code in GONE_STATUSES and key in self.known_pages:
+                            LOGGER.info("Страница удалена с сайта (HTTP %s): %s", exc.response.status_code, key)
+                            if gone is not None:
+                                gone.append(key)
+                        else:
+                            LOGGER.exception("Не удалось загрузить %s", path or self.base_url)
+                    except Exception:  # noqa: BLE001
+                        LOGGER.exception("Не удалось загрузить %s", path or self.base_url)
+                if result is not None and sink is not None:
+                    await sink(result)
+                    # Для следующего уровня BFS нужны только ссылки.
+                    result = replace(result, content="", markdown=None, text=None)
+                if checkpoint is not None:
+                    if result is None:
+                        checkpoint.record(key, key, failed=True)
+                    else:
+                        checkpoint.record(key, result.url, result.title, result.links)
+                results[position] = result
 
-        return CrawlResult(pages, raw_pages)
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(batch)))))
+        return results
 
     def _normalize_key(self, path: str | None) -> str:
         if path is None:
@@ -0,0 +1,163 @@
+"""Правила robots.txt и список страниц из sitemap.
+
+robots.txt разбирается ``urllib.robotparser``: запрещённые для нашего
+User-Agent страницы обход пропускает, а ``Crawl-delay``/``Request-rate``
+ограничивают частоту запросов к хосту. Sitemap перечисляются рекурсивно
+(sitemap index → sitemap), сжатые gzip распаковываются по сигнатуре. Так
+краулер получает все страницы сайта сразу, не загружая разводящие страницы
+только ради ссылок.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import logging
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncContextManager, Callable
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+import httpx
+
+from .fetch import ROBOTS_PATH, USER_AGENT
+from .httpcache import CacheMissError
+
+if TYPE_CHECKING:
+    from .fetch import BitrixDocumentationFetcher
+
+LOGGER = logging.getLogger(__name__)
+
+SITEMAP_PATH = "sitemap.xml"
+# Защита от зацикленных или гигантских sitemap index.
+MAX_SITEMAPS = 200
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+@dataclass(slots=True)
+class RobotsPolicy:
+    parser: RobotFileParser
+    sitemaps: tuple[str, ...] = ()
+    user_agent: str = USER_AGENT
+
+    def allows(self, url: str) -> bool:
+        return self.parser.can_fetch(self.user_agent, url)
+
+    @property
+    def crawl_delay(self) -> float | None:
+        """Минимальный интервал между запросами, с (Crawl-delay или Request-rate)."""
+
+        delay = self.parser.crawl_delay(self.user_agent)
+        rate = self.parser.request_rate(self.user_agent)
+        intervals = [float(delay)] if delay is not None else []
+        if rate is not None and rate.requests:
+            intervals.append(rate.seconds / rate.requests)
+        return max(intervals) if intervals else None
+
+
+@dataclass(slots=True)
+class SitemapStats:
+    sitemaps: int = 0
+    urls: int = 0
+    failed: int = 0
+
+
+def parse_robots(text: str, user_agent: str = USER_AGENT) -> RobotsPolicy:
+    parser = RobotFileParser()
+    parser.parse(text.splitlines())
+    return RobotsPolicy(parser, tuple(parser.site_maps() or ()), user_agent)
+
+
+def allow_all() -> RobotsPolicy:
+    parser = RobotFileParser()
+    parser.allow_all = True
+    return RobotsPolicy(parser)
+
+
+async def load_robots(fetcher: BitrixDocumentationFetcher) -> RobotsPolicy:
+    """Загружает robots.txt сайта; статусы трактуются как в ``RobotFileParser.read``."""
+
+    try:
+        response = await fetcher.fetch_raw(ROBOTS_PATH)
+    except (httpx.HTTPError, CacheMissError) as exc:
+        LOGGER.warning("robots.txt недоступен (%s): ограничений нет", exc)
+        return allow_all()
+    if response.status_code in (401, 403):
+        parser = RobotFileParser()
+        parser.disallow_all = True
+        return RobotsPolicy(parser)
+    if response.status_code >= 400:
+        return allow_all()
+    return parse_robots(response.text)
+
+
+def parse_sitemap(data: bytes) -> tuple[list[str], list[str]]:
+    """Возвращает ``(страницы, вложенные sitemap)`` из urlset или sitemapindex."""
+
+    if data.startswith(GZIP_MAGIC):
+        data = gzip.decompress(data)
+    root = ElementTree.fromstring(data)
+    locations = [
+        element.text.strip()
+        for element in root.iter()
+        if _local_name(element.tag) == "loc" and element.text and element.text.strip()
+    ]
+    if _local_name(root.tag) == "sitemapindex":
+        return [], locations
+    return locations, []
+
+
+async def discover_sitemap_urls(
+    fetcher: BitrixDocumentationFetcher,
+    sitemaps: list[str] | tuple[str, ...],
+    limit: int,
+    stats: SitemapStats | None = None,
+    slot: Callable[[str], AsyncContextManager[None]] | None = None,
+) -> list[str]:
+    """Обходит sitemap уровнями, пока не наберёт ``limit`` адресов страниц.
+
+    ``slot`` — ограничитель запросов к хосту (``HostRateLimiter.slot``).
+    """
+
+    stats = stats if stats is not None else SitemapStats()
+    urls: dict[str, None] = {}
+    seen: set[str] = set()
+    level = list(dict.fromkeys(sitemaps))
+    while level and len(urls) < limit and stats.sitemaps < MAX_SITEMAPS:
+        batch = [url for url in level if url not in seen][: MAX_SITEMAPS - stats.sitemaps]
+        seen.update(batch)
+        stats.sitemaps += len(batch)
+        responses = await asyncio.gather(*(_load_sitemap(fetcher, url, slot) for url in batch))
+        level = []
+        for url, parsed in zip(batch, responses):
+            if parsed is None:
+                stats.failed += 1
+                continue
+            pages, nested = parsed
+            level.extend(nested)
+            for page in pages:
+                if len(urls) >= limit:
+                    break
+                urls.setdefault(page, None)
+    stats.urls = len(urls)
+    return list(urls)
+
+
+async def _load_sitemap(
+    fetcher: BitrixDocumentationFetcher,
+    url: str,
+    slot: Callable[[str], AsyncContextManager[None]] | None,
+) -> tuple[list[str], list[str]] | None:
+    try:
+        async with slot(url) if slot is not None else nullcontext():
+            response = await fetcher.fetch_raw(url)
+        response.raise_for_status()
+        return parse_sitemap(response.content)
+    except (httpx.HTTPError, CacheMissError, ElementTree.ParseError, OSError, EOFError) as exc:
+        LOGGER.warning("Не удалось прочитать sitemap %s: %s", url, exc)
+        return None
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
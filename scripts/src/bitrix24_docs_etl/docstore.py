@@ -0,0 +1,164 @@
+"""SQLite-хранилище метаданных документов.
+
+Заменяет каталоги ``raw/meta`` и ``processed/meta`` одной базой в режиме WAL:
+метаданные лежат JSON-строкой (в том же виде, что и в файлах), а slug, URL и
+хэши содержимого — отдельными колонками, так что выборки и проверки
+«изменился ли документ» идут по индексу без обхода каталогов. Дополнительно
+в базе можно хранить сжатый zlib HTML вместо файлов ``raw/*.html``.
+
+Запись пакетная: внутри ``transaction()`` все изменения фиксируются одним
+коммитом. Методы можно вызывать из нескольких потоков: обращения к
+соединению сериализуются блокировкой, а записи из потоков попадают в
+транзакцию, открытую вызывающим.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Mapping
+
+SCHEMA_VERSION = 1
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS raw (
+    slug TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    content_hash TEXT,
+    meta TEXT NOT NULL,
+    html BLOB
+);
+CREATE INDEX IF NOT EXISTS raw_url ON raw(url);
+CREATE TABLE IF NOT EXISTS processed (
+    slug TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    source_hash TEXT,
+    meta TEXT NOT NULL
+);
+"""
+
+
+class DocumentStore:
+    """Метаданные сырых и нормализованных документов в SQLite."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.created = not path.exists()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        version = self._fetchone("PRAGMA user_version")[0]
+        if version == 0:
+            self._conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        elif version != SCHEMA_VERSION:
+            self._conn.close()
+            raise ValueError(f"Неподдерживаемая версия хранилища {path}: {version}")
+        self._depth = 0
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Объединяет записи в одну транзакцию; вложенные вызовы не коммитят."""
+
+        if self._depth == 0:
+            self._execute("BEGIN")
+        self._depth += 1
+        try:
+            yield
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self._execute("ROLLBACK")
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            self._execute("COMMIT")
+
+    # --- raw ---
+
+    def raw_meta(self, slug: str) -> dict[str, object] | None:
+        row = self._fetchone("SELECT meta FROM raw WHERE slug = ?", (slug,))
+        return json.loads(row[0]) if row else None
+
+    def iter_raw_meta(self, prefix: str | None = None) -> list[dict[str, object]]:
+        rows = self._fetchall(*_prefix_query("SELECT meta FROM raw", prefix))
+        return [json.loads(meta) for (meta,) in rows]
+
+    def put_raw_meta(self, slug: str, meta: Mapping[str, object]) -> None:
+        # html не трогаем: тело пишется отдельно и может храниться в файле.
+        self._execute(
+            "INSERT INTO raw (slug, url, content_hash, meta) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(slug) DO UPDATE SET url = excluded.url, content_hash = excluded.content_hash, "
+            "meta = excluded.meta",
+            (slug, meta["url"], meta.get("content_hash"), _dumps(meta)),
+        )
+
+    def has_raw_html(self, slug: str) -> bool:
+        row = self._fetchone("SELECT html IS NOT NULL FROM raw WHERE slug = ?", (slug,))
+        return bool(row and row[0])
+
+    def raw_html(self, slug: str) -> str | None:
+        row = self._fetchone("SELECT html FROM raw WHERE slug = ?", (slug,))
+        if not row or row[0] is None:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put_raw_html(self, slug: str, html: str) -> None:
+        self._execute(
+            "UPDATE raw SET html = ? WHERE slug = ?",
+            (zlib.compress(html.encode("utf-8"), 6), slug),
+        )
+
+    # --- processed ---
+
+    def processed_meta(self, slug: str) -> dict[str, object] | None:
+        row = self._fetchone("SELECT meta FROM processed WHERE slug = ?", (slug,))
+        return json.loads(row[0]) if row else None
+
+    def processed_source_hash(self, slug: str) -> tuple[bool, str | None]:
+        row = self._fetchone("SELECT source_hash FROM processed WHERE slug = ?", (slug,))
+        return (True, row[0]) if row else (False, None)
+
+    def iter_processed_meta(self, prefix: str | None = None) -> list[dict[str, object]]:
+        rows = self._fetchall(*_prefix_query("SELECT meta FROM processed", prefix))
+        return [json.loads(meta) for (meta,) in rows]
+
+    def put_processed_meta(self, slug: str, meta: Mapping[str, object]) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO processed (slug, url, source_hash, meta) VALUES (?, ?, ?, ?)",
+            (slug, meta["url"], meta.get("source_hash"), _dumps(meta)),
+        )
+
+    def delete_processed(self, slug: str) -> None:
+        self._execute("DELETE FROM processed WHERE slug = ?", (slug,))
+
+    def _execute(self, sql: str, params: tuple = ()) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    def _fetchone(self, sql: str, params: tuple = ()) -> tuple | None:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+def _prefix_query(select: str, prefix: str | None) -> tuple[str, tuple[str, ...]]:
+    # Диапазон [prefix, prefix + U+FFFF) использует первичный ключ, в отличие от LIKE.
+    if not prefix:
+        return f"{select} ORDER BY slug", ()
+    return f"{select} WHERE slug >= ? AND slug < ? ORDER BY slug", (prefix, prefix + "\uffff")
+
+
+def _dumps(meta: Mapping[str, object]) -> str:
+    return json.dumps(meta, ensure_ascii=False, separators=(",", ":"))
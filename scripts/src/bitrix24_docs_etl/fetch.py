@@ -1,28 +1,38 @@
 """Каркас загрузчика документации Bitrix24.
 
 На первом этапе реализованы:
-- Проверка доступности источника и robots.txt.
+- Проверка доступности источника и robots.txt (правила — в ``discovery``).
 - Функции для загрузки HTML-страницы с таймаутами и базовой валидацией.
-
-Дальнейшее развитие: обход линков, очистка, сохранение в data/processed.
+- Опциональная нормализация в Markdown сразу при загрузке (см. ``parse``).
+- Опциональный дисковый HTTP-кэш и офлайн-режим (см. ``httpcache``).
+- Пул соединений с лимитами, опциональный HTTP/2, повторы с backoff и
+  предохранитель для перегруженного хоста (см. ``retry``).
 """
 
 from __future__ import annotations
 
 import asyncio
 import logging
+import time
 from dataclasses import dataclass
-from typing import Iterable, Optional
+from typing import Mapping, Optional
 from urllib.parse import urljoin, urlparse
 
 import httpx
-from bs4 import BeautifulSoup
+
+from . import metrics
+from .httpcache import CachedResponse, CacheMissError, HttpCache
+from .parse import parse_html
+from .retry import CircuitBreaker, RetryPolicy, retry_after_seconds
 
 LOGGER = logging.getLogger(__name__)
 
 BASE_URL = "https://apidocs.bitrix24.ru/"
 ROBOTS_PATH = "robots.txt"
 USER_AGENT = "Bitrix24-Docs-MCP/0.1 (+https://github.com/bitrix24/bitrix24-docs-mcp)"
+# Соединения держатся открытыми дольше, чем по умолчанию в httpx (5 с):
+# между уровнями обхода бывают паузы на разбор и запись страниц.
+DEFAULT_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=30.0)
 
 
 @dataclass(slots=True)
@@ -34,33 +44,177 @@ class FetchResult:
     content: str
     title: Optional[str] = None
     links: tuple[str, ...] = ()
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False
+    markdown: Optional[str] = None
+    text: Optional[str] = None
+    from_cache: bool = False
 
 
 class BitrixDocumentationFetcher:
-    """Простой асинхронный загрузчик страниц Bitrix24."""
-
-    def __init__(self, base_url: str = BASE_URL, timeout: float = 10.0) -> None:
+    """Простой асинхронный загрузчик страниц Bitrix24.
+
+    ``limits`` задаёт пул соединений httpx, ``http2`` включает HTTP/2 (нужен
+    пакет ``h2``; по TLS запросы мультиплексируются в одном соединении).
+    Временные сбои повторяются по ``retry``; по умолчанию — одна попытка.
+    ``breaker`` приостанавливает запросы к хосту, который не справляется.
+    """
+
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        timeout: float = 10.0,
+        normalize: bool = False,
+        cache: HttpCache | None = None,
+        offline: bool = False,
+        limits: httpx.Limits | None = None,
+        http2: bool = False,
+        retry: RetryPolicy | None = None,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
+        if offline and cache is None:
+            raise ValueError("Офлайн-режим работает только с HTTP-кэшем")
+        if http2:
+            _require_h2()
         self.base_url = base_url.rstrip("/") + "/"
-        self._client = httpx.AsyncClient(timeout=timeout, headers={
-            "User-Agent": USER_AGENT
-        })
+        self.normalize = normalize
+        self.cache = cache
+        self.offline = offline
+        self.retry = retry or RetryPolicy(attempts=1)
+        self.breaker = breaker
+        # Сколько повторных запросов понадобилось за время жизни загрузчика.
+        self.retries = 0
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            headers={"User-Agent": USER_AGENT},
+            limits=limits or DEFAULT_LIMITS,
+            http2=http2,
+        )
 
     async def aclose(self) -> None:
         await self._client.aclose()
 
-    async def fetch(self, path: str | None = None) -> FetchResult:
+    async def fetch(
+        self,
+        path: str | None = None,
+        previous: Mapping[str, object] | None = None,
+    ) -> FetchResult:
+        """Загружает страницу.
+
+        ``previous`` — сохранённые метаданные страницы из ``raw/meta``. Если в
+        них есть ETag/Last-Modified, запрос становится условным, а ответ 304
+        возвращается как ``not_modified`` с заголовком и ссылками из метаданных.
+
+        С HTTP-кэшем свежая запись отдаётся без запроса, а устаревшая
+        перепроверяется по своим валидаторам. В офлайн-режиме страницы нет
+        в кэше — ``CacheMissError``.
+        """
+
         url = self.base_url if path is None else urljoin(self.base_url, path)
-        response = await self._client.get(url)
+        cache = self.cache
+        cached, usable = cache.lookup(url, allow_stale=self.offline) if cache is not None else (None, False)
+        if usable and cached is not None:
+            return self._from_cache(url, cached, previous)
+        if self.offline:
+            raise CacheMissError(url)
+
+        validators = cached.validators() if cached is not None else previous
+        response = await self._get(url, _conditional_headers(validators))
+        if response.status_code == 304 and cache is not None and cached is not None:
+            return self._from_cache(url, cache.revalidate(cached, response.headers), previous)
+        if response.status_code == 304 and previous is not None:
+            return _not_modified(
+                url,
+                previous,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
         response.raise_for_status()
         text = response.text
-        title = _extract_title(text)
-        links = tuple(_extract_links(text, url))
+        if cache is not None:
+            cache.store(url, response.status_code, response.headers, text)
+        parsed = parse_html(text, url, self.base_url, convert=self.normalize)
         return FetchResult(
             url=url,
             status_code=response.status_code,
             content=text,
-            title=title,
-            links=links,
+            title=parsed.title,
+            links=parsed.links,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            markdown=parsed.markdown,
+            text=parsed.text,
+        )
+
+    async def fetch_raw(self, path: str) -> httpx.Response:
+        """Ответ без разбора и HTTP-кэша: robots.txt, sitemap (в том числе .gz)."""
+
+        url = urljoin(self.base_url, path)
+        if self.offline:
+            raise CacheMissError(url)
+        return await self._get(url, {})
+
+    async def _get(self, url: str, headers: Mapping[str, str]) -> httpx.Response:
+        """GET с повторами временных сбоев и учётом предохранителя хоста."""
+
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            if self.breaker is not None:
+                await self.breaker.wait(host)
+            response: httpx.Response | None = None
+            error: httpx.TransportError | None = None
+            started = time.perf_counter()
+            try:
+                response = await self._client.get(url, headers=headers)
+            except httpx.TransportError as exc:
+                error = exc
+            metrics.observe("http_request", time.perf_counter() - started, url)
+            if response is not None:
+                metrics.record_http(response.status_code, len(response.content))
+            else:
+                metrics.record_http("error")
+            transient = response is None or response.status_code in self.retry.statuses
+            retry_after = retry_after_seconds(response) if transient and response is not None else None
+            if retry_after is not None:
+                retry_after = min(retry_after, self.retry.max_retry_after)
+            if self.breaker is not None:
+                if transient:
+                    self.breaker.record_failure(host, retry_after)
+                else:
+                    self.breaker.record_success(host)
+            if not self.retry.should_retry(attempt, response, error):
+                if response is None:
+                    raise error  # type: ignore[misc]
+                return response
+            delay = self.retry.delay(attempt, retry_after)
+            reason = f"HTTP {response.status_code}" if response is not None else repr(error)
+            LOGGER.info("Повтор %s через %.2f с: %s", url, delay, reason)
+            self.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _from_cache(self, url: str, cached: CachedResponse, previous: Mapping[str, object] | None) -> FetchResult:
+        # Совпадение валидаторов с raw/meta равносильно ответу 304: страница
+        # уже сохранена, разбирать её снова не нужно.
+        if previous is not None and _same_version(previous, cached):
+            result = _not_modified(url, previous, etag=cached.etag, last_modified=cached.last_modified)
+            result.from_cache = True
+            return result
+        text = cached.body
+        parsed = parse_html(text, url, self.base_url, convert=self.normalize)
+        return FetchResult(
+            url=url,
+            status_code=cached.status_code,
+            content=text,
+            title=parsed.title,
+            links=parsed.links,
+            etag=cached.etag,
+            last_modified=cached.last_modified,
+            markdown=parsed.markdown,
+            text=parsed.text,
+            from_cache=True,
         )
 
     async def check_reachability(self) -> bool:
@@ -76,36 +230,41 @@ class BitrixDocumentationFetcher:
         return await self.fetch(ROBOTS_PATH)
 
 
-def _extract_title(html_text: str) -> Optional[str]:
-    soup = BeautifulSoup(html_text, "lxml")
-    if soup.title and soup.title.string:
-        return soup.title.string.strip()
-    h1 = soup.find("h1")
-    if h1 and h1.text:
-        return h1.text.strip()
-    return None
+def _require_h2() -> None:
+    try:
+        import h2  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError("Для HTTP/2 установите пакет h2: pip install 'bitrix24-docs-etl[http2]'") from exc
 
 
-def _extract_links(html_text: str, source_url: str) -> Iterable[str]:
-    """Извлекает абсолютные ссылки на документы Bitrix из HTML."""
+def _not_modified(url: str, previous: Mapping[str, object], etag: str | None, last_modified: str | None) -> FetchResult:
+    return FetchResult(
+        url=url,
+        status_code=304,
+        content="",
+        title=previous.get("title"),  # type: ignore[arg-type]
+        links=tuple(previous.get("links") or ()),  # type: ignore[arg-type]
+        etag=etag or previous.get("etag"),  # type: ignore[arg-type]
+        last_modified=last_modified or previous.get("last_modified"),  # type: ignore[arg-type]
+        not_modified=True,
+    )
 
-    soup = BeautifulSoup(html_text, "lxml")
-    links: set[str] = set()
-    for tag in soup.find_all("a", href=True):
-        href = tag["href"].strip()
-        if not href or href.startswith("#"):
-            continue
-        if any(href.startswith(prefix) for prefix in ("mailto:", "javascript:", "tel:")):
-            continue
-        absolute = urljoin(source_url, href)
-        if ensure_same_host(absolute):
-            links.add(_strip_fragment(absolute))
-    return sorted(links)
 
+def _same_version(previous: Mapping[str, object], cached: CachedResponse) -> bool:
+    if cached.etag and previous.get("etag") == cached.etag:
+        return True
+    return bool(cached.last_modified) and previous.get("last_modified") == cached.last_modified
 
-def _strip_fragment(url: str) -> str:
-    parsed = urlparse(url)
-    return parsed._replace(fragment="").geturl()
+
+def _conditional_headers(previous: Mapping[str, object] | None) -> dict[str, str]:
+    if not previous:
+        return {}
+    headers: dict[str, str] = {}
+    if previous.get("etag"):
+        headers["If-None-Match"] = str(previous["etag"])
+    if previous.get("last_modified"):
+        headers["If-Modified-Since"] = str(previous["last_modified"])
+    return headers
 
 
 def ensure_same_host(url: str, base: str = BASE_URL) -> bool:
@@ -119,15 +278,20 @@ def ensure_same_host(url: str, base: str = BASE_URL) -> bool:
 async def check_source() -> dict[str, object]:
     """Асинхронная проверка доступности и соблюдения robots."""
 
+    from .discovery import parse_robots
+
     fetcher = BitrixDocumentationFetcher()
     try:
         is_reachable = await fetcher.check_reachability()
         robots = await fetcher.fetch_robots()
+        policy = parse_robots(robots.content)
         return {
             "reachable": is_reachable,
             "robots_status": robots.status_code,
             "robots_sample": robots.content[:500],
             "title": robots.title,
+            "crawl_delay": policy.crawl_delay,
+            "sitemaps": list(policy.sitemaps),
         }
     finally:
         await fetcher.aclose()
@@ -1,23 +1,42 @@
-"""Import documentation directly from the official Bitrix24 REST repo."""
+"""Import documentation directly from the official Bitrix24 REST repo.
+
+The repository is kept as a persistent shallow clone under ``data/github``.
+Each run fetches the branch, diffs the previously imported commit against
+the new one and only writes added/modified Markdown files and removes
+deleted ones. Without a usable previous commit (or with ``full``) everything
+is imported, and documents from the repository that are gone are pruned.
+"""
 
 from __future__ import annotations
 
 import json
-import subprocess
-import tempfile
+import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from itertools import islice
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable, Sequence
 
 from .storage import (
     ProcessedDocumentMeta,
-    persist_processed_document,
-    PROCESSED_MARKDOWN_DIR,
+    batch,
+    delete_processed_document,
+    ensure_dirs,
+    load_processed_documents,
+    save_processed_metadata,
+    write_processed_markdown,
     DATA_DIR,
+    PROCESSED_MARKDOWN_DIR,
 )
 
 GITHUB_REPO_DEFAULT = "https://github.com/bitrix24/b24restdocs"
+GITHUB_DIR = DATA_DIR / "github"
+INGEST_WORKERS = 8
+
+# progress(done, total) is called after each processed file.
+ProgressCallback = Callable[[int, int], None]
 
 
 @dataclass(slots=True)
@@ -25,75 +44,249 @@ class ImportStats:
     imported: int
     repo_url: str
     branch: str
+    added: int = 0
+    modified: int = 0
+    deleted: int = 0
+    from_commit: str | None = None
+    to_commit: str | None = None
+
+    @property
+    def commit_range(self) -> str:
+        target = (self.to_commit or "")[:12]
+        return f"{self.from_commit[:12]}..{target}" if self.from_commit else target
 
 
 def import_github_docs(
     repo_url: str = GITHUB_REPO_DEFAULT,
     branch: str = "main",
     include_paths: Iterable[str] | None = None,
+    full: bool = False,
+    workers: int = INGEST_WORKERS,
+    progress: ProgressCallback | None = None,
 ) -> ImportStats:
     include_paths = tuple(include_paths or ("api-reference", "tutorials"))
-    with tempfile.TemporaryDirectory() as tmpdir:
-        repo_path = Path(tmpdir)
-        _clone_repo(repo_url, branch, repo_path)
-        imported = _ingest_markdown(repo_path, repo_url, branch, include_paths)
-    return ImportStats(imported=imported, repo_url=repo_url, branch=branch)
-
-
-def _clone_repo(repo_url: str, branch: str, destination: Path) -> None:
-    subprocess.run(
-        [
-            "git",
-            "clone",
-            "--depth",
-            "1",
-            "--branch",
-            branch,
-            repo_url,
-            str(destination),
-        ],
-        check=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+    repo_path = _mirror_path(repo_url)
+    _sync_mirror(repo_url, branch, repo_path)
+    to_commit = _git(repo_path, "rev-parse", "HEAD")
+
+    state = _load_state(repo_path)
+    from_commit = None if full else state.get("commit")
+    if (state.get("branch"), state.get("include_paths")) != (branch, list(include_paths)):
+        from_commit = None
+    if from_commit and not _has_commit(repo_path, str(from_commit)):
+        from_commit = None
+
+    if from_commit:
+        changes = _changed_files(repo_path, str(from_commit), to_commit, include_paths)
+    else:
+        changes = [("A", path) for path in _tracked_files(repo_path, include_paths)]
+
+    stats = ImportStats(
+        imported=0,
+        repo_url=repo_url,
+        branch=branch,
+        from_commit=str(from_commit) if from_commit else None,
+        to_commit=to_commit,
     )
+    _apply_changes(repo_path, repo_url, branch, changes, stats, workers, progress)
+    if not from_commit:
+        # A full import has no diff to report deletions: drop whatever was
+        # imported from this repository before and is gone from it now.
+        stats.deleted += _prune_unseen(repo_url, {slug_from_path(Path(path)) for _, path in changes})
+    _save_state(
+        repo_path,
+        {"repo_url": repo_url, "branch": branch, "include_paths": list(include_paths), "commit": to_commit},
+    )
+    return stats
+
+
+def import_local_docs(
+    repo_path: Path,
+    repo_url: str = GITHUB_REPO_DEFAULT,
+    branch: str = "main",
+    include_paths: Iterable[str] | None = None,
+    workers: int = INGEST_WORKERS,
+    progress: ProgressCallback | None = None,
+) -> ImportStats:
+    """Imports every Markdown file from a local checkout without git.
+
+    URLs are built as for ``import_github_docs``; there is no incremental
+    state, so all files are written on each run.
+    """
+
+    include_paths = tuple(include_paths or ("api-reference", "tutorials"))
+    paths = sorted(
+        path.relative_to(repo_path).as_posix()
+        for include in include_paths
+        for path in (repo_path / include).rglob("*.md")
+    )
+    stats = ImportStats(imported=0, repo_url=repo_url, branch=branch)
+    _apply_changes(repo_path, repo_url, branch, [("A", path) for path in paths], stats, workers, progress)
+    return stats
+
+
+def _mirror_path(repo_url: str) -> Path:
+    name = re.sub(r"[^\w.-]+", "_", repo_url.split("://", 1)[-1]).strip("_")
+    return GITHUB_DIR / name
+
+
+def _sync_mirror(repo_url: str, branch: str, repo_path: Path) -> None:
+    if not (repo_path / ".git").exists():
+        repo_path.parent.mkdir(parents=True, exist_ok=True)
+        _run(["git", "clone", "--depth", "1", "--no-tags", "--branch", branch, repo_url, str(repo_path)])
+        return
+    _git(repo_path, "remote", "set-url", "origin", repo_url)
+    _git(repo_path, "fetch", "--depth", "1", "--no-tags", "origin", branch)
+    _git(repo_path, "checkout", "--force", "--detach", "FETCH_HEAD")
+
+
+def _changed_files(
+    repo_path: Path,
+    from_commit: str,
+    to_commit: str,
+    include_paths: Iterable[str],
+) -> list[tuple[str, str]]:
+    # The old commit's tree stays in the clone after `fetch --depth 1`, so the
+    # diff works without full history. Renames come out as delete + add.
+    output = _git(repo_path, "diff", "--name-status", "--no-renames", "-z", from_commit, to_commit, "--", *include_paths)
+    fields = output.split("\0")
+    changes = [(fields[i], fields[i + 1]) for i in range(0, len(fields) - 1, 2)]
+    return [(status[0], path) for status, path in changes if path.endswith(".md")]
+
+
+def _tracked_files(repo_path: Path, include_paths: Iterable[str]) -> list[str]:
+    output = _git(repo_path, "ls-files", "-z", "--", *include_paths)
+    return [path for path in output.split("\0") if path.endswith(".md")]
 
 
-def _ingest_markdown(
+def _apply_changes(
     repo_path: Path,
     repo_url: str,
     branch: str,
-    include_paths: Iterable[str],
-) -> int:
+    changes: Sequence[tuple[str, str]],
+    stats: ImportStats,
+    workers: int,
+    progress: ProgressCallback | None,
+) -> None:
+    """Writes added/modified documents and removes deleted ones.
+
+    Reading, title/preview extraction and both writes run in a thread pool
+    inside one storage batch; directories are created once up front. At most
+    ``4 * workers`` documents are in flight, results are counted in order.
+    """
+
     timestamp = datetime.now(timezone.utc).isoformat()
-    imported = 0
-    for include in include_paths:
-        target_dir = repo_path / include
-        if not target_dir.exists():
-            continue
-        for md_file in target_dir.rglob("*.md"):
-            content = md_file.read_text(encoding="utf-8")
-            relative = md_file.relative_to(repo_path)
-            slug = _slug_from_path(relative)
-            markdown_path = PROCESSED_MARKDOWN_DIR / f"{slug}.md"
-            markdown_path.parent.mkdir(parents=True, exist_ok=True)
-            markdown_path.write_text(content, encoding="utf-8")
-            text_preview = _make_preview(content)
-            meta = ProcessedDocumentMeta(
-                url=f"{repo_url.rstrip('/')}/blob/{branch}/{relative.as_posix()}",
-                title=_extract_title(content, slug),
-                slug=slug,
-                markdown=content,
-                text=text_preview,
-                html_path=markdown_path,
-                retrieved_at=timestamp,
-                links=[],
-            )
-            persist_processed_document(meta, force=True)
-            imported += 1
-    return imported
-
-
-def _slug_from_path(path: Path) -> str:
+    total = len(changes)
+    done = 0
+    ensure_dirs()
+
+    def ingest(path: str) -> None:
+        relative = Path(path)
+        slug = slug_from_path(relative)
+        content = (repo_path / relative).read_text(encoding="utf-8")
+        meta = ProcessedDocumentMeta(
+            url=f"{repo_url.rstrip('/')}/blob/{branch}/{relative.as_posix()}",
+            title=_extract_title(content, slug),
+            slug=slug,
+            markdown=content,
+            text=_make_preview(content),
+            # The Markdown itself is the source: the checkout may live anywhere.
+            html_path=PROCESSED_MARKDOWN_DIR / f"{slug}.md",
+            retrieved_at=timestamp,
+            links=[],
+        )
+        write_processed_markdown(meta)
+        save_processed_metadata(meta)
+
+    updates = [(status, path) for status, path in changes if status != "D"]
+    with batch(), ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for status, path in changes:
+            if status == "D":
+                delete_processed_document(slug_from_path(Path(path)))
+                stats.deleted += 1
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+
+        in_flight: deque[tuple[str, Future[None]]] = deque()
+        pending = iter(updates)
+        for status, path in islice(pending, 4 * max(1, workers)):
+            in_flight.append((status, pool.submit(ingest, path)))
+        while in_flight:
+            status, future = in_flight.popleft()
+            future.result()
+            next_update = next(pending, None)
+            if next_update is not None:
+                in_flight.append((next_update[0], pool.submit(ingest, next_update[1])))
+            if status == "A":
+                stats.added += 1
+            else:
+                stats.modified += 1
+            stats.imported += 1
+            done += 1
+            if progress is not None:
+                progress(done, total)
+
+
+def _prune_unseen(repo_url: str, seen: set[str]) -> int:
+    """Removes processed documents of ``repo_url`` whose slugs are not in ``seen``.
+
+    Documents from other sources (the crawled site, other repositories) are
+    recognised by their URL and kept.
+    """
+
+    prefix = f"{repo_url.rstrip('/')}/blob/"
+    stale = [doc.slug for doc in load_processed_documents() if doc.url.startswith(prefix) and doc.slug not in seen]
+    with batch():
+        for slug in stale:
+            delete_processed_document(slug)
+    return len(stale)
+
+
+def _has_commit(repo_path: Path, commit: str) -> bool:
+    import subprocess
+
+    result = subprocess.run(
+        ["git", "-C", str(repo_path), "cat-file", "-e", f"{commit}^{{commit}}"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    return result.returncode == 0
+
+
+def _load_state(repo_path: Path) -> dict[str, object]:
+    state_path = _state_path(repo_path)
+    if not state_path.exists():
+        return {}
+    return json.loads(state_path.read_text(encoding="utf-8"))
+
+
+def _save_state(repo_path: Path, state: dict[str, object]) -> None:
+    _state_path(repo_path).write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def _state_path(repo_path: Path) -> Path:
+    return repo_path.with_name(f"{repo_path.name}.import.json")
+
+
+def _git(repo_path: Path, *args: str) -> str:
+    return _run(["git", "-C", str(repo_path), *args]).strip()
+
+
+def _run(command: list[str]) -> str:
+    # subprocess нужен только для git; serve и CLI импортируют модуль без него.
+    import subprocess
+
+    result = subprocess.run(
+        command,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    return result.stdout.decode("utf-8")
+
+
+def slug_from_path(path: Path) -> str:
     return path.with_suffix("").as_posix().replace("/", "_").replace(".", "_")
 
 
@@ -0,0 +1,216 @@
+"""Дисковый HTTP-кэш для загрузчика страниц.
+
+Ответ хранится одним файлом на URL (имя — SHA-256 URL): строка JSON с
+заголовками и сроком свежести, затем тело, сжатое zlib. Срок свежести
+берётся из ``Cache-Control: max-age`` или ``Expires``; ``no-cache`` означает
+обязательную перепроверку, ``no-store`` — ответ не сохраняется. Если сервер
+ничего не сообщил, запись свежа ``default_ttl`` секунд.
+
+Свежая запись отдаётся без обращения к сети, устаревшая перепроверяется
+условным запросом по её ETag/Last-Modified. В режиме offline загрузчик
+обращается только к кэшу (см. ``BitrixDocumentationFetcher``).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Callable, Mapping
+
+DEFAULT_HTTP_CACHE_TTL = 3600.0
+COMPRESS_LEVEL = 6
+# Заголовки ответа, которые нужны для перепроверки и разбора страницы.
+STORED_HEADERS = ("content-type", "etag", "last-modified", "cache-control", "expires", "date")
+
+
+class CacheMissError(Exception):
+    """Страницы нет в кэше, а сеть недоступна (режим offline)."""
+
+
+@dataclass(slots=True)
+class CachedResponse:
+    url: str
+    status_code: int
+    headers: dict[str, str]
+    stored_at: float
+    expires_at: float
+    compressed: bytes
+
+    @property
+    def body(self) -> str:
+        return zlib.decompress(self.compressed).decode("utf-8")
+
+    @property
+    def etag(self) -> str | None:
+        return self.headers.get("etag")
+
+    @property
+    def last_modified(self) -> str | None:
+        return self.headers.get("last-modified")
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.expires_at
+
+    def validators(self) -> dict[str, str | None]:
+        """В формате ``raw/meta``, чтобы строить те же условные заголовки."""
+
+        return {"etag": self.etag, "last_modified": self.last_modified}
+
+
+@dataclass(slots=True)
+class HttpCacheStats:
+    hits: int = 0
+    revalidated: int = 0
+    stored: int = 0
+    misses: int = 0
+
+
+class HttpCache:
+    def __init__(
+        self,
+        directory: Path,
+        default_ttl: float = DEFAULT_HTTP_CACHE_TTL,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.directory = directory
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self.stats = HttpCacheStats()
+
+    def get(self, url: str) -> CachedResponse | None:
+        """Запись из кэша; испорченная или обрезанная запись удаляется и считается промахом."""
+
+        path = self._path(url)
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            self.stats.misses += 1
+            return None
+        header, _, compressed = raw.partition(b"\n")
+        try:
+            meta = json.loads(header)
+            entry = CachedResponse(
+                url=meta["url"],
+                status_code=meta["status_code"],
+                headers=meta["headers"],
+                stored_at=meta["stored_at"],
+                expires_at=meta["expires_at"],
+                compressed=compressed,
+            )
+            # size появился не сразу: у старых записей длину тела не проверить.
+            if meta.get("size", len(compressed)) != len(compressed):
+                raise ValueError("обрезанное тело")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            path.unlink(missing_ok=True)
+            self.stats.misses += 1
+            return None
+        return entry
+
+    def lookup(self, url: str, allow_stale: bool = False) -> tuple[CachedResponse | None, bool]:
+        """Запись и признак, что её можно отдать без запроса к сети.
+
+        Отдать можно свежую запись, а с ``allow_stale`` (офлайн) — любую;
+        такие обращения считаются попаданиями.
+        """
+
+        entry = self.get(url)
+        usable = entry is not None and (allow_stale or entry.is_fresh(self.clock()))
+        if usable:
+            self.stats.hits += 1
+        return entry, usable
+
+    def store(self, url: str, status_code: int, headers: Mapping[str, str], body: str) -> CachedResponse | None:
+        """Сохраняет ответ 200; возвращает ``None``, если кэшировать нельзя."""
+
+        stored_headers = _stored_headers(headers)
+        lifetime = freshness_lifetime(stored_headers, self.default_ttl, self.clock())
+        if status_code != 200 or lifetime is None:
+            return None
+        now = self.clock()
+        entry = CachedResponse(
+            url=url,
+            status_code=status_code,
+            headers=stored_headers,
+            stored_at=now,
+            expires_at=now + lifetime,
+            compressed=zlib.compress(body.encode("utf-8"), COMPRESS_LEVEL),
+        )
+        self._write(entry)
+        self.stats.stored += 1
+        return entry
+
+    def revalidate(self, entry: CachedResponse, headers: Mapping[str, str]) -> CachedResponse:
+        """Продлевает запись после ответа 304, обновив заголовки из ответа."""
+
+        merged = {**entry.headers, **_stored_headers(headers)}
+        lifetime = freshness_lifetime(merged, self.default_ttl, self.clock()) or 0.0
+        now = self.clock()
+        updated = CachedResponse(entry.url, entry.status_code, merged, now, now + lifetime, entry.compressed)
+        self._write(updated)
+        self.stats.revalidated += 1
+        return updated
+
+    def _write(self, entry: CachedResponse) -> None:
+        path = self._path(entry.url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = {
+            "url": entry.url,
+            "status_code": entry.status_code,
+            "headers": entry.headers,
+            "stored_at": entry.stored_at,
+            "expires_at": entry.expires_at,
+            "size": len(entry.compressed),
+        }
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n" + entry.compressed)
+        tmp_path.replace(path)
+
+    def _path(self, url: str) -> Path:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.cache"
+
+
+def freshness_lifetime(headers: Mapping[str, str], default_ttl: float, now: float) -> float | None:
+    """Сколько секунд ответ свеж; ``None`` — ответ нельзя сохранять.
+
+    Имена заголовков — в нижнем регистре.
+    """
+
+    directives = _cache_control(headers.get("cache-control", ""))
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    if "max-age" in directives:
+        try:
+            return max(0.0, float(directives["max-age"]))
+        except ValueError:
+            return 0.0
+    expires = headers.get("expires")
+    if expires:
+        try:
+            return max(0.0, parsedate_to_datetime(expires).timestamp() - now)
+        except (TypeError, ValueError):
+            # Некорректный Expires (например, "0") означает «уже устарел».
+            return 0.0
+    return default_ttl
+
+
+def _cache_control(value: str) -> dict[str, str]:
+    directives: dict[str, str] = {}
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"')
+    return directives
+
+
+def _stored_headers(headers: Mapping[str, str]) -> dict[str, str]:
+    lowered = {name.lower(): value for name, value in headers.items()}
+    return {name: lowered[name] for name in STORED_HEADERS if name in lowered}
@@ -0,0 +1,413 @@
+"""Гибридный поиск: BM25 и векторный индекс со слиянием выдач.
+
+Лексический (``search``) и векторный (``vectors``) поиск выполняются
+параллельно, каждый отдаёт до ``depth`` документов. Векторный индекс
+работает по фрагментам, поэтому его выдача сводится к документам по лучшему
+фрагменту, а заголовок этого фрагмента показывается в результате. Выдачи
+сливаются reciprocal rank fusion (``rrf``) или взвешенной суммой
+нормированных оценок (``weighted``).
+
+Раздел документа (crm, tasks, user, …) определяется по slug: это часть пути
+после ``api-reference``/``tutorials`` или первая часть slug. Время каждого
+этапа возвращается вместе с результатом.
+
+Для оценки качества есть размеченный набор запросов (``eval/queries.json``)
+и ``evaluate``: recall@k и MRR для lexical, dense и hybrid.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import statistics
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+
+from . import vectors as vectors_module
+from .search import SearchableIndex, default_index_path, open_index, search_index
+from .storage import BASE_DIR
+from .vectors import DEFAULT_NPROBE, VectorIndex, open_vector_index
+
+MODES = ("lexical", "dense", "hybrid")
+FUSIONS = ("rrf", "weighted")
+RRF_K = 60
+# Сколько документов берётся из каждой выдачи до слияния.
+CANDIDATE_DEPTH = 50
+# Фрагментов на документ в запросе к векторному индексу.
+CHUNKS_PER_DOCUMENT = 4
+# Потоков для векторной части гибридного поиска. ``serve`` выполняет
+# несколько запросов одновременно; с одним потоком их векторные части шли бы
+# по очереди. NumPy отпускает GIL, так что потоки работают параллельно.
+DENSE_WORKERS = 4
+SECTION_ROOTS = ("api-reference", "tutorials")
+EVAL_QUERIES_FILE = BASE_DIR / "eval" / "queries.json"
+
+_NO_RANK = 1 << 30
+_EXTENSION_RE = re.compile(r"\.html?$")
+_SECTION_MASKS: "weakref.WeakKeyDictionary[VectorIndex, dict[frozenset[str], np.ndarray]]" = weakref.WeakKeyDictionary()
+_executor: ThreadPoolExecutor | None = None
+
+
+@dataclass(slots=True)
+class HybridHit:
+    slug: str
+    url: str
+    title: str | None
+    heading: str | None
+    section: str
+    score: float
+    lexical_rank: int | None = None
+    dense_rank: int | None = None
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "slug": self.slug,
+            "url": self.url,
+            "title": self.title,
+            "heading": self.heading,
+            "section": self.section,
+            "score": round(self.score, 6),
+            "lexical_rank": self.lexical_rank,
+            "dense_rank": self.dense_rank,
+        }
+
+
+@dataclass(slots=True)
+class HybridResult:
+    hits: list[HybridHit]
+    # Время этапов в миллисекундах: lexical, dense_embed, dense_search, fusion, total.
+    timings: dict[str, float] = field(default_factory=dict)
+    dense_available: bool = True
+
+
+@dataclass(slots=True)
+class _Candidate:
+    slug: str
+    url: str
+    title: str | None
+    heading: str | None
+    score: float
+
+
+@dataclass(slots=True)
+class LabelledQuery:
+    query: str
+    relevant: list[str]
+    sections: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class EvalReport:
+    mode: str
+    queries: int
+    k: int
+    recall: float
+    mrr: float
+    mean_ms: float
+    misses: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "mode": self.mode,
+            "queries": self.queries,
+            "k": self.k,
+            f"recall@{self.k}": round(self.recall, 4),
+            "mrr": round(self.mrr, 4),
+            "mean_ms": round(self.mean_ms, 2),
+            "misses": self.misses,
+        }
+
+
+def section_of(slug: str) -> str:
+    """``api-reference_crm_deals_crm-deal-add`` → ``crm``."""
+
+    parts = _EXTENSION_RE.sub("", slug).split("_")
+    for root in SECTION_ROOTS:
+        if root in parts:
+            position = parts.index(root)
+            if position + 1 < len(parts) - 1:
+                return parts[position + 1]
+            return root
+    return parts[0]
+
+
+def hybrid_search(
+    query: str,
+    limit: int = 10,
+    mode: str = "hybrid",
+    sections: Iterable[str] | None = None,
+    fusion: str = "rrf",
+    alpha: float = 0.5,
+    depth: int = CANDIDATE_DEPTH,
+    nprobe: int = DEFAULT_NPROBE,
+    index: SearchableIndex | None = None,
+    vector_index: VectorIndex | None = None,
+) -> HybridResult:
+    """Ищет документы лексически, по векторам или обоими способами.
+
+    ``sections`` ограничивает выдачу разделами; ``alpha`` — вес векторной
+    оценки при ``fusion="weighted"``. Без векторного индекса (или NumPy)
+    гибридный режим сводится к лексическому, а ``dense_available`` ложно.
+    """
+
+    if mode not in MODES:
+        raise ValueError(f"Неизвестный режим поиска: {mode}")
+    if fusion not in FUSIONS:
+        raise ValueError(f"Неизвестный способ слияния: {fusion}")
+    started = time.perf_counter()
+    wanted = frozenset(sections or ())
+    depth = max(depth, limit)
+    timings: dict[str, float] = {}
+
+    use_lexical = mode in ("lexical", "hybrid")
+    use_dense = mode in ("dense", "hybrid")
+    if use_dense and vector_index is None:
+        vector_index = _default_vector_index()
+        if vector_index is None and mode == "dense":
+            raise FileNotFoundError("Векторный индекс не найден: выполните bitrix24-docs embed")
+    dense_available = not use_dense or vector_index is not None
+    use_dense = use_dense and dense_available
+    if use_lexical and index is None:
+        index = open_index()
+
+    dense_future = None
+    if use_dense and use_lexical:
+        dense_future = _pool().submit(_dense_candidates, vector_index, query, depth, nprobe, wanted, timings)
+    lexical: list[_Candidate] = []
+    if use_lexical:
+        lexical = _lexical_candidates(index, query, depth, wanted, timings)  # type: ignore[arg-type]
+    if dense_future is not None:
+        dense = dense_future.result()
+    elif use_dense:
+        dense = _dense_candidates(vector_index, query, depth, nprobe, wanted, timings)  # type: ignore[arg-type]
+    else:
+        dense = []
+
+    fusion_started = time.perf_counter()
+    hits = _fuse(lexical, dense, limit, fusion=fusion, alpha=alpha)
+    timings["fusion"] = (time.perf_counter() - fusion_started) * 1000
+    timings["total"] = (time.perf_counter() - started) * 1000
+    return HybridResult(hits=hits, timings=timings, dense_available=dense_available)
+
+
+def index_generation() -> tuple[object, ...]:
+    """Поколение индексов: меняется при пересборке лексического или векторного индекса."""
+
+    lexical = default_index_path()
+    return (str(lexical), *_file_version(lexical), *_file_version(vectors_module.VECTORS_DIR / "manifest.json"))
+
+
+def load_labelled_queries(path: Path | None = None) -> list[LabelledQuery]:
+    payload = json.loads((path or EVAL_QUERIES_FILE).read_text(encoding="utf-8"))
+    return [
+        LabelledQuery(
+            query=str(item["query"]),
+            relevant=[str(slug) for slug in item["relevant"]],
+            sections=[str(section) for section in item.get("sections", [])],
+        )
+        for item in payload["queries"]
+    ]
+
+
+def evaluate(
+    queries: Sequence[LabelledQuery],
+    k: int = 10,
+    modes: Sequence[str] = MODES,
+    fusion: str = "rrf",
+    nprobe: int = DEFAULT_NPROBE,
+) -> list[EvalReport]:
+    """Считает recall@k и MRR (по первому релевантному в top-k) для каждого режима.
+
+    Документ релевантен, если его slug без расширения совпадает с меткой или
+    оканчивается на ``_<метка>`` — так одна разметка подходит и для импорта из
+    GitHub, и для обхода сайта.
+    """
+
+    index = open_index()
+    vector_index = _default_vector_index()
+    reports = []
+    for mode in modes:
+        if mode != "lexical" and vector_index is None:
+            continue
+        recalls: list[float] = []
+        reciprocal_ranks: list[float] = []
+        latencies: list[float] = []
+        misses: list[str] = []
+        for item in queries:
+            result = hybrid_search(
+                item.query,
+                limit=k,
+                mode=mode,
+                sections=item.sections,
+                fusion=fusion,
+                nprobe=nprobe,
+                index=index,
+                vector_index=vector_index,
+            )
+            latencies.append(result.timings["total"])
+            ranks = [
+                rank for rank, hit in enumerate(result.hits, start=1) if any(_is_relevant(hit.slug, label) for label in item.relevant)
+            ]
+            found = {label for label in item.relevant for hit in result.hits if _is_relevant(hit.slug, label)}
+            recalls.append(len(found) / len(item.relevant) if item.relevant else 0.0)
+            reciprocal_ranks.append(1.0 / ranks[0] if ranks else 0.0)
+            if not ranks:
+                misses.append(item.query)
+        reports.append(
+            EvalReport(
+                mode=mode,
+                queries=len(queries),
+                k=k,
+                recall=statistics.fmean(recalls) if recalls else 0.0,
+                mrr=statistics.fmean(reciprocal_ranks) if reciprocal_ranks else 0.0,
+                mean_ms=statistics.fmean(latencies) if latencies else 0.0,
+                misses=misses,
+            )
+        )
+    return reports
+
+
+def _fuse(
+    lexical: Sequence[_Candidate],
+    dense: Sequence[_Candidate],
+    limit: int,
+    fusion: str = "rrf",
+    alpha: float = 0.5,
+) -> list[HybridHit]:
+    """Сливает две упорядоченные выдачи документов."""
+
+    hits: dict[str, HybridHit] = {}
+    for source, candidates in (("lexical", lexical), ("dense", dense)):
+        if fusion == "weighted":
+            weight = alpha if source == "dense" else 1.0 - alpha
+            contributions = [weight * value for value in _min_max([c.score for c in candidates])]
+        else:
+            contributions = [1.0 / (RRF_K + rank) for rank in range(1, len(candidates) + 1)]
+        for rank, (candidate, contribution) in enumerate(zip(candidates, contributions), start=1):
+            hit = hits.get(candidate.slug)
+            if hit is None:
+                hit = hits[candidate.slug] = HybridHit(
+                    slug=candidate.slug,
+                    url=candidate.url,
+                    title=candidate.title,
+                    heading=None,
+                    section=section_of(candidate.slug),
+                    score=0.0,
+                )
+            hit.score += contribution
+            if source == "lexical":
+                hit.lexical_rank = rank
+            else:
+                hit.dense_rank = rank
+                # Ссылка и заголовок берутся из лучшего фрагмента.
+                hit.url, hit.heading = candidate.url, candidate.heading
+    # При равной оценке выше документ с лучшей позицией в любой из выдач.
+    ranked = sorted(
+        hits.values(),
+        key=lambda hit: (-hit.score, min(hit.lexical_rank or _NO_RANK, hit.dense_rank or _NO_RANK), hit.slug),
+    )
+    return ranked[:limit]
+
+
+def _lexical_candidates(
+    index: SearchableIndex,
+    query: str,
+    depth: int,
+    sections: frozenset[str],
+    timings: dict[str, float],
+) -> list[_Candidate]:
+    started = time.perf_counter()
+    doc_filter = (lambda document: section_of(str(document["slug"])) in sections) if sections else None
+    hits = search_index(index, query, limit=depth, doc_filter=doc_filter)
+    timings["lexical"] = (time.perf_counter() - started) * 1000
+    return [_Candidate(hit.slug, hit.url, hit.title, None, hit.score) for hit in hits]
+
+
+def _dense_candidates(
+    vector_index: VectorIndex,
+    query: str,
+    depth: int,
+    nprobe: int,
+    sections: frozenset[str],
+    timings: dict[str, float],
+) -> list[_Candidate]:
+    started = time.perf_counter()
+    query_vector = vector_index.embed_query(query)
+    embedded = time.perf_counter()
+    allowed = _section_mask(vector_index, sections) if sections else None
+    rows = vector_index.nearest(query_vector, depth * CHUNKS_PER_DOCUMENT, nprobe=nprobe, allowed=allowed)
+    candidates: dict[str, _Candidate] = {}
+    for row, score in rows:
+        unit = vector_index.units[row]
+        slug = str(unit["slug"])
+        if slug not in candidates:
+            candidates[slug] = _Candidate(
+                slug=slug,
+                url=str(unit["url"]),
+                title=unit.get("title"),  # type: ignore[arg-type]
+                heading=unit.get("heading"),  # type: ignore[arg-type]
+                score=score,
+            )
+            if len(candidates) == depth:
+                break
+    timings["dense_embed"] = (embedded - started) * 1000
+    timings["dense_search"] = (time.perf_counter() - embedded) * 1000
+    return list(candidates.values())
+
+
+def _section_mask(vector_index: VectorIndex, sections: frozenset[str]) -> "np.ndarray":
+    """Маска строк векторного индекса для набора разделов (кэшируется на индексе)."""
+    import numpy as np  # открытый VectorIndex означает, что NumPy уже загружен
+
+    cache = _SECTION_MASKS.setdefault(vector_index, {})
+    mask = cache.get(sections)
+    if mask is None:
+        mask = cache[sections] = np.fromiter(
+            (section_of(str(unit["slug"])) in sections for unit in vector_index.units),
+            dtype=bool,
+            count=len(vector_index.units),
+        )
+    return mask
+
+
+def _default_vector_index() -> VectorIndex | None:
+    if not vectors_module.numpy_available() or not (vectors_module.VECTORS_DIR / "manifest.json").exists():
+        return None
+    return open_vector_index()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DENSE_WORKERS, thread_name_prefix="dense-search")
+    return _executor
+
+
+def _file_version(path: Path) -> tuple[int, int]:
+    # Размер вместе с mtime: время изменения файла меняется с точностью до тика ядра.
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return (0, 0)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _min_max(values: Sequence[float]) -> list[float]:
+    if not values:
+        return []
+    low, high = min(values), max(values)
+    if high == low:
+        return [1.0] * len(values)
+    return [(value - low) / (high - low) for value in values]
+
+
+def _is_relevant(slug: str, label: str) -> bool:
+    slug = _EXTENSION_RE.sub("", slug)
+    return slug == label or slug.endswith(f"_{label}")
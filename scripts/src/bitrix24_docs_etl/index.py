@@ -1,20 +1,135 @@
-"""Построение упрощённого поискового индекса."""
+"""Построение поисковых индексов по нормализованным документам.
+
+``simple_index.json`` — плоский список документов с превью (для совместимости).
+``IndexBuilder`` строит инвертированный индекс по полному Markdown: термы
+после стемминга, постинги с частотами по полям (заголовок, подзаголовки,
+текст) и позициями. На диск он попадает сегментами в компактном формате для
+mmap (см. ``segments`` и ``binary_index``). Поиск реализован в ``search``.
+"""
 
 from __future__ import annotations
 
 import json
+from collections import defaultdict
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterable, Mapping, Sequence
 
-from .storage import DATA_DIR, INDEX_DIR, load_processed_documents
+from .storage import DATA_DIR, INDEX_DIR, ProcessedDocument, load_processed_documents
+from .text import iter_terms, strip_markdown_links
 
 INDEX_FILE = INDEX_DIR / "simple_index.json"
+INVERTED_INDEX_VERSION = 1
+
+FIELDS = ("title", "headings", "body")
+TITLE, HEADINGS, BODY = range(len(FIELDS))
+
+# Постинг: [doc_id, tf_title, tf_headings, tf_body, [позиции...]].
+Posting = Sequence
 
 
 @dataclass(slots=True)
 class IndexStats:
     documents: int
     output_path: Path
+    terms: int = 0
+
+
+class InvertedIndex:
+    """Инвертированный индекс в памяти."""
+
+    def __init__(self, documents: list[dict[str, object]], postings: dict[str, list[list]]) -> None:
+        self.documents = documents
+        self._postings = postings
+        self.avg_field_lengths = _average_lengths(doc["lengths"] for doc in documents)  # type: ignore[misc]
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.documents)
+
+    @property
+    def term_count(self) -> int:
+        return len(self._postings)
+
+    def terms(self) -> Iterable[str]:
+        return self._postings.keys()
+
+    def postings(self, term: str, positions: bool = True) -> Sequence[Posting]:
+        # Позиции в памяти уже есть, флаг нужен для совместимости с BinaryIndex.
+        return self._postings.get(term, ())
+
+    def document(self, doc_id: int) -> Mapping[str, object]:
+        return self.documents[doc_id]
+
+    def field_lengths(self, doc_id: int) -> Sequence[int]:
+        return self.documents[doc_id]["lengths"]  # type: ignore[return-value]
+
+    def to_json(self) -> dict[str, object]:
+        return {
+            "version": INVERTED_INDEX_VERSION,
+            "fields": list(FIELDS),
+            "documents": self.documents,
+            "postings": self._postings,
+        }
+
+    @classmethod
+    def from_json(cls, payload: Mapping[str, object]) -> "InvertedIndex":
+        if payload.get("version") != INVERTED_INDEX_VERSION:
+            raise ValueError(f"Неподдерживаемая версия индекса: {payload.get('version')}")
+        return cls(list(payload["documents"]), dict(payload["postings"]))  # type: ignore[arg-type]
+
+
+class IndexBuilder:
+    """Накопитель постингов: документы добавляются по одному."""
+
+    def __init__(self) -> None:
+        self.documents: list[dict[str, object]] = []
+        self._postings: dict[str, list[list]] = defaultdict(list)
+
+    def add(self, metadata: Mapping[str, object], title: str | None, markdown: str) -> int:
+        doc_id = len(self.documents)
+        entries, lengths = document_terms(title, markdown)
+        for term, entry in entries.items():
+            self._postings[term].append([doc_id, *entry])
+        self.documents.append({**metadata, "lengths": lengths})
+        return doc_id
+
+    def build(self) -> InvertedIndex:
+        return InvertedIndex(self.documents, dict(self._postings))
+
+
+def document_terms(title: str | None, markdown: str) -> tuple[dict[str, list], list[int]]:
+    """Считает частоты термов по полям и позиции для одного документа.
+
+    Позиции сквозные: сначала заголовок документа, затем строки Markdown.
+    Строки, начинающиеся с ``#``, относятся к полю подзаголовков.
+    """
+
+    entries: dict[str, list] = {}
+    lengths = [0, 0, 0]
+    position = 0
+
+    def consume(text: str, field: int) -> None:
+        nonlocal position
+        last = position - 1
+        for last, term in iter_terms(text, start=position):
+            entry = entries.get(term)
+            if entry is None:
+                entry = entries[term] = [0, 0, 0, []]
+            entry[field] += 1
+            if not entry[3] or entry[3][-1] != last:
+                entry[3].append(last)
+        lengths[field] += last + 1 - position
+        position = last + 1
+
+    if title:
+        consume(title, TITLE)
+    for line in strip_markdown_links(markdown).splitlines():
+        if line.lstrip().startswith("#"):
+            consume(line.lstrip("# "), HEADINGS)
+        elif line.strip():
+            consume(line, BODY)
+    return entries, lengths
 
 
 def build_simple_index(limit: int | None = None) -> IndexStats:
@@ -35,3 +150,29 @@ def build_simple_index(limit: int | None = None) -> IndexStats:
     INDEX_FILE.parent.mkdir(parents=True, exist_ok=True)
     INDEX_FILE.write_text(json.dumps(docs, ensure_ascii=False, indent=2), encoding="utf-8")
     return IndexStats(documents=len(docs), output_path=INDEX_FILE)
+
+
+def load_inverted_index(path: Path) -> InvertedIndex:
+    return InvertedIndex.from_json(json.loads(path.read_text(encoding="utf-8")))
+
+
+def document_metadata(doc: ProcessedDocument) -> dict[str, object]:
+    return {
+        "slug": doc.slug,
+        "url": doc.url,
+        "title": doc.title,
+        "markdown_path": str(doc.markdown_path.relative_to(DATA_DIR)),
+        "text_preview": doc.text_preview,
+    }
+
+
+def _average_lengths(lengths: Iterable[Sequence[int]]) -> tuple[float, ...]:
+    totals = [0] * len(FIELDS)
+    count = 0
+    for doc_lengths in lengths:
+        count += 1
+        for field, value in enumerate(doc_lengths):
+            totals[field] += value
+    if not count:
+        return tuple(1.0 for _ in FIELDS)
+    return tuple((total / count) or 1.0 for total in totals)
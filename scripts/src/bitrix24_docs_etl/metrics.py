@@ -0,0 +1,362 @@
+"""Метрики запуска ETL: этапы, операции над документами, HTTP и диск.
+
+Сборщик один на процесс и включается ``start_run`` (CLI делает это по
+``--metrics-json``/``--metrics-prom``/``--profile``); без него функции
+записи ничего не делают. Этап (``stage``) — крупный шаг команды: время,
+процессорное время, число документов и байты из сети и на диск за этап.
+Операция (``timer``/``observe``) — работа над одним документом: HTTP-запрос,
+разбор HTML, Markdown, запись файла, нарезка. По гистограммам операций видно,
+куда уходит время: в сеть, BeautifulSoup, markdownify или диск.
+
+Операции в пуле процессов (``normalize --workers N``) в гистограммы не
+попадают: у каждого процесса свой сборщик.
+
+Отчёт пишется в JSON и в текстовом формате Prometheus (для textfile
+collector node_exporter): так ночные запуски можно сравнивать на графиках.
+С ``profile_stage`` этап выполняется под cProfile и tracemalloc, а
+результаты сохраняются рядом: ``<этап>.prof`` для snakeviz/pstats и
+``<этап>.txt`` с самыми дорогими функциями и местами выделения памяти.
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import io
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Mapping
+
+if TYPE_CHECKING:
+    import cProfile
+
+# Границы корзин гистограмм, с.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Этапы команд CLI, которые можно профилировать.
+STAGES = ("crawl", "normalize", "chunk", "index", "embed", "import", "stream")
+SLOWEST_KEPT = 10
+PROFILE_TOP = 40
+METRIC_PREFIX = "bitrix24_docs"
+
+_active: RunMetrics | None = None
+
+
+@dataclass(slots=True)
+class StageMetrics:
+    seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    documents: int = 0
+    bytes_fetched: int = 0
+    bytes_written: int = 0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "seconds": round(self.seconds, 4),
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            "documents": self.documents,
+            "docs_per_second": round(self.docs_per_second, 1),
+            "bytes_fetched": self.bytes_fetched,
+            "bytes_written": self.bytes_written,
+        }
+
+
+@dataclass(slots=True)
+class Histogram:
+    """Гистограмма длительностей с корзинами ``BUCKETS`` и самыми медленными документами."""
+
+    counts: list[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+    count: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+    # Мин-куча (секунды, документ) из SLOWEST_KEPT самых долгих.
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+
+    def observe(self, seconds: float, key: str | None = None) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+        if key is not None:
+            if len(self.slowest) < SLOWEST_KEPT:
+                heapq.heappush(self.slowest, (seconds, key))
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, key))
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """Пары (граница, число наблюдений не дольше неё), как в Prometheus."""
+
+        pairs: list[tuple[str, int]] = []
+        running = 0
+        for bound, count in zip((*map(str, BUCKETS), "+Inf"), self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 4),
+            "mean_seconds": round(self.total / self.count, 6) if self.count else 0.0,
+            "max_seconds": round(self.maximum, 6),
+            "buckets": dict(self.cumulative()),
+            "slowest": [{"key": key, "seconds": round(seconds, 6)} for seconds, key in sorted(self.slowest, reverse=True)],
+        }
+
+
+@dataclass(slots=True)
+class RunMetrics:
+    command: str = ""
+    profile_stage: str | None = None
+    profile_dir: Path | None = None
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    duration: float = 0.0
+    success: bool = False
+    stages: dict[str, StageMetrics] = field(default_factory=dict)
+    operations: dict[str, Histogram] = field(default_factory=dict)
+    http_statuses: dict[str, int] = field(default_factory=dict)
+    bytes_fetched: int = 0
+    bytes_written: int = 0
+    profiles: dict[str, dict[str, object]] = field(default_factory=dict)
+    _started: float = field(default_factory=time.perf_counter)
+    # Запись идёт и из потоков (хранилище, импорт, потоковый конвейер).
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def observe(self, operation: str, seconds: float, key: str | None = None) -> None:
+        with self._lock:
+            histogram = self.operations.get(operation)
+            if histogram is None:
+                histogram = self.operations[operation] = Histogram()
+            histogram.observe(seconds, key)
+
+    def record_http(self, status: int | str, size: int) -> None:
+        with self._lock:
+            self.http_statuses[str(status)] = self.http_statuses.get(str(status), 0) + 1
+            self.bytes_fetched += size
+
+    def record_written(self, size: int) -> None:
+        with self._lock:
+            self.bytes_written += size
+
+    def add_stage(self, name: str, seconds: float, documents: int = 0) -> StageMetrics:
+        """Этап, время которого измерено снаружи (например, внутри конвейера)."""
+
+        with self._lock:
+            stage = self.stages.setdefault(name, StageMetrics())
+            stage.seconds += seconds
+            stage.documents += documents
+            return stage
+
+    def finish(self, success: bool | None = None) -> None:
+        self.duration = time.perf_counter() - self._started
+        if success is not None:
+            self.success = success
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "command": self.command,
+            "started_at": self.started_at.isoformat(),
+            "duration_seconds": round(self.duration, 4),
+            "success": self.success,
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+            "http": {"responses": dict(sorted(self.http_statuses.items())), "bytes_fetched": self.bytes_fetched},
+            "bytes_written": self.bytes_written,
+            "operations": {name: histogram.to_dict() for name, histogram in sorted(self.operations.items())},
+            "profiles": self.profiles,
+        }
+
+    def to_prometheus(self) -> str:
+        lines: list[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list[tuple[Mapping[str, str], float]]) -> None:
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{_sample_name(full_name, labels)} {_format_value(value)}")
+
+        metric("run_info", "gauge", "Команда последнего запуска.", [({"command": self.command}, 1)])
+        metric("run_success", "gauge", "1, если запуск завершился успешно.", [({}, int(self.success))])
+        metric("run_timestamp_seconds", "gauge", "Время начала запуска (Unix).", [({}, self.started_at.timestamp())])
+        metric("run_duration_seconds", "gauge", "Длительность запуска.", [({}, self.duration)])
+        stages = list(self.stages.items())
+        metric("stage_duration_seconds", "gauge", "Время этапа.", [({"stage": n}, s.seconds) for n, s in stages])
+        metric("stage_cpu_seconds", "gauge", "Процессорное время этапа.", [({"stage": n}, s.cpu_seconds) for n, s in stages])
+        metric("stage_documents", "gauge", "Документов за этап.", [({"stage": n}, s.documents) for n, s in stages])
+        metric("stage_fetched_bytes", "gauge", "Байт загружено за этап.", [({"stage": n}, s.bytes_fetched) for n, s in stages])
+        metric("stage_written_bytes", "gauge", "Байт записано за этап.", [({"stage": n}, s.bytes_written) for n, s in stages])
+        metric(
+            "http_responses_total",
+            "counter",
+            "HTTP-ответы по статусам (error — сбой соединения).",
+            [({"status": status}, count) for status, count in sorted(self.http_statuses.items())],
+        )
+        metric("fetched_bytes_total", "counter", "Байт тел HTTP-ответов.", [({}, self.bytes_fetched)])
+        metric("written_bytes_total", "counter", "Байт записано в файлы данных.", [({}, self.bytes_written)])
+        if self.operations:
+            lines.append(f"# HELP {METRIC_PREFIX}_operation_seconds Длительность операции над одним документом.")
+            lines.append(f"# TYPE {METRIC_PREFIX}_operation_seconds histogram")
+            for name, histogram in sorted(self.operations.items()):
+                for bound, count in histogram.cumulative():
+                    labels = {"operation": name, "le": bound}
+                    lines.append(f"{_sample_name(f'{METRIC_PREFIX}_operation_seconds_bucket', labels)} {count}")
+                labels = {"operation": name}
+                lines.append(f"{_sample_name(f'{METRIC_PREFIX}_operation_seconds_sum', labels)} {_format_value(histogram.total)}")
+                lines.append(f"{_sample_name(f'{METRIC_PREFIX}_operation_seconds_count', labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: Path) -> None:
+        _write_atomic(path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2) + "\n")
+
+    def write_prometheus(self, path: Path) -> None:
+        # Textfile collector читает файл в любой момент: он не должен видеть его недописанным.
+        _write_atomic(path, self.to_prometheus())
+
+
+def start_run(command: str = "", profile_stage: str | None = None, profile_dir: Path | None = None) -> RunMetrics:
+    """Включает сбор метрик для процесса и возвращает сборщик."""
+
+    global _active
+    _active = RunMetrics(command=command, profile_stage=profile_stage, profile_dir=profile_dir)
+    return _active
+
+
+def stop_run() -> RunMetrics | None:
+    global _active
+    run, _active = _active, None
+    if run is not None:
+        run.finish()
+    return run
+
+
+def active() -> RunMetrics | None:
+    return _active
+
+
+@contextmanager
+def stage(name: str) -> Iterator[StageMetrics]:
+    """Меряет этап; вызывающий код записывает в ``documents`` число документов."""
+
+    run = _active
+    if run is None:
+        yield StageMetrics()
+        return
+    fetched, written = run.bytes_fetched, run.bytes_written
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    profiling = run.profile_stage == name and run.profile_dir is not None
+    profiler = _start_profile() if profiling else None
+    current = StageMetrics()
+    try:
+        yield current
+    finally:
+        if profiler is not None:
+            run.profiles[name] = _stop_profile(profiler, name, run.profile_dir)  # type: ignore[arg-type]
+        total = run.add_stage(name, time.perf_counter() - wall_started, current.documents)
+        total.cpu_seconds += time.process_time() - cpu_started
+        total.bytes_fetched += run.bytes_fetched - fetched
+        total.bytes_written += run.bytes_written - written
+
+
+@contextmanager
+def timer(operation: str, key: str | None = None) -> Iterator[None]:
+    """Меряет одну операцию над документом (``key`` — URL или slug)."""
+
+    run = _active
+    if run is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        run.observe(operation, time.perf_counter() - started, key)
+
+
+def add_stage(name: str, seconds: float, documents: int = 0) -> None:
+    run = _active
+    if run is not None:
+        run.add_stage(name, seconds, documents)
+
+
+def observe(operation: str, seconds: float, key: str | None = None) -> None:
+    run = _active
+    if run is not None:
+        run.observe(operation, seconds, key)
+
+
+def record_http(status: int | str, size: int = 0) -> None:
+    run = _active
+    if run is not None:
+        run.record_http(status, size)
+
+
+def record_written(size: int) -> None:
+    run = _active
+    if run is not None:
+        run.record_written(size)
+
+
+def _start_profile() -> cProfile.Profile:
+    # cProfile видит только текущий поток (асинхронный обход и пакетные
+    # этапы идут в нём), tracemalloc — выделения во всех потоках.
+    # Профилировщики импортируются здесь: без --profile они не нужны.
+    import cProfile
+    import tracemalloc
+
+    tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profile(profiler: cProfile.Profile, name: str, directory: Path) -> dict[str, object]:
+    import pstats
+    import tracemalloc
+
+    profiler.disable()
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    directory.mkdir(parents=True, exist_ok=True)
+    stats_path = directory / f"{name}.prof"
+    report_path = directory / f"{name}.txt"
+    profiler.dump_stats(stats_path)
+    report = io.StringIO()
+    report.write(f"# cProfile: этап {name}, первые {PROFILE_TOP} функций по суммарному времени\n\n")
+    pstats.Stats(profiler, stream=report).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP)
+    report.write(f"\n# tracemalloc: пик {peak / 1024 / 1024:.1f} МБ, места выделения памяти, оставшейся к концу этапа\n\n")
+    for line in snapshot.statistics("lineno")[:PROFILE_TOP]:
+        report.write(f"{line}\n")
+    report_path.write_text(report.getvalue(), encoding="utf-8")
+    return {"pstats": str(stats_path), "report": str(report_path), "peak_traced_bytes": peak}
+
+
+def _sample_name(name: str, labels: Mapping[str, str]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+    return f"{name}{{{rendered}}}"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_text(content, encoding="utf-8")
+    tmp_path.replace(path)
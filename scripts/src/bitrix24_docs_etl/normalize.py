@@ -2,59 +2,178 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Iterator
-
-from bs4 import BeautifulSoup
-from markdownify import markdownify
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator
 
+from .parse import parse_html
 from .storage import (
+    batch,
     load_raw_documents,
     persist_processed_document,
     processed_document_exists,
     ProcessedDocumentMeta,
+    RawDocument,
 )
 
+NORMALIZE_STAGES = ("read", "convert", "write")
+# Сколько документов сохранять одной транзакцией хранилища метаданных.
+WRITE_BATCH_SIZE = 256
+
 
 @dataclass(slots=True)
 class NormalizationStats:
     total: int
     processed: int
     skipped: int
+    elapsed: float = 0.0
+    # Время по этапам read/convert/write; для convert в пуле процессов это
+    # суммарное время воркеров, то есть пропускная способность одного ядра.
+    stage_seconds: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def docs_per_second(self) -> float:
+        if self.elapsed <= 0:
+            return 0.0
+        return self.processed / self.elapsed
+
+    def stage_throughput(self, stage: str) -> float:
+        """Документов в секунду, если бы работал только этот этап."""
+
+        seconds = self.stage_seconds.get(stage, 0.0)
+        return self.processed / seconds if seconds > 0 else 0.0
+
+
+def normalize_all(
+    limit: int | None = None,
+    force: bool = False,
+    workers: int = 1,
+    chunksize: int = 8,
+) -> NormalizationStats:
+    """Конвертирует HTML из data/raw в Markdown.
 
+    При ``workers > 1`` конвертация раздаётся пулу процессов порциями по
+    ``chunksize`` документов. Результаты возвращаются и сохраняются в исходном
+    порядке, а в работе одновременно находится не больше ``2 * workers``
+    порций, так что память не растёт с размером корпуса.
+    """
 
-def normalize_all(limit: int | None = None, force: bool = False) -> NormalizationStats:
-    processed = 0
-    skipped = 0
+    if chunksize < 1:
+        raise ValueError(f"chunksize должен быть не меньше 1, получено {chunksize}")
+    stats = NormalizationStats(total=0, processed=0, skipped=0)
+    stats.stage_seconds = dict.fromkeys(NORMALIZE_STAGES, 0.0)
+    started = time.perf_counter()
+    pending = _pending_documents(limit, force, stats)
 
-    for index, raw in enumerate(load_raw_documents()):
-        if limit is not None and index >= limit:
-            break
-        if not force and processed_document_exists(raw.slug):
-            skipped += 1
+    if workers <= 1:
+        conversions = _convert_serial(pending, stats)
+        _persist_conversions(conversions, stats)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            conversions = _convert_parallel(pool, pending, workers, chunksize, stats)
+            _persist_conversions(conversions, stats)
+
+    stats.total = stats.processed + stats.skipped
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def _pending_documents(limit: int | None, force: bool, stats: NormalizationStats) -> Iterator[RawDocument]:
+    """Отдаёт документы, которые нужно (пере)нормализовать, с учётом limit/force."""
+
+    documents = iter(load_raw_documents())
+    index = 0
+    while limit is None or index < limit:
+        started = time.perf_counter()
+        raw = next(documents, None)
+        stats.stage_seconds["read"] += time.perf_counter() - started
+        if raw is None:
+            return
+        index += 1
+        if not force and processed_document_exists(raw.slug, raw.content_hash):
+            stats.skipped += 1
             continue
-        markdown_content, text_content = _convert_html(raw.html)
-        meta = ProcessedDocumentMeta(
-            url=raw.url,
-            title=raw.title,
-            slug=raw.slug,
-            markdown=markdown_content,
-            text=text_content,
-            html_path=raw.html_path,
-            retrieved_at=raw.retrieved_at,
-            links=raw.links,
-        )
-        persist_processed_document(meta, force=force)
-        processed += 1
-    total = processed + skipped
-    return NormalizationStats(total=total, processed=processed, skipped=skipped)
-
-
-def _convert_html(html: str) -> tuple[str, str]:
-    soup = BeautifulSoup(html, "lxml")
-    for tag in soup(["script", "style", "noscript", "nav", "footer", "header"]):
-        tag.decompose()
-    target = soup.find("main") or soup.body or soup
-    markdown_text = markdownify(str(target), heading_style="ATX")
-    text_content = target.get_text(" ", strip=True)
-    return markdown_text.strip(), text_content
+        yield raw
+
+
+def _convert_serial(
+    pending: Iterable[RawDocument],
+    stats: NormalizationStats,
+) -> Iterator[tuple[RawDocument, tuple[str, str]]]:
+    for raw in pending:
+        started = time.perf_counter()
+        converted = convert_html(raw.html)
+        stats.stage_seconds["convert"] += time.perf_counter() - started
+        yield raw, converted
+
+
+def _convert_parallel(
+    pool: ProcessPoolExecutor,
+    pending: Iterator[RawDocument],
+    workers: int,
+    chunksize: int,
+    stats: NormalizationStats,
+) -> Iterator[tuple[RawDocument, tuple[str, str]]]:
+    in_flight: deque[tuple[list[RawDocument], Future[tuple[list[tuple[str, str]], float]]]] = deque()
+
+    def submit_next() -> bool:
+        chunk = list(islice(pending, chunksize))
+        if not chunk:
+            return False
+        in_flight.append((chunk, pool.submit(_convert_chunk, [raw.html for raw in chunk])))
+        return True
+
+    while len(in_flight) < 2 * workers and submit_next():
+        pass
+    while in_flight:
+        chunk, future = in_flight.popleft()
+        converted, seconds = future.result()
+        stats.stage_seconds["convert"] += seconds
+        submit_next()
+        yield from zip(chunk, converted)
+
+
+def _persist_conversions(
+    conversions: Iterable[tuple[RawDocument, tuple[str, str]]],
+    stats: NormalizationStats,
+) -> None:
+    conversions = iter(conversions)
+    while group := list(islice(conversions, WRITE_BATCH_SIZE)):
+        started = time.perf_counter()
+        with batch():
+            for raw, (markdown_content, text_content) in group:
+                persist_processed_document(processed_meta(raw, markdown_content, text_content), force=True)
+        stats.stage_seconds["write"] += time.perf_counter() - started
+        stats.processed += len(group)
+
+
+def processed_meta(raw: RawDocument, markdown_content: str, text_content: str) -> ProcessedDocumentMeta:
+    return ProcessedDocumentMeta(
+        url=raw.url,
+        title=raw.title,
+        slug=raw.slug,
+        markdown=markdown_content,
+        text=text_content,
+        html_path=raw.html_path,
+        retrieved_at=raw.retrieved_at,
+        links=raw.links,
+        source_hash=raw.content_hash,
+    )
+
+
+def _convert_chunk(htmls: list[str]) -> tuple[list[tuple[str, str]], float]:
+    """Выполняется в процессе пула: конвертирует порцию и меряет время."""
+
+    started = time.perf_counter()
+    converted = [convert_html(html) for html in htmls]
+    return converted, time.perf_counter() - started
+
+
+def convert_html(html: str) -> tuple[str, str]:
+    """Markdown и текст страницы; выполняется и в пуле процессов."""
+
+    parsed = parse_html(html)
+    return parsed.markdown or "", parsed.text or ""
@@ -0,0 +1,246 @@
+"""Упакованный корпус: все нормализованные документы в одном файле.
+
+Для раздачи зеркала на узлы поиска вместо тысяч файлов ``processed/`` —
+один файл. Читатель открывает его через mmap: тело документа отдаётся
+срезом ``memoryview`` без копирования, а поиск по slug — обращение к
+хэш-таблице фиксированного размера, без открытия файлов.
+
+Структура файла (все смещения абсолютные, little-endian)::
+
+    заголовок  HEADER
+    data       по документу: slug, JSON-метаданные, Markdown (UTF-8)
+    doc_table  ENTRY[doc_count]      смещение slug и длины slug/метаданных/тела
+    slots      uint32[slot_count]    хэш-таблица: номер документа + 1, 0 — пусто
+    info       JSON: версия, время сборки, число документов, отпечаток индекса
+
+Документы идут в порядке slug. Хэш-таблица — открытая адресация с
+линейным пробированием по CRC32 slug; слотов вдвое больше документов
+(степень двойки), поэтому цепочки короткие.
+
+В ``info`` записывается отпечаток файла поискового индекса (имя, mtime,
+размер) на момент упаковки: если индекс с тех пор пересобран, пакет мог
+отстать от него (``is_current``).
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Mapping
+
+from .storage import load_processed_documents
+
+MAGIC = b"B24PACK\x01"
+PACK_VERSION = 1
+PACK_FILE_NAME = "corpus.pack"
+HEADER = struct.Struct("<8sIIQQQQQ")
+ENTRY = struct.Struct("<QIII")
+_U32 = struct.Struct("<I")
+# Поля метаданных, которые имеют смысл вне исходного каталога данных.
+META_FIELDS = ("slug", "url", "title", "links", "retrieved_at", "text_preview")
+
+
+@dataclass(slots=True)
+class PackStats:
+    path: Path
+    documents: int = 0
+    bytes: int = 0
+    elapsed: float = 0.0
+
+
+class CorpusPack:
+    """Упакованный корпус, открытый через mmap.
+
+    ``body`` возвращает ``memoryview`` на отображённый файл; такие срезы нужно
+    освободить до ``close``, иначе mmap не закроется (``BufferError``).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = path.open("rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} пуст: это не упакованный корпус") from None
+        self._view = memoryview(self._mm)
+        if len(self._mm) < HEADER.size or self._mm[:8] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} не является упакованным корпусом Bitrix24")
+        header = HEADER.unpack_from(self._mm, 0)
+        self._doc_count, self._slot_count = header[1], header[2]
+        _data, self._doc_table, self._slots, self._info, _end = header[3:]
+
+    def __enter__(self) -> "CorpusPack":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._doc_count
+
+    def __contains__(self, slug: object) -> bool:
+        return isinstance(slug, str) and self._find(slug.encode("utf-8")) is not None
+
+    def close(self) -> None:
+        self._view.release()
+        self._mm.close()
+        self._file.close()
+
+    @property
+    def info(self) -> Mapping[str, object]:
+        return json.loads(self._view[self._info :].tobytes())
+
+    def is_current(self) -> bool:
+        """Собран ли пакет для текущей версии поискового индекса."""
+
+        return self.info.get("index_stamp") == index_stamp()
+
+    def slugs(self) -> Iterator[str]:
+        for doc_id in range(self._doc_count):
+            offset, slug_length, _, _ = self._entry(doc_id)
+            yield self._view[offset : offset + slug_length].tobytes().decode("utf-8")
+
+    def document(self, slug: str) -> tuple[dict[str, object], memoryview] | None:
+        """Метаданные и Markdown документа (срезом mmap) за один поиск в хэш-таблице."""
+
+        doc_id = self._find(slug.encode("utf-8"))
+        if doc_id is None:
+            return None
+        offset, slug_length, meta_length, body_length = self._entry(doc_id)
+        start = offset + slug_length
+        meta = json.loads(self._view[start : start + meta_length].tobytes())
+        start += meta_length
+        return meta, self._view[start : start + body_length]
+
+    def body(self, slug: str) -> memoryview | None:
+        """Markdown документа срезом mmap (UTF-8) или ``None``, если его нет."""
+
+        doc_id = self._find(slug.encode("utf-8"))
+        if doc_id is None:
+            return None
+        offset, slug_length, meta_length, body_length = self._entry(doc_id)
+        start = offset + slug_length + meta_length
+        return self._view[start : start + body_length]
+
+    def text(self, slug: str) -> str | None:
+        body = self.body(slug)
+        if body is None:
+            return None
+        with body:
+            return str(body, "utf-8")
+
+    def meta(self, slug: str) -> dict[str, object] | None:
+        doc_id = self._find(slug.encode("utf-8"))
+        if doc_id is None:
+            return None
+        offset, slug_length, meta_length, _ = self._entry(doc_id)
+        start = offset + slug_length
+        return json.loads(self._view[start : start + meta_length].tobytes())
+
+    def _entry(self, doc_id: int) -> tuple[int, int, int, int]:
+        return ENTRY.unpack_from(self._mm, self._doc_table + doc_id * ENTRY.size)
+
+    def _find(self, slug: bytes) -> int | None:
+        if not self._slot_count:
+            return None
+        mask = self._slot_count - 1
+        slot = zlib.crc32(slug) & mask
+        while True:
+            value = _U32.unpack_from(self._mm, self._slots + slot * 4)[0]
+            if value == 0:
+                return None
+            offset, slug_length, _, _ = self._entry(value - 1)
+            if self._mm[offset : offset + slug_length] == slug:
+                return value - 1
+            slot = (slot + 1) & mask
+
+
+def write_pack(path: Path, prefix: str | None = None) -> PackStats:
+    """Упаковывает нормализованные документы в один файл (атомарно, через временный файл).
+
+    Тела пишутся в файл по мере чтения; в памяти остаются только таблицы.
+    """
+
+    started = time.perf_counter()
+    stats = PackStats(path=path)
+    entries = bytearray()
+    slugs: list[bytes] = []
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with tmp_path.open("wb") as handle:
+        handle.write(bytes(HEADER.size))
+        for document in load_processed_documents(prefix):
+            slug = document.slug.encode("utf-8")
+            meta = {field: getattr(document, field) for field in META_FIELDS}
+            encoded_meta = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            body = document.markdown_path.read_bytes()
+            entries += ENTRY.pack(handle.tell(), len(slug), len(encoded_meta), len(body))
+            handle.write(slug)
+            handle.write(encoded_meta)
+            handle.write(body)
+            slugs.append(slug)
+
+        doc_table = handle.tell()
+        handle.write(entries)
+        slots_offset = handle.tell()
+        slot_count = _slot_count(len(slugs))
+        handle.write(_build_slots(slugs, slot_count))
+        info_offset = handle.tell()
+        info = {
+            "version": PACK_VERSION,
+            "documents": len(slugs),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "meta_fields": list(META_FIELDS),
+            "index_stamp": index_stamp(),
+        }
+        handle.write(json.dumps(info, ensure_ascii=False).encode("utf-8"))
+        end = handle.tell()
+        handle.seek(0)
+        handle.write(HEADER.pack(MAGIC, len(slugs), slot_count, HEADER.size, doc_table, slots_offset, info_offset, end))
+    tmp_path.replace(path)
+    stats.documents = len(slugs)
+    stats.bytes = end
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def index_stamp() -> list[object] | None:
+    """Отпечаток файла поискового индекса (имя, mtime, размер); ``None``, если индекса нет.
+
+    В отличие от ``hybrid.index_generation``, векторный индекс не учитывается:
+    пакет хранит только документы.
+    """
+
+    from .search import default_index_path
+
+    path = default_index_path()
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return [path.name, stat.st_mtime_ns, stat.st_size]
+
+
+def _slot_count(documents: int) -> int:
+    count = 1
+    while count < documents * 2:
+        count <<= 1
+    return count if documents else 0
+
+
+def _build_slots(slugs: list[bytes], slot_count: int) -> bytes:
+    slots = [0] * slot_count
+    mask = slot_count - 1
+    for doc_id, slug in enumerate(slugs):
+        slot = zlib.crc32(slug) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = doc_id + 1
+    return struct.pack(f"<{slot_count}I", *slots)
@@ -0,0 +1,89 @@
+"""Разбор HTML-страниц Bitrix24 за один проход парсера.
+
+Заголовок, ссылки, Markdown основного содержимого и плоский текст
+извлекаются из одного дерева BeautifulSoup: раньше ``fetch`` и ``normalize``
+разбирали каждую страницу трижды.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+from markdownify import MarkdownConverter
+
+from . import metrics
+
+BOILERPLATE_TAGS = ("script", "style", "noscript", "nav", "footer", "header")
+SKIPPED_LINK_PREFIXES = ("mailto:", "javascript:", "tel:")
+
+_CONVERTER = MarkdownConverter(heading_style="ATX")
+
+
+@dataclass(slots=True)
+class ParsedPage:
+    title: Optional[str]
+    links: tuple[str, ...] = ()
+    markdown: Optional[str] = None
+    text: Optional[str] = None
+
+
+def parse_html(
+    html_text: str,
+    source_url: str | None = None,
+    base_url: str | None = None,
+    convert: bool = True,
+) -> ParsedPage:
+    """Разбирает страницу один раз и возвращает всё, что нужно ETL.
+
+    Ссылки собираются, только если передан ``source_url``; в них остаются лишь
+    адреса с хоста ``base_url`` (по умолчанию — хоста самой страницы).
+    При ``convert=False`` Markdown и текст не строятся.
+    """
+
+    with metrics.timer("parse", source_url):
+        soup = BeautifulSoup(html_text, "lxml")
+    title = _title(soup)
+    links: tuple[str, ...] = ()
+    if source_url is not None:
+        links = _links(soup, source_url, base_url or source_url)
+    if not convert:
+        return ParsedPage(title=title, links=links)
+
+    # Ссылки из навигации уже собраны, теперь шаблонные блоки можно удалить.
+    for tag in soup(list(BOILERPLATE_TAGS)):
+        tag.decompose()
+    target = soup.find("main") or soup.body or soup
+    text_content = target.get_text(" ", strip=True)
+    with metrics.timer("markdown", source_url):
+        markdown_text = _CONVERTER.convert_soup(target)
+    return ParsedPage(title=title, links=links, markdown=markdown_text.strip(), text=text_content)
+
+
+def _title(soup: BeautifulSoup) -> Optional[str]:
+    if soup.title and soup.title.string:
+        return soup.title.string.strip()
+    h1 = soup.find("h1")
+    if h1 and h1.text:
+        return h1.text.strip()
+    return None
+
+
+def _links(soup: BeautifulSoup, source_url: str, base_url: str) -> tuple[str, ...]:
+    """Извлекает абсолютные ссылки на документы того же хоста."""
+
+    host = urlparse(base_url).netloc
+    links: set[str] = set()
+    for tag in soup.find_all("a", href=True):
+        href = tag["href"].strip()
+        if not href or href.startswith("#"):
+            continue
+        if href.startswith(SKIPPED_LINK_PREFIXES):
+            continue
+        absolute = urljoin(source_url, href)
+        parsed = urlparse(absolute)
+        if parsed.netloc == host:
+            links.add(parsed._replace(fragment="").geturl())
+    return tuple(sorted(links))
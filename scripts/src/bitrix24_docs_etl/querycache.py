@@ -0,0 +1,141 @@
+"""Кэш результатов поиска.
+
+Записи вытесняются по LRU при превышении числа записей или суммарного
+размера в байтах и устаревают через TTL. Каждая запись относится к
+поколению индекса: когда поколение меняется (индекс пересобран), кэш
+очищается целиком при первом же обращении. Счётчики попаданий, промахов и
+вытеснений нужны, чтобы подобрать размер кэша.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Callable, Generic, Hashable, TypeVar
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_TTL = 300.0
+
+V = TypeVar("V")
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "hit_ratio": round(self.hit_ratio, 4),
+        }
+
+
+@dataclass(slots=True)
+class _Entry(Generic[V]):
+    value: V
+    size: int
+    expires_at: float
+
+
+class QueryCache(Generic[V]):
+    """Потокобезопасный LRU-кэш с TTL, лимитом в байтах и поколением индекса."""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, _Entry[V]] = OrderedDict()
+        self._generation: Hashable = None
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def get(self, key: Hashable, generation: Hashable = None) -> V | None:
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            if entry.expires_at <= self._clock():
+                self._remove(key)
+                self._stats.expirations += 1
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return entry.value
+
+    def put(self, key: Hashable, value: V, size: int, generation: Hashable = None) -> bool:
+        """Кладёт значение; записи больше ``max_bytes`` не кэшируются."""
+
+        if size > self.max_bytes or self.max_entries <= 0:
+            return False
+        with self._lock:
+            self._check_generation(generation)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, size, self._clock() + self.ttl)
+            self._stats.bytes += size
+            while len(self._entries) > self.max_entries or self._stats.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats.evictions += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stats.bytes = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return replace(self._stats, entries=len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_generation(self, generation: Hashable) -> None:
+        if generation == self._generation:
+            return
+        if self._entries:
+            self._stats.invalidations += 1
+        self._entries.clear()
+        self._stats.bytes = 0
+        self._generation = generation
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._stats.bytes -= entry.size
+
+
+def normalize_query(query: str) -> str:
+    """Ключ запроса: регистр и лишние пробелы не влияют на результат поиска."""
+
+    return " ".join(query.casefold().split())
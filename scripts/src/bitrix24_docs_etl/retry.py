@@ -0,0 +1,115 @@
+"""Повторы запросов и автомат-предохранитель для загрузчика.
+
+``RetryPolicy`` решает, какие сбои временные (таймауты, обрывы соединения,
+429 и 5xx), и считает паузу перед повтором: экспоненциальный рост с
+джиттером, а если сервер прислал ``Retry-After`` — столько, сколько он
+просит. ``CircuitBreaker`` приостанавливает все запросы к хосту после серии
+сбоев подряд или по ``Retry-After`` (не дольше ``max_cooldown``): воркеры ждут, а не добивают
+перегруженный сервер. После паузы запросы идут снова; первый же сбой
+открывает предохранитель заново с удвоенной паузой, успех сбрасывает её.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+@dataclass(slots=True)
+class RetryPolicy:
+    attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    # Больше этого Retry-After не ждём: считаем, что хост недоступен.
+    max_retry_after: float = 120.0
+    statuses: frozenset[int] = RETRY_STATUSES
+
+    def should_retry(self, attempt: int, response: httpx.Response | None, error: BaseException | None) -> bool:
+        if attempt + 1 >= self.attempts:
+            return False
+        if error is not None:
+            return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+        return response is not None and response.status_code in self.statuses
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Пауза перед повтором номер ``attempt + 1`` (equal jitter)."""
+
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        ceiling = min(self.max_delay, self.base_delay * (2**attempt))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+@dataclass(slots=True)
+class _HostState:
+    failures: int = 0
+    open_until: float = 0.0
+    cooldown: float = 0.0
+
+
+@dataclass(slots=True)
+class CircuitBreaker:
+    threshold: int = 5
+    cooldown: float = 5.0
+    max_cooldown: float = 60.0
+    trips: int = 0
+    _hosts: dict[str, _HostState] = field(default_factory=dict)
+
+    async def wait(self, host: str) -> None:
+        """Ждёт, пока предохранитель хоста открыт."""
+
+        state = self._hosts.get(host)
+        while state is not None:
+            remaining = state.open_until - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    def is_open(self, host: str) -> bool:
+        state = self._hosts.get(host)
+        return state is not None and state.open_until > time.monotonic()
+
+    def record_success(self, host: str) -> None:
+        state = self._hosts.get(host)
+        if state is not None:
+            state.failures = 0
+            state.cooldown = 0.0
+
+    def record_failure(self, host: str, retry_after: float | None = None) -> None:
+        state = self._hosts.setdefault(host, _HostState())
+        state.failures += 1
+        now = time.monotonic()
+        if retry_after is not None:
+            # Retry-After: 86400 не должен останавливать всех воркеров на сутки.
+            pause = min(retry_after, self.max_cooldown)
+        elif state.failures >= self.threshold:
+            pause = state.cooldown = min(self.max_cooldown, state.cooldown * 2 if state.cooldown else self.cooldown)
+        else:
+            return
+        if now + pause > state.open_until:
+            if state.open_until <= now:
+                self.trips += 1
+            state.open_until = now + pause
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    """``Retry-After`` в секундах: число или HTTP-дата."""
+
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
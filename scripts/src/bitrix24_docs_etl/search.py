@@ -0,0 +1,217 @@
+"""Офлайн-поиск по инвертированному индексу с ранжированием BM25F."""
+
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+import weakref
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Mapping, Protocol, Sequence
+
+from . import index as index_module
+from . import segments as segments_module
+from .binary_index import BinaryIndex
+from .index import FIELDS, Posting
+from .text import analyze, phrase_terms
+
+K1 = 1.2
+B = 0.75
+FIELD_BOOSTS = (3.0, 2.0, 1.0)
+
+_PHRASE_RE = re.compile(r'"([^"]+)"')
+_OPEN: dict[Path, tuple[int, SearchableIndex]] = {}
+_OPEN_LOCK = threading.Lock()
+_WEIGHTS: "weakref.WeakKeyDictionary[object, dict[int, tuple[float, ...]]]" = weakref.WeakKeyDictionary()
+
+
+class SearchableIndex(Protocol):
+    """То, что нужно ранжированию от любой реализации индекса."""
+
+    avg_field_lengths: Sequence[float]
+
+    @property
+    def doc_count(self) -> int: ...
+
+    def postings(self, term: str, positions: bool = True) -> Sequence[Posting]: ...
+
+    def document(self, doc_id: int) -> Mapping[str, object]: ...
+
+    def field_lengths(self, doc_id: int) -> Sequence[int]: ...
+
+
+@dataclass(slots=True)
+class ParsedQuery:
+    terms: list[str]
+    phrases: list[list[str]] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class SearchHit:
+    slug: str
+    url: str
+    title: str | None
+    score: float
+    markdown_path: str
+    text_preview: str = ""
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "slug": self.slug,
+            "url": self.url,
+            "title": self.title,
+            "score": round(self.score, 4),
+            "markdown_path": self.markdown_path,
+            "text_preview": self.text_preview,
+        }
+
+
+def parse_query(query: str) -> ParsedQuery:
+    """Выделяет фразы в кавычках; все слова запроса участвуют в ранжировании."""
+
+    raw_phrases = _PHRASE_RE.findall(query)
+    phrases = [phrase_terms(phrase) for phrase in raw_phrases]
+    terms = analyze(_PHRASE_RE.sub(" ", query))
+    for phrase in raw_phrases:
+        terms.extend(analyze(phrase))
+    return ParsedQuery(terms=list(dict.fromkeys(terms)), phrases=[phrase for phrase in phrases if phrase])
+
+
+def score_documents(index: SearchableIndex, query: ParsedQuery) -> dict[int, float]:
+    """Возвращает BM25F-оценки документов, где встретился хотя бы один терм.
+
+    Если в запросе есть фразы, остаются только документы, содержащие их целиком.
+    """
+
+    scores: dict[int, float] = {}
+    total = index.doc_count
+    weights = _field_weights(index)
+    positions: dict[str, dict[int, Sequence[int]]] = {}
+    in_phrases = {term for phrase in query.phrases for term in phrase}
+
+    for term in query.terms:
+        keep_positions = term in in_phrases
+        postings = index.postings(term, positions=keep_positions)
+        if not postings:
+            continue
+        idf = math.log(1.0 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+        term_positions: dict[int, Sequence[int]] = {}
+        for posting in postings:
+            doc_id = posting[0]
+            title_weight, headings_weight, body_weight = weights(doc_id)
+            weighted = posting[1] * title_weight + posting[2] * headings_weight + posting[3] * body_weight
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * weighted * (K1 + 1.0) / (weighted + K1)
+            if keep_positions:
+                term_positions[doc_id] = posting[4]
+        if keep_positions:
+            positions[term] = term_positions
+
+    for phrase in query.phrases:
+        scores = {doc_id: score for doc_id, score in scores.items() if _contains_phrase(positions, phrase, doc_id)}
+    return scores
+
+
+def search_index(
+    index: SearchableIndex,
+    query: str,
+    limit: int = 10,
+    doc_filter: Callable[[Mapping[str, object]], bool] | None = None,
+) -> list[SearchHit]:
+    """Лучшие ``limit`` документов; ``doc_filter`` отбирает их по карточке документа."""
+
+    scores = score_documents(index, parse_query(query))
+    if doc_filter is not None:
+        scores = {doc_id: score for doc_id, score in scores.items() if doc_filter(index.document(doc_id))}
+    best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+    return [_make_hit(index.document(doc_id), score) for doc_id, score in best]
+
+
+def search(query: str, limit: int = 10, index_path: Path | None = None) -> list[SearchHit]:
+    """Ищет по локальному индексу (он открывается один раз на процесс)."""
+
+    return search_index(open_index(index_path), query, limit)
+
+
+def open_index(path: Path | None = None) -> SearchableIndex:
+    """Открывает индекс для поиска.
+
+    По умолчанию берётся сегментный индекс (``segments/manifest.json``); явно
+    можно передать и отдельный индекс ``.bin`` или JSON. Открытый индекс
+    кэшируется по пути и времени изменения файла, поэтому обновление индекса
+    подхватывается без перезапуска процесса; открытым остаётся только текущее
+    поколение.
+    """
+
+    path = path or default_index_path()
+    mtime_ns = path.stat().st_mtime_ns
+    with _OPEN_LOCK:
+        current = _OPEN.get(path)
+        if current is not None and current[0] == mtime_ns:
+            return current[1]
+        index = _open(path)
+        # Держим только текущее поколение. Прежнее закрывается (mmap и файлы
+        # сегментов), когда его отпустит последний выполняющийся поиск.
+        _OPEN[path] = (mtime_ns, index)
+    return index
+
+
+def default_index_path() -> Path:
+    """Файл индекса, который откроет ``open_index()`` без аргументов."""
+
+    return segments_module.manifest_path()
+
+
+def _field_weights(index: SearchableIndex) -> Callable[[int], tuple[float, ...]]:
+    """Веса полей документа: буст, делённый на нормировку длины BM25F.
+
+    Они не зависят от запроса, поэтому кэшируются на объекте индекса.
+    """
+
+    cache = _WEIGHTS.setdefault(index, {})
+    averages = index.avg_field_lengths
+
+    def weights(doc_id: int) -> tuple[float, ...]:
+        value = cache.get(doc_id)
+        if value is None:
+            lengths = index.field_lengths(doc_id)
+            value = cache[doc_id] = tuple(
+                FIELD_BOOSTS[field_no] / (1.0 - B + B * lengths[field_no] / averages[field_no])
+                for field_no in range(len(FIELDS))
+            )
+        return value
+
+    return weights
+
+
+def _open(path: Path) -> SearchableIndex:
+    if path.name == "manifest.json":
+        return segments_module.SegmentedIndex(path.parent)
+    if path.suffix == ".bin":
+        return BinaryIndex(path)
+    return index_module.load_inverted_index(path)
+
+
+def _contains_phrase(positions: dict[str, dict[int, Sequence[int]]], phrase: list[str], doc_id: int) -> bool:
+    try:
+        candidates = set(positions[phrase[0]][doc_id])
+        for offset, term in enumerate(phrase[1:], start=1):
+            following = {position - offset for position in positions[term][doc_id]}
+            candidates &= following
+            if not candidates:
+                return False
+    except KeyError:
+        return False
+    return bool(candidates)
+
+
+def _make_hit(document: Mapping[str, object], score: float) -> SearchHit:
+    return SearchHit(
+        slug=str(document["slug"]),
+        url=str(document["url"]),
+        title=document.get("title"),  # type: ignore[arg-type]
+        score=score,
+        markdown_path=str(document.get("markdown_path", "")),
+        text_preview=str(document.get("text_preview", "")),
+    )
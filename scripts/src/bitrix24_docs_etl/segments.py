@@ -0,0 +1,364 @@
+"""Инкрементальный сегментный индекс.
+
+Индекс состоит из неизменяемых сегментов в бинарном формате (``binary_index``)
+и манифеста ``segments/manifest.json``. В манифесте для каждого документа
+хранятся хэш содержимого, сегмент и номер внутри сегмента, а для сегментов —
+списки удалённых документов.
+
+Обновление трогает только изменившиеся документы: новые и изменённые версии
+попадают в новый сегмент, старые помечаются удалёнными. Когда сегментов
+становится много или в них накапливается много удалённых документов,
+сегменты сливаются в один без повторной токенизации.
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Mapping, Sequence
+
+from .binary_index import BinaryIndex, write_binary_index
+from .index import FIELDS, IndexBuilder, InvertedIndex, Posting, document_metadata
+from .storage import INDEX_DIR, load_processed_document, processed_stamp, scan_processed_markdown
+
+SEGMENTS_DIR = INDEX_DIR / "segments"
+MANIFEST_VERSION = 1
+MERGE_MAX_SEGMENTS = 8
+MERGE_MAX_DELETED_RATIO = 0.3
+# Сколько документов копить в памяти при пошаговом обновлении до записи сегмента.
+INDEX_FLUSH_DOCS = 1000
+
+
+@dataclass(slots=True)
+class SegmentUpdateStats:
+    added: int = 0
+    changed: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    segments: int = 0
+    merged: bool = False
+    generation: int = 0
+    elapsed: float = 0.0
+
+
+def manifest_path(directory: Path | None = None) -> Path:
+    return (directory or SEGMENTS_DIR) / "manifest.json"
+
+
+def load_manifest(directory: Path | None = None) -> dict[str, object]:
+    path = manifest_path(directory)
+    if not path.exists():
+        return _empty_manifest()
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Неподдерживаемая версия манифеста сегментов: {manifest.get('version')}")
+    return manifest
+
+
+def update_index(
+    full: bool = False,
+    merge_max_segments: int = MERGE_MAX_SEGMENTS,
+    directory: Path | None = None,
+) -> SegmentUpdateStats:
+    """Приводит сегментный индекс в соответствие с processed/markdown.
+
+    Изменения находятся по (mtime, размер) Markdown-файлов и метаданных, а
+    хэш считается только у документов, которые поменялись на диске. При ``full=True`` индекс строится
+    заново одним сегментом.
+    """
+
+    return SegmentUpdate(full, merge_max_segments, directory).finish()
+
+
+class SegmentUpdate:
+    """Обновление сегментного индекса, в которое документы подаются по одному.
+
+    ``update_index`` подаёт сразу все файлы processed/markdown, потоковый
+    конвейер — по мере нормализации, чтобы токенизация шла параллельно с
+    загрузкой. ``finish`` досматривает остальные файлы, убирает удалённые
+    документы и записывает манифест. С ``flush_docs`` накопленные документы
+    сбрасываются в отдельный сегмент, и память не растёт с размером корпуса.
+    """
+
+    def __init__(
+        self,
+        full: bool = False,
+        merge_max_segments: int = MERGE_MAX_SEGMENTS,
+        directory: Path | None = None,
+        flush_docs: int | None = None,
+    ) -> None:
+        self._started = time.perf_counter()
+        self.directory = directory or SEGMENTS_DIR
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.full = full
+        self.merge_max_segments = merge_max_segments
+        self.flush_docs = flush_docs
+        manifest = load_manifest(self.directory)
+        if full:
+            manifest = {
+                **_empty_manifest(),
+                "generation": manifest["generation"],
+                "next_segment": manifest["next_segment"],
+            }
+        self.manifest = manifest
+        self.stats = SegmentUpdateStats()
+        self._seen: set[str] = set()
+        self._builder = IndexBuilder()
+        self._new_entries: dict[str, dict[str, object]] = {}
+        self._restated = False
+
+    def add(self, slug: str, stamp: tuple[int, ...] | None = None) -> None:
+        """Учитывает документ; ``stamp`` — его отпечаток из ``scan_processed_markdown``."""
+
+        if slug in self._seen:
+            return
+        self._seen.add(slug)
+        documents: dict[str, dict[str, object]] = self.manifest["documents"]  # type: ignore[assignment]
+        entry = documents.get(slug)
+        if stamp is not None and entry is not None and _entry_stamp(entry) == stamp:
+            self.stats.unchanged += 1
+            return
+        doc = load_processed_document(slug)
+        if doc is None:
+            # Markdown есть, а метаданных уже нет: документ больше не читается,
+            # значит и в индексе его оставлять нельзя.
+            if entry is not None:
+                _mark_deleted(self.manifest["segments"], documents.pop(slug))  # type: ignore[arg-type]
+                self.stats.deleted += 1
+            return
+        if stamp is None:
+            stamp = processed_stamp(slug)
+            if entry is not None and _entry_stamp(entry) == stamp:
+                self.stats.unchanged += 1
+                return
+        markdown = doc.markdown_path.read_text(encoding="utf-8")
+        metadata = document_metadata(doc)
+        content_hash = _document_hash(metadata, markdown)
+        if entry is not None and entry["hash"] == content_hash:
+            entry.update(_stamp_fields(stamp))
+            self._restated = True
+            self.stats.unchanged += 1
+            return
+        if entry is None:
+            self.stats.added += 1
+        else:
+            self.stats.changed += 1
+            _mark_deleted(self.manifest["segments"], entry)  # type: ignore[arg-type]
+        doc_id = self._builder.add(metadata, doc.title, markdown)
+        self._new_entries[slug] = {"doc": doc_id, "hash": content_hash, **_stamp_fields(stamp)}
+        if self.flush_docs and len(self._new_entries) >= self.flush_docs:
+            self._flush()
+
+    def finish(self, on_disk: Mapping[str, tuple[int, ...]] | None = None) -> SegmentUpdateStats:
+        manifest = self.manifest
+        directory = self.directory
+        documents: dict[str, dict[str, object]] = manifest["documents"]  # type: ignore[assignment]
+        segments: list[dict[str, object]] = manifest["segments"]  # type: ignore[assignment]
+        stats = self.stats
+
+        on_disk = scan_processed_markdown() if on_disk is None else on_disk
+        for slug in sorted(on_disk):
+            self.add(slug, on_disk[slug])
+        for slug in [slug for slug in documents if slug not in on_disk and slug not in self._new_entries]:
+            _mark_deleted(segments, documents.pop(slug))
+            stats.deleted += 1
+        self._flush()
+
+        obsolete: list[str] = []
+        if _needs_merge(segments, self.merge_max_segments):
+            obsolete = _merge_segments(manifest, directory)
+            stats.merged = True
+        obsolete += [str(segment["name"]) for segment in segments if segment["docs"] == len(segment["deleted"])]
+        manifest["segments"] = [segment for segment in manifest["segments"] if segment["name"] not in obsolete]  # type: ignore[attr-defined]
+
+        changed = bool(stats.added or stats.changed or stats.deleted or stats.merged or self.full)
+        if changed:
+            manifest["generation"] = int(manifest["generation"]) + 1
+        if changed or self._restated or not manifest_path(directory).exists():
+            _write_manifest(manifest, directory)
+            _remove_unreferenced(manifest, directory)
+
+        stats.segments = len(manifest["segments"])  # type: ignore[arg-type]
+        stats.generation = int(manifest["generation"])
+        stats.elapsed = time.perf_counter() - self._started
+        return stats
+
+    def _flush(self) -> None:
+        """Пишет накопленные документы новым сегментом."""
+
+        if not self._new_entries:
+            return
+        manifest = self.manifest
+        name = f"seg_{int(manifest['next_segment']):06d}.bin"
+        manifest["next_segment"] = int(manifest["next_segment"]) + 1
+        write_binary_index(self._builder.build(), self.directory / name)
+        manifest["segments"].append({"name": name, "docs": len(self._new_entries), "deleted": []})  # type: ignore[attr-defined]
+        documents: dict[str, dict[str, object]] = manifest["documents"]  # type: ignore[assignment]
+        for slug, entry in self._new_entries.items():
+            documents[slug] = {**entry, "segment": name}
+        self._builder = IndexBuilder()
+        self._new_entries = {}
+
+
+class SegmentedIndex:
+    """Поиск поверх всех живых сегментов как по одному индексу.
+
+    Глобальный номер документа — смещение сегмента плюс локальный номер;
+    удалённые документы отфильтровываются из постингов.
+    """
+
+    def __init__(self, directory: Path | None = None) -> None:
+        self.directory = directory or SEGMENTS_DIR
+        manifest = load_manifest(self.directory)
+        self.generation = int(manifest["generation"])
+        self._segments: list[BinaryIndex] = []
+        self._deleted: list[frozenset[int]] = []
+        self._bases: list[int] = []
+        base = 0
+        for segment in manifest["segments"]:  # type: ignore[attr-defined]
+            reader = BinaryIndex(self.directory / segment["name"])
+            self._segments.append(reader)
+            self._deleted.append(frozenset(segment["deleted"]))
+            self._bases.append(base)
+            base += reader.doc_count
+        self._live = sum(reader.doc_count - len(deleted) for reader, deleted in zip(self._segments, self._deleted))
+        self.avg_field_lengths = _combined_averages(self._segments, self._deleted)
+
+    def close(self) -> None:
+        for reader in self._segments:
+            reader.close()
+
+    @property
+    def doc_count(self) -> int:
+        return self._live
+
+    def postings(self, term: str, positions: bool = True) -> Sequence[Posting]:
+        combined: list[list] = []
+        for reader, deleted, base in zip(self._segments, self._deleted, self._bases):
+            for posting in reader.postings(term, positions=positions):
+                if posting[0] not in deleted:
+                    combined.append([base + posting[0], *posting[1:]])
+        return combined
+
+    def document(self, doc_id: int) -> Mapping[str, object]:
+        position = bisect.bisect_right(self._bases, doc_id) - 1
+        return self._segments[position].document(doc_id - self._bases[position])
+
+    def field_lengths(self, doc_id: int) -> Sequence[int]:
+        position = bisect.bisect_right(self._bases, doc_id) - 1
+        return self._segments[position].field_lengths(doc_id - self._bases[position])
+
+
+def _empty_manifest() -> dict[str, object]:
+    return {"version": MANIFEST_VERSION, "generation": 0, "next_segment": 1, "segments": [], "documents": {}}
+
+
+def _document_hash(metadata: Mapping[str, object], markdown: str) -> str:
+    # Метаданные входят в хэш: новый заголовок или URL — это новая версия документа.
+    digest = hashlib.sha256()
+    digest.update(json.dumps(metadata, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(markdown.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _mark_deleted(segments: list[dict[str, object]], entry: Mapping[str, object]) -> None:
+    for segment in segments:
+        if segment["name"] == entry["segment"]:
+            segment["deleted"].append(entry["doc"])  # type: ignore[attr-defined]
+            return
+
+
+def _needs_merge(segments: list[dict[str, object]], merge_max_segments: int) -> bool:
+    if len(segments) > merge_max_segments:
+        return True
+    total = sum(int(segment["docs"]) for segment in segments)  # type: ignore[call-overload]
+    deleted = sum(len(segment["deleted"]) for segment in segments)  # type: ignore[arg-type]
+    return len(segments) > 1 and total > 0 and deleted / total > MERGE_MAX_DELETED_RATIO
+
+
+def _merge_segments(manifest: dict[str, object], directory: Path) -> list[str]:
+    """Сливает все сегменты в один, отбрасывая удалённые документы.
+
+    Постинги переносятся как есть с перенумерацией документов, поэтому
+    Markdown заново не читается и не токенизируется.
+    """
+
+    segments: list[dict[str, object]] = manifest["segments"]  # type: ignore[assignment]
+    documents: dict[str, dict[str, object]] = manifest["documents"]  # type: ignore[assignment]
+    merged_documents: list[dict[str, object]] = []
+    merged_postings: dict[str, list[list]] = {}
+    remap: dict[tuple[str, int], int] = {}
+
+    for segment in segments:
+        name = str(segment["name"])
+        deleted = set(segment["deleted"])  # type: ignore[call-overload]
+        with BinaryIndex(directory / name) as reader:
+            local_map: dict[int, int] = {}
+            for local_id in range(reader.doc_count):
+                if local_id in deleted:
+                    continue
+                local_map[local_id] = remap[(name, local_id)] = len(merged_documents)
+                merged_documents.append({**reader.document(local_id), "lengths": list(reader.field_lengths(local_id))})
+            for term in reader.terms():
+                target = merged_postings.setdefault(term, [])
+                for posting in reader.postings(term):
+                    new_id = local_map.get(posting[0])
+                    if new_id is not None:
+                        target.append([new_id, *posting[1:]])
+
+    name = f"seg_{int(manifest['next_segment']):06d}.bin"
+    manifest["next_segment"] = int(manifest["next_segment"]) + 1
+    merged_postings = {term: postings for term, postings in merged_postings.items() if postings}
+    write_binary_index(InvertedIndex(merged_documents, merged_postings), directory / name)
+    for entry in documents.values():
+        entry["doc"] = remap[(str(entry["segment"]), int(entry["doc"]))]  # type: ignore[call-overload]
+        entry["segment"] = name
+    obsolete = [str(segment["name"]) for segment in segments]
+    segments.append({"name": name, "docs": len(merged_documents), "deleted": []})
+    return obsolete
+
+
+def _write_manifest(manifest: Mapping[str, object], directory: Path) -> None:
+    path = manifest_path(directory)
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def _remove_unreferenced(manifest: Mapping[str, object], directory: Path) -> None:
+    live = {segment["name"] for segment in manifest["segments"]}  # type: ignore[attr-defined]
+    for path in directory.glob("seg_*.bin"):
+        if path.name not in live:
+            path.unlink()
+
+
+def _entry_stamp(entry: Mapping[str, object]) -> tuple[int, ...]:
+    # У записей, сделанных до учёта метаданных, их отпечатка нет.
+    return (entry["mtime_ns"], entry["size"], entry.get("meta_mtime_ns", 0), entry.get("meta_size", 0))  # type: ignore[return-value]
+
+
+def _stamp_fields(stamp: tuple[int, ...]) -> dict[str, int]:
+    mtime_ns, size, meta_mtime_ns, meta_size = stamp
+    return {"mtime_ns": mtime_ns, "size": size, "meta_mtime_ns": meta_mtime_ns, "meta_size": meta_size}
+
+
+def _combined_averages(readers: Sequence[BinaryIndex], deleted: Sequence[frozenset[int]]) -> tuple[float, ...]:
+    """Средние длины полей по живым документам: удалённые до слияния не учитываются."""
+
+    totals = [0.0] * len(FIELDS)
+    live = 0
+    for reader, removed in zip(readers, deleted):
+        live += reader.doc_count - len(removed)
+        for field in range(len(FIELDS)):
+            totals[field] += reader.avg_field_lengths[field] * reader.doc_count
+        for doc_id in removed:
+            for field, length in enumerate(reader.field_lengths(doc_id)):
+                totals[field] -= length
+    if live <= 0:
+        return tuple(1.0 for _ in FIELDS)
+    return tuple(max(total, 0.0) / live or 1.0 for total in totals)
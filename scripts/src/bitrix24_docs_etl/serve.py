@@ -0,0 +1,464 @@
+"""HTTP-сервис поиска по локальному индексу.
+
+Долгоживущий процесс на asyncio: индексы открываются один раз при старте и
+остаются в памяти (новое поколение индекса подхватывается по mtime, как в
+``search``). Соединения HTTP/1.1 держатся открытыми (keep-alive), запросы
+разных соединений обрабатываются конкурентно, а сам поиск выполняется в пуле
+потоков, чтобы не блокировать цикл событий.
+
+JSON-контракт повторяет результаты GitHub-поиска MCP-сервера:
+
+- ``GET /search?q=...&limit=5&mode=hybrid&section=crm`` (или ``POST /search``
+  с JSON ``{"query", "limit", "mode", "sections"}``) →
+  ``{"query", "mode", "results": [{"title", "path", "htmlUrl", "snippet",
+  "score", ...}], "timings_ms"}``;
+- ``GET /fetch?id=<slug | путь .md | ссылка GitHub>`` →
+  ``{"title", "path", "htmlUrl", "content", "slug"}``;
+- ``GET /health`` и ``GET /stats`` (число запросов, p50/p99 задержки,
+  счётчики кэша).
+
+Ответы ``/search`` кэшируются (``querycache``) по нормализованному запросу,
+фильтрам и поколению индекса, поэтому после ``index``/``embed`` кэш
+сбрасывается сам.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Mapping
+from urllib.parse import parse_qs, urlsplit
+
+from .github_ingest import slug_from_path
+from .hybrid import MODES, hybrid_search, index_generation
+from .pack import CorpusPack
+from .querycache import QueryCache, normalize_query
+from .search import open_index
+from .storage import load_processed_document
+
+if TYPE_CHECKING:
+    # asyncio импортируется при запуске сервера, а не при импорте модуля
+    # (CLI берёт отсюда только значения по умолчанию).
+    import asyncio
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+SERVE_WORKERS = 4
+KEEP_ALIVE_TIMEOUT = 15.0
+MAX_LIMIT = 50
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADERS = 100
+# По скольким последним запросам считаются перцентили задержки.
+LATENCY_WINDOW = 10_000
+SNIPPET_CHARS = 200
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+@dataclass(slots=True)
+class LatencySummary:
+    requests: int
+    errors: int
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": round(self.p50_ms, 3),
+            "p99_ms": round(self.p99_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class SearchService:
+    """Маршрутизация запросов и учёт задержек; сокетами занимается ``start_server``."""
+
+    def __init__(
+        self,
+        workers: int = SERVE_WORKERS,
+        default_mode: str = "hybrid",
+        cache: QueryCache[Mapping[str, object]] | None = None,
+        pack: CorpusPack | None = None,
+    ) -> None:
+        self.default_mode = default_mode
+        # Упакованный корпус (``export``): документы читаются из него, а не из processed/.
+        self.pack = pack
+        self.cache: QueryCache[Mapping[str, object]] = cache if cache is not None else QueryCache()
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.errors = 0
+        self.started_at = time.time()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="serve")
+
+    def warm(self) -> int:
+        """Открывает индексы заранее; возвращает число документов в индексе."""
+
+        index = open_index()
+        # Первый поиск подгружает векторный индекс и эмбеддер.
+        hybrid_search("bitrix24", limit=1, mode=self.default_mode, index=index)
+        if self.pack is not None and not self.pack.is_current():
+            LOGGER.warning(
+                "Корпус %s упакован для другой версии индекса: /fetch может не найти новые документы "
+                "или вернуть старый текст. Обновите его: bitrix24-docs export",
+                self.pack.path,
+            )
+        return index.doc_count
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+    def record(self, elapsed_ms: float, status: int) -> None:
+        self.requests += 1
+        if status >= 500:
+            self.errors += 1
+        self.latencies.append(elapsed_ms)
+
+    def latency_summary(self) -> LatencySummary:
+        values = sorted(self.latencies)
+        if not values:
+            return LatencySummary(self.requests, self.errors, 0.0, 0.0, 0.0)
+        return LatencySummary(
+            requests=self.requests,
+            errors=self.errors,
+            p50_ms=statistics.median(values),
+            p99_ms=values[min(len(values) - 1, int(len(values) * 0.99))],
+            max_ms=values[-1],
+        )
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> tuple[int, Mapping[str, object]]:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        try:
+            return 200, await loop.run_in_executor(self._pool, self.handle, method, target, body)
+        except _HTTPError as exc:
+            return exc.status, {"error": str(exc)}
+        except Exception as exc:  # noqa: BLE001 - ошибка одного запроса не должна ронять сервис
+            LOGGER.exception("Ошибка обработки %s %s", method, target)
+            return 500, {"error": str(exc)}
+
+    def handle(self, method: str, target: str, body: bytes = b"") -> Mapping[str, object]:
+        parts = urlsplit(target)
+        params = parse_qs(parts.query)
+        route = parts.path.rstrip("/") or "/"
+        if route == "/search":
+            if method == "POST":
+                return self.search(_json_body(body))
+            if method == "GET":
+                return self.search(
+                    {
+                        "query": _first(params, "q"),
+                        "limit": _first(params, "limit"),
+                        "mode": _first(params, "mode"),
+                        "sections": params.get("section", []),
+                    }
+                )
+        elif route in ("/fetch", "/health", "/stats"):
+            if method != "GET":
+                raise _HTTPError(405, f"{route} принимает только GET")
+            if route == "/fetch":
+                return self.fetch(_first(params, "id") or "")
+            if route == "/health":
+                health: dict[str, object] = {
+                    "status": "ok",
+                    "documents": open_index().doc_count,
+                    "uptime_s": round(time.time() - self.started_at, 1),
+                }
+                if self.pack is not None:
+                    health["pack"] = {"path": str(self.pack.path), "current": self.pack.is_current()}
+                return health
+            return {**self.latency_summary().to_dict(), "cache": self.cache.stats().to_dict()}
+        else:
+            raise _HTTPError(404, f"Неизвестный путь: {route}")
+        raise _HTTPError(405, f"{route} принимает GET или POST")
+
+    def search(self, request: Mapping[str, object]) -> Mapping[str, object]:
+        query = str(request.get("query") or "").strip()
+        if not query:
+            raise _HTTPError(400, "Пустой запрос")
+        try:
+            limit = min(max(int(request.get("limit") or 5), 1), MAX_LIMIT)  # type: ignore[call-overload]
+        except (TypeError, ValueError):
+            raise _HTTPError(400, "limit должен быть числом") from None
+        mode = str(request.get("mode") or self.default_mode)
+        if mode not in MODES:
+            raise _HTTPError(400, f"mode: одно из {', '.join(MODES)}")
+        sections = request.get("sections") or []
+        if isinstance(sections, str):
+            sections = [sections]
+        sections = sorted({str(section) for section in sections})  # type: ignore[union-attr]
+
+        started = time.perf_counter()
+        key = (normalize_query(query), limit, mode, tuple(sections))
+        generation = index_generation()
+        cached = self.cache.get(key, generation)
+        if cached is not None:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            return {**cached, "query": query, "cached": True, "timings_ms": {"cache": round(elapsed_ms, 3)}}
+
+        try:
+            result = hybrid_search(query, limit=limit, mode=mode, sections=sections)
+        except FileNotFoundError as exc:
+            raise _HTTPError(404, str(exc)) from None
+        results = []
+        for hit in result.hits:
+            document = self._document(hit.slug)
+            markdown = document[1] if document is not None else ""
+            results.append(
+                {
+                    "title": hit.title or hit.slug,
+                    "path": _document_path(hit.url, hit.slug),
+                    "htmlUrl": hit.url,
+                    "snippet": make_snippet(markdown, query),
+                    "score": round(hit.score, 6),
+                    "slug": hit.slug,
+                    "section": hit.section,
+                    "heading": hit.heading,
+                }
+            )
+        payload = {
+            "query": query,
+            "mode": mode,
+            "results": results,
+            "cached": False,
+            "timings_ms": {name: round(value, 3) for name, value in result.timings.items()},
+        }
+        self.cache.put(key, payload, len(json.dumps(payload, ensure_ascii=False).encode("utf-8")), generation)
+        return payload
+
+    def fetch(self, identifier: str) -> Mapping[str, object]:
+        if not identifier:
+            raise _HTTPError(400, "Не указан id документа")
+        slug = _slug_for(identifier)
+        document = self._document(slug)
+        if document is None:
+            raise _HTTPError(404, f"Документ не найден: {identifier}")
+        meta, markdown = document
+        return {
+            "title": meta["title"] or slug,
+            "path": _document_path(str(meta["url"]), slug),
+            "htmlUrl": meta["url"],
+            "content": markdown,
+            "slug": slug,
+        }
+
+    def _document(self, slug: str) -> tuple[Mapping[str, object], str] | None:
+        """Метаданные (title, url) и Markdown документа."""
+
+        if self.pack is not None:
+            document = self.pack.document(slug)
+            if document is None:
+                return None
+            meta, body = document
+            with body:
+                return meta, str(body, "utf-8")
+        document = load_processed_document(slug)
+        if document is None:
+            return None
+        return {"title": document.title, "url": document.url}, _read_markdown(document.markdown_path)
+
+
+async def start_server(
+    service: SearchService,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+) -> asyncio.Server:
+    """Запускает сервер; порт 0 — любой свободный (см. ``server.sockets``)."""
+
+    import asyncio
+
+    async def on_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await _serve_connection(service, reader, writer)
+
+    return await asyncio.start_server(on_connection, host, port)
+
+
+def run_server(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    workers: int = SERVE_WORKERS,
+    cache: QueryCache[Mapping[str, object]] | None = None,
+    on_ready: Callable[[SearchService, str], None] | None = None,
+    pack: CorpusPack | None = None,
+) -> SearchService:
+    """Работает до Ctrl+C и возвращает сервис со статистикой задержек."""
+
+    import asyncio
+
+    service = SearchService(workers=workers, cache=cache, pack=pack)
+    service.warm()
+
+    async def main() -> None:
+        server = await start_server(service, host, port)
+        address = server.sockets[0].getsockname()
+        if on_ready is not None:
+            on_ready(service, f"http://{address[0]}:{address[1]}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return service
+
+
+def make_snippet(content: str, query: str, limit: int = SNIPPET_CHARS) -> str:
+    """Фрагмент текста вокруг первого найденного слова запроса."""
+
+    normalized = " ".join(content.split())
+    lowered = normalized.lower()
+    position = -1
+    for token in query.lower().split():
+        position = lowered.find(token.strip('"'))
+        if position >= 0:
+            break
+    if position < 0:
+        return normalized[:limit]
+    start = max(0, position - limit // 2)
+    return normalized[start : start + limit].strip()
+
+
+async def _serve_connection(service: SearchService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    import asyncio
+
+    try:
+        while True:
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+            except asyncio.TimeoutError:
+                break
+            if not request_line.strip():
+                break
+            started = time.perf_counter()
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+                headers = await _read_headers(reader)
+                length = int(headers.get("content-length", "0"))
+                if length > MAX_BODY_BYTES:
+                    raise _HTTPError(400, "Слишком большое тело запроса")
+                body = await reader.readexactly(length) if length else b""
+            except (ValueError, _HTTPError) as exc:
+                status, payload = 400, {"error": str(exc) if isinstance(exc, _HTTPError) else "Некорректный запрос"}
+                _write_response(writer, status, payload, keep_alive=False)
+                await writer.drain()
+                service.record((time.perf_counter() - started) * 1000, status)
+                break
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+            status, payload = await service.dispatch(method.upper(), target, body)
+            _write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            service.record((time.perf_counter() - started) * 1000, status)
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> dict[str, str]:
+    headers: dict[str, str] = {}
+    for _ in range(MAX_HEADERS):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    raise _HTTPError(400, "Слишком много заголовков")
+
+
+def _write_response(writer: asyncio.StreamWriter, status: int, payload: Mapping[str, object], keep_alive: bool) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+    )
+    if keep_alive:
+        head += f"Keep-Alive: timeout={int(KEEP_ALIVE_TIMEOUT)}\r\n"
+    writer.write(head.encode("latin-1") + b"\r\n" + body)
+
+
+def _json_body(body: bytes) -> Mapping[str, object]:
+    try:
+        payload = json.loads(body or b"{}")
+    except json.JSONDecodeError:
+        raise _HTTPError(400, "Тело запроса должно быть JSON") from None
+    if not isinstance(payload, dict):
+        raise _HTTPError(400, "Тело запроса должно быть JSON-объектом")
+    return payload
+
+
+def _first(params: Mapping[str, list[str]], name: str) -> str | None:
+    values = params.get(name)
+    return values[0] if values else None
+
+
+def _slug_for(identifier: str) -> str:
+    """slug, путь ``api-reference/…/x.md`` или ссылка GitHub → slug документа.
+
+    slug становится именем файла в ``processed/``, поэтому идентификаторы,
+    которые могут вывести за пределы каталога, отклоняются с 400.
+    """
+
+    slug = identifier
+    if identifier.startswith(("http://", "https://")):
+        path = urlsplit(identifier).path
+        if "/blob/" in path or "raw.githubusercontent.com" in identifier:
+            # /<owner>/<repo>/blob/<branch>/<path> или /<owner>/<repo>/<branch>/<path>
+            parts = path.strip("/").split("/")
+            slug = "/".join(parts[4:] if "/blob/" in path else parts[3:])
+    if slug.endswith(".md") and ".." not in slug:
+        slug = slug_from_path(Path(slug.lstrip("/")))
+    if not slug or "/" in slug or "\\" in slug or ".." in slug:
+        raise _HTTPError(400, f"Некорректный идентификатор документа: {identifier}")
+    return slug
+
+
+def _document_path(url: str, slug: str) -> str:
+    """Путь файла в репозитории для документов из GitHub, иначе slug."""
+
+    path = urlsplit(url).path
+    if "/blob/" in path:
+        return "/".join(path.strip("/").split("/")[4:])
+    return slug
+
+
+def _read_markdown(path: Path) -> str:
+    try:
+        return _read_markdown_cached(path, path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return ""
+
+
+@lru_cache(maxsize=1024)
+def _read_markdown_cached(path: Path, mtime_ns: int) -> str:
+    return path.read_text(encoding="utf-8")
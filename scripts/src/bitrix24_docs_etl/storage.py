@@ -1,25 +1,65 @@
-"""Хранение выгруженных документов Bitrix24."""
+"""Хранение выгруженных документов Bitrix24.
+
+HTML страниц хранится сжатыми блобами с адресацией по содержимому
+(``raw/blobs``, см. ``blobstore``): одинаковые страницы лежат один раз, а
+метаданные страницы ссылаются на блоб полем ``html_blob``. Страницы,
+сохранённые раньше файлами ``raw/<slug>.html``, читаются как прежде;
+``compact_raw_html`` переносит их в блобы. Markdown лежит файлами
+``processed/markdown/*.md``, а метаданные — либо JSON-файлами рядом (``files``, по умолчанию), либо в
+SQLite-базе ``docstore.sqlite3`` (``sqlite``, см. ``docstore``). Бэкенд
+выбирается ``configure_store`` или переменной окружения
+``BITRIX24_DOCS_STORE``; функции загрузки и сохранения работают одинаково
+с обоими.
+"""
 
 from __future__ import annotations
 
 import hashlib
 import json
+import logging
+import os
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterable, Iterator
+from typing import TYPE_CHECKING, Iterable, Iterator, Mapping
 from urllib.parse import urlparse
 
-from .fetch import FetchResult
+from . import metrics
+from .blobstore import CODECS, DEFAULT_CODEC, DICTIONARY_SAMPLES, BlobStore, build_dictionary
+from .docstore import DocumentStore
+
+if TYPE_CHECKING:
+    # Только для аннотаций: fetch тянет httpx и BeautifulSoup.
+    from .fetch import FetchResult
 
 BASE_DIR = Path(__file__).resolve().parents[2]
-DATA_DIR = BASE_DIR / "data"
+# Каталог данных можно вынести переменной окружения (так работает ``bench``).
+DATA_DIR = Path(os.environ.get("BITRIX24_DOCS_DATA_DIR") or BASE_DIR / "data")
 RAW_DIR = DATA_DIR / "raw"
 RAW_META_DIR = RAW_DIR / "meta"
 PROCESSED_DIR = DATA_DIR / "processed"
 PROCESSED_MARKDOWN_DIR = PROCESSED_DIR / "markdown"
 PROCESSED_META_DIR = PROCESSED_DIR / "meta"
+PROCESSED_CHUNKS_DIR = PROCESSED_DIR / "chunks"
 INDEX_DIR = DATA_DIR / "index"
+HTTP_CACHE_DIR = DATA_DIR / "http_cache"
+CRAWL_CHECKPOINT_FILE = RAW_DIR / "crawl_checkpoint.json"
+
+STORE_BACKENDS = ("files", "sqlite")
+STORE_BACKEND = os.environ.get("BITRIX24_DOCS_STORE", "files")
+# Хранить HTML в базе (сжатым zlib) вместо raw/*.html; только для sqlite.
+STORE_HTML_IN_DB = os.environ.get("BITRIX24_DOCS_STORE_HTML") == "1"
+DOCSTORE_NAME = "docstore.sqlite3"
+# HTML страниц хранится сжатыми блобами в raw/blobs (см. ``blobstore``).
+RAW_CODECS = CODECS
+RAW_CODEC = os.environ.get("BITRIX24_DOCS_RAW_CODEC", DEFAULT_CODEC)
+RAW_BLOBS_NAME = "blobs"
+
+LOGGER = logging.getLogger(__name__)
+
+_docstore: DocumentStore | None = None
+_blobs: BlobStore | None = None
 
 
 @dataclass(slots=True)
@@ -33,6 +73,7 @@ class RawDocument:
     retrieved_at: str
     html_path: Path
     meta_path: Path
+    content_hash: str | None = None
 
 
 @dataclass(slots=True)
@@ -45,6 +86,41 @@ class ProcessedDocumentMeta:
     html_path: Path
     retrieved_at: str
     links: list[str]
+    source_hash: str | None = None
+
+
+@dataclass(slots=True)
+class RefreshSummary:
+    """Итог повторного обхода: что появилось, изменилось и пропало."""
+
+    new: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    gone: int = 0
+
+    @property
+    def written(self) -> int:
+        return self.new + self.changed
+
+    def add(self, meta: Mapping[str, object]) -> None:
+        change = meta.get("change")
+        if change == "new":
+            self.new += 1
+        elif change == "changed":
+            self.changed += 1
+        else:
+            self.unchanged += 1
+
+
+@dataclass(slots=True)
+class CompactStats:
+    documents: int = 0
+    migrated: int = 0
+    recompressed: int = 0
+    pruned: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    dictionary: str | None = None
 
 
 @dataclass(slots=True)
@@ -64,69 +140,290 @@ def ensure_dirs() -> None:
     RAW_META_DIR.mkdir(parents=True, exist_ok=True)
     PROCESSED_MARKDOWN_DIR.mkdir(parents=True, exist_ok=True)
     PROCESSED_META_DIR.mkdir(parents=True, exist_ok=True)
+    PROCESSED_CHUNKS_DIR.mkdir(parents=True, exist_ok=True)
     INDEX_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def configure_store(backend: str = "files", html_in_db: bool = False, raw_codec: str = DEFAULT_CODEC) -> None:
+    """Выбирает бэкенд метаданных: ``files`` (JSON-файлы) или ``sqlite``.
+
+    ``raw_codec`` — чем сжимать новые блобы HTML (``zlib`` или ``zstd``).
+    """
+
+    global STORE_BACKEND, STORE_HTML_IN_DB, RAW_CODEC
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f"Неизвестное хранилище: {backend}")
+    if raw_codec not in RAW_CODECS:
+        raise ValueError(f"Неизвестный кодек: {raw_codec}")
+    close_store()
+    STORE_BACKEND = backend
+    STORE_HTML_IN_DB = html_in_db and backend == "sqlite"
+    RAW_CODEC = raw_codec
+
+
+def close_store() -> None:
+    global _docstore, _blobs
+    if _docstore is not None:
+        _docstore.close()
+        _docstore = None
+    _blobs = None
+
+
+@contextmanager
+def batch() -> Iterator[None]:
+    """Группирует сохранения в одну транзакцию (только sqlite).
+
+    Файловый бэкенд ничего не группирует: каждый документ — отдельный JSON.
+    """
+
+    store = _store()
+    with store.transaction() if store is not None else nullcontext():
+        yield
+
+
 def persist_fetch_results(results: Iterable[FetchResult]) -> list[dict[str, object]]:
-    """Сохраняет HTML и метаданные, возвращает информацию о файлах."""
+    """Сохраняет HTML и метаданные, возвращает информацию о файлах.
+
+    Страницы, не изменившиеся с прошлого обхода (ответ 304 или тот же хэш
+    содержимого), не перезаписываются. В возвращаемых метаданных поле
+    ``change`` принимает значения ``new``, ``changed`` или ``unchanged``.
+    """
 
     ensure_dirs()
     stored: list[dict[str, object]] = []
-    for result in results:
-        slug = _slug_from_url(result.url)
-        html_path = RAW_DIR / f"{slug}.html"
-        meta_path = RAW_META_DIR / f"{slug}.json"
-
-        html_path.write_text(result.content, encoding="utf-8")
-        meta = {
-            "url": result.url,
-            "title": result.title,
-            "links": list(result.links),
-            "status_code": result.status_code,
-            "retrieved_at": datetime.now(timezone.utc).isoformat(),
-            "html_path": str(html_path.relative_to(DATA_DIR)),
-            "slug": slug,
-        }
-        meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
-        stored.append(meta)
+    with batch():
+        for result in results:
+            stored.append(_persist_fetch_result(result))
     return stored
 
 
-def load_raw_documents() -> Iterator[RawDocument]:
-    ensure_dirs()
-    for meta_file in sorted(RAW_META_DIR.glob("*.json")):
-        data = json.loads(meta_file.read_text(encoding="utf-8"))
-        html_path = DATA_DIR / data["html_path"]
-        if not html_path.exists():
-            continue
-        html_content = html_path.read_text(encoding="utf-8")
-        slug = data.get("slug") or _slug_from_url(data["url"])
-        yield RawDocument(
-            slug=slug,
-            url=data["url"],
-            title=data.get("title"),
-            html=html_content,
-            links=list(data.get("links", [])),
-            status_code=int(data.get("status_code", 0)),
-            retrieved_at=str(data.get("retrieved_at", "")),
+def _persist_fetch_result(result: FetchResult) -> dict[str, object]:
+    slug = _slug_from_url(result.url)
+    previous = _read_raw_meta(slug)
+    content_hash = _content_hash(result.content)
+
+    html_exists = previous is not None and _raw_html_exists(slug, previous)
+    if result.not_modified and not html_exists:
+        # 304 без сохранённого HTML (файл или блоб потерян): тела нет, писать
+        # нечего. Валидаторы сбрасываются, чтобы следующий обход запросил
+        # страницу целиком, а не получил снова 304.
+        LOGGER.warning("Нет сохранённого HTML для %s, страница будет загружена заново", result.url)
+        if previous is None:
+            return {"url": result.url, "slug": slug, "title": result.title, "change": "unchanged"}
+        previous = {**previous, "etag": None, "last_modified": None}
+        _write_raw_meta(slug, previous)
+        return {**previous, "change": "unchanged"}
+
+    if previous is not None and html_exists:
+        if result.not_modified:
+            return {**previous, "change": "unchanged"}
+        if previous.get("content_hash") == content_hash:
+            if (previous.get("etag"), previous.get("last_modified")) != (result.etag, result.last_modified):
+                previous = {**previous, "etag": result.etag, "last_modified": result.last_modified}
+                _write_raw_meta(slug, previous)
+            if result.markdown is not None and not processed_document_exists(slug, content_hash):
+                _persist_prenormalized(result, previous, DATA_DIR / str(previous["html_path"]))
+            return {**previous, "change": "unchanged"}
+
+    html_path = RAW_DIR / f"{slug}.html" if STORE_HTML_IN_DB else _blob_store().path(content_hash)
+    meta = {
+        "url": result.url,
+        "title": result.title,
+        "links": list(result.links),
+        "status_code": result.status_code,
+        "retrieved_at": datetime.now(timezone.utc).isoformat(),
+        "html_path": str(html_path.relative_to(DATA_DIR)),
+        "slug": slug,
+        "content_hash": content_hash,
+        "etag": result.etag,
+        "last_modified": result.last_modified,
+    }
+    if not STORE_HTML_IN_DB:
+        meta["html_blob"] = content_hash
+    _write_raw_meta(slug, meta)
+    _write_raw_html(slug, content_hash, result.content)
+    if previous is not None and not previous.get("html_blob") and not STORE_HTML_IN_DB:
+        # Прежняя версия лежала файлом raw/<slug>.html, теперь страница в блобе.
+        (DATA_DIR / str(previous["html_path"])).unlink(missing_ok=True)
+    if result.markdown is not None:
+        _persist_prenormalized(result, meta, html_path)
+    return {**meta, "change": "new" if previous is None else "changed"}
+
+
+def _persist_prenormalized(result: FetchResult, meta: Mapping[str, object], html_path: Path) -> None:
+    """Сохраняет Markdown, построенный ещё при загрузке страницы."""
+
+    persist_processed_document(
+        ProcessedDocumentMeta(
+            url=result.url,
+            title=result.title,
+            slug=str(meta["slug"]),
+            markdown=result.markdown or "",
+            text=result.text or "",
             html_path=html_path,
-            meta_path=meta_file,
-        )
+            retrieved_at=str(meta.get("retrieved_at", "")),
+            links=list(result.links),
+            source_hash=str(meta["content_hash"]),
+        ),
+        force=True,
+    )
+
 
+def load_raw_metadata() -> dict[str, dict[str, object]]:
+    """Возвращает сохранённые метаданные страниц по URL (для условных запросов)."""
 
-def processed_document_exists(slug: str) -> bool:
+    ensure_dirs()
+    return {str(data["url"]): data for data in _iter_raw_meta()}
+
+
+def summarize_refresh(
+    stored: Iterable[Mapping[str, object]],
+    gone: Iterable[str] = (),
+) -> RefreshSummary:
+    """Считает new/changed/unchanged по результату ``persist_fetch_results``.
+
+    ``gone`` — страницы прошлого обхода, ответившие в этот раз 404 или 410
+    (``CrawlResult.gone``). Страницы, до которых обход не дошёл из-за
+    max-pages, max-depth, robots.txt или сетевых сбоев, пропавшими не считаются.
+    """
+
+    summary = RefreshSummary()
+    for meta in stored:
+        summary.add(meta)
+    summary.gone = len(set(gone))
+    return summary
+
+
+def load_raw_meta(url: str) -> dict[str, object] | None:
+    """Сохранённые метаданные страницы по её URL."""
+
+    return _read_raw_meta(_slug_from_url(url))
+
+
+def load_raw_documents(prefix: str | None = None) -> Iterator[RawDocument]:
+    """Сырые документы по порядку slug; ``prefix`` оставляет только slug с этим началом."""
+
+    ensure_dirs()
+    for data in _iter_raw_meta(prefix):
+        document = _raw_from_meta(data)
+        if document is not None:
+            yield document
+
+
+def load_raw_document(slug: str) -> RawDocument | None:
+    data = _read_raw_meta(slug)
+    return _raw_from_meta(data) if data is not None else None
+
+
+def compact_raw_html(dictionary: bool = True) -> CompactStats:
+    """Переносит HTML в блобы, пересжимает их и удаляет блобы без ссылок.
+
+    С ``dictionary`` по выборке сохранённых страниц строится словарь общих
+    фрагментов разметки, и все блобы пересжимаются с ним. Без этой команды
+    блоб прежней версии изменившейся страницы остаётся на диске: он может
+    быть общим для нескольких страниц.
+    """
+
+    if STORE_HTML_IN_DB:
+        raise ValueError("HTML хранится в SQLite (--store-html), блобы не используются")
+    ensure_dirs()
+    blobs = _blob_store()
+    stats = CompactStats(bytes_before=_raw_html_usage(blobs))
+    metas = list(_iter_raw_meta())
+    if dictionary and metas:
+        step = max(1, len(metas) // DICTIONARY_SAMPLES)
+        samples = (_read_raw_html(str(meta.get("slug")), meta) for meta in metas[::step][:DICTIONARY_SAMPLES])
+        stats.dictionary = blobs.set_dictionary(build_dictionary(html.encode("utf-8") for html in samples if html))
+
+    keep: set[str] = set()
+    with batch():
+        for meta in metas:
+            slug = str(meta.get("slug") or _slug_from_url(str(meta["url"])))
+            html = _read_raw_html(slug, meta)
+            if html is None:
+                continue
+            stats.documents += 1
+            digest = str(meta.get("html_blob") or _content_hash(html))
+            if not meta.get("html_blob"):
+                blobs.put(html.encode("utf-8"), digest)
+                _write_raw_meta(slug, {**meta, "html_path": str(blobs.path(digest).relative_to(DATA_DIR)), "html_blob": digest})
+                (DATA_DIR / str(meta["html_path"])).unlink(missing_ok=True)
+                stats.migrated += 1
+            stats.recompressed += blobs.recompress(digest)
+            keep.add(digest)
+    stats.pruned = blobs.prune(keep)
+    stats.bytes_after = _raw_html_usage(blobs)
+    return stats
+
+
+def _raw_html_usage(blobs: BlobStore) -> int:
+    return blobs.disk_usage() + sum(path.stat().st_size for path in RAW_DIR.glob("*.html"))
+
+
+def _raw_from_meta(data: Mapping[str, object]) -> RawDocument | None:
+    slug = str(data.get("slug") or _slug_from_url(str(data["url"])))
+    html_path = DATA_DIR / str(data["html_path"])
+    html_content = _read_raw_html(slug, data)
+    if html_content is None:
+        return None
+    return RawDocument(
+        slug=slug,
+        url=str(data["url"]),
+        title=data.get("title"),  # type: ignore[arg-type]
+        html=html_content,
+        links=list(data.get("links", [])),  # type: ignore[call-overload]
+        status_code=int(data.get("status_code", 0)),  # type: ignore[call-overload]
+        retrieved_at=str(data.get("retrieved_at", "")),
+        html_path=html_path,
+        meta_path=RAW_META_DIR / f"{slug}.json",
+        content_hash=data.get("content_hash"),  # type: ignore[arg-type]
+    )
+
+
+def processed_document_exists(slug: str, source_hash: str | None = None) -> bool:
+    """Проверяет наличие нормализованного документа.
+
+    Если передан ``source_hash``, документ считается существующим, только когда
+    он получен из HTML с тем же хэшем, то есть изменившиеся страницы
+    нормализуются заново.
+    """
+
+    store = _store()
+    if store is not None:
+        # Запись в базе появляется только после записи Markdown, файл не проверяем.
+        exists, stored_hash = store.processed_source_hash(slug)
+        return exists and (source_hash is None or stored_hash == source_hash)
     markdown_path = PROCESSED_MARKDOWN_DIR / f"{slug}.md"
     meta_path = PROCESSED_META_DIR / f"{slug}.json"
-    return markdown_path.exists() and meta_path.exists()
+    if not (markdown_path.exists() and meta_path.exists()):
+        return False
+    if source_hash is None:
+        return True
+    return _read_meta(meta_path).get("source_hash") == source_hash
 
 
 def persist_processed_document(meta: ProcessedDocumentMeta, force: bool = False) -> None:
     ensure_dirs()
-    markdown_path = PROCESSED_MARKDOWN_DIR / f"{meta.slug}.md"
-    meta_path = PROCESSED_META_DIR / f"{meta.slug}.json"
-    if not force and markdown_path.exists() and meta_path.exists():
+    if not force and processed_document_exists(meta.slug):
         return
-    markdown_path.write_text(meta.markdown, encoding="utf-8")
+    write_processed_markdown(meta)
+    save_processed_metadata(meta)
+
+
+def write_processed_markdown(meta: ProcessedDocumentMeta) -> Path:
+    """Пишет только Markdown-файл документа, без ``ensure_dirs``.
+
+    Вместе с ``save_processed_metadata`` это ``persist_processed_document``
+    для массовой записи из пула потоков: каталоги создаются один раз заранее.
+    """
+
+    markdown_path = PROCESSED_MARKDOWN_DIR / f"{meta.slug}.md"
+    _write_text(markdown_path, meta.markdown)
+    return markdown_path
+
+
+def save_processed_metadata(meta: ProcessedDocumentMeta) -> None:
+    markdown_path = PROCESSED_MARKDOWN_DIR / f"{meta.slug}.md"
     meta_payload = {
         "url": meta.url,
         "title": meta.title,
@@ -137,27 +434,272 @@ def persist_processed_document(meta: ProcessedDocumentMeta, force: bool = False)
         "html_path": str(meta.html_path.relative_to(DATA_DIR)),
         "text_preview": meta.text[:400],
     }
-    meta_path.write_text(json.dumps(meta_payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    if meta.source_hash:
+        meta_payload["source_hash"] = meta.source_hash
+    store = _store()
+    if store is not None:
+        store.put_processed_meta(meta.slug, meta_payload)
+    else:
+        _write_meta(PROCESSED_META_DIR / f"{meta.slug}.json", meta_payload)
 
 
-def load_processed_documents() -> Iterator[ProcessedDocument]:
+def delete_processed_document(slug: str) -> bool:
+    """Удаляет нормализованный документ; возвращает ``False``, если его не было."""
+
+    markdown_path = PROCESSED_MARKDOWN_DIR / f"{slug}.md"
+    existed = markdown_path.exists()
+    markdown_path.unlink(missing_ok=True)
+    (PROCESSED_CHUNKS_DIR / f"{slug}.jsonl").unlink(missing_ok=True)
+    store = _store()
+    if store is not None:
+        store.delete_processed(slug)
+    else:
+        meta_path = PROCESSED_META_DIR / f"{slug}.json"
+        existed = existed or meta_path.exists()
+        meta_path.unlink(missing_ok=True)
+    return existed
+
+
+def load_processed_documents(prefix: str | None = None) -> Iterator[ProcessedDocument]:
+    """Нормализованные документы по порядку slug; ``prefix`` фильтрует по началу slug."""
+
     ensure_dirs()
-    for meta_file in sorted(PROCESSED_META_DIR.glob("*.json")):
-        data = json.loads(meta_file.read_text(encoding="utf-8"))
-        markdown_path = DATA_DIR / data["markdown_path"]
-        html_path = DATA_DIR / data["html_path"]
-        if not markdown_path.exists():
-            continue
-        yield ProcessedDocument(
-            slug=data["slug"],
-            url=data["url"],
-            title=data.get("title"),
-            markdown_path=markdown_path,
-            html_path=html_path,
-            text_preview=data.get("text_preview", ""),
-            retrieved_at=data.get("retrieved_at", ""),
-            links=list(data.get("links", [])),
-        )
+    store = _store()
+    if store is not None:
+        metas: Iterable[Mapping[str, object]] = store.iter_processed_meta(prefix)
+    else:
+        metas = (_read_meta(path) for path in _sorted_meta_files(PROCESSED_META_DIR, prefix))
+    for data in metas:
+        document = _processed_from_meta(data)
+        if document is not None:
+            yield document
+
+
+def load_processed_document(slug: str) -> ProcessedDocument | None:
+    store = _store()
+    if store is not None:
+        data = store.processed_meta(slug)
+    else:
+        meta_path = PROCESSED_META_DIR / f"{slug}.json"
+        data = _read_meta(meta_path) if meta_path.exists() else None
+    return _processed_from_meta(data) if data is not None else None
+
+
+def save_chunks(slug: str, source_hash: str, chunks: Iterable[Mapping[str, object]]) -> Path:
+    """Сохраняет фрагменты документа в JSONL; первая строка — заголовок с хэшем Markdown."""
+
+    PROCESSED_CHUNKS_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROCESSED_CHUNKS_DIR / f"{slug}.jsonl"
+    lines = [json.dumps({"slug": slug, "source_hash": source_hash}, ensure_ascii=False)]
+    lines.extend(json.dumps(chunk, ensure_ascii=False) for chunk in chunks)
+    _write_text(path, "\n".join(lines) + "\n")
+    return path
+
+
+def load_chunk_hash(slug: str) -> str | None:
+    """Хэш Markdown, из которого построены фрагменты, или ``None``."""
+
+    path = PROCESSED_CHUNKS_DIR / f"{slug}.jsonl"
+    if not path.exists():
+        return None
+    with path.open(encoding="utf-8") as handle:
+        return json.loads(handle.readline()).get("source_hash")
+
+
+def load_chunks(slug: str) -> list[dict[str, object]]:
+    path = PROCESSED_CHUNKS_DIR / f"{slug}.jsonl"
+    if not path.exists():
+        return []
+    lines = path.read_text(encoding="utf-8").splitlines()
+    return [json.loads(line) for line in lines[1:] if line]
+
+
+def prune_chunks(keep: Iterable[str]) -> int:
+    """Удаляет фрагменты документов, которых больше нет; возвращает их число."""
+
+    if not PROCESSED_CHUNKS_DIR.exists():
+        return 0
+    keep = set(keep)
+    removed = 0
+    for path in PROCESSED_CHUNKS_DIR.glob("*.jsonl"):
+        if path.stem not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def scan_processed_markdown() -> dict[str, tuple[int, int, int, int]]:
+    """Возвращает slug → отпечаток нормализованного документа.
+
+    Отпечаток — (mtime_ns, размер) Markdown-файла и (mtime_ns, размер)
+    JSON-метаданных; у метаданных в sqlite вторая пара нулевая. Это проход по
+    каталогам без чтения файлов: по нему инкрементальный индекс находит
+    изменившиеся документы, в том числе с новым заголовком или URL.
+    """
+
+    ensure_dirs()
+    meta_stamps = _scan_stamps(PROCESSED_META_DIR, ".json") if _store() is None else {}
+    return {
+        slug: stamp + meta_stamps.get(slug, (0, 0))
+        for slug, stamp in _scan_stamps(PROCESSED_MARKDOWN_DIR, ".md").items()
+    }
+
+
+def processed_stamp(slug: str) -> tuple[int, int, int, int]:
+    """Отпечаток одного документа, как в ``scan_processed_markdown``."""
+
+    stat = (PROCESSED_MARKDOWN_DIR / f"{slug}.md").stat()
+    meta_path = PROCESSED_META_DIR / f"{slug}.json"
+    meta_stat = meta_path.stat() if _store() is None and meta_path.exists() else None
+    meta_stamp = (meta_stat.st_mtime_ns, meta_stat.st_size) if meta_stat is not None else (0, 0)
+    return (stat.st_mtime_ns, stat.st_size, *meta_stamp)
+
+
+def _scan_stamps(directory: Path, suffix: str) -> dict[str, tuple[int, int]]:
+    found: dict[str, tuple[int, int]] = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(suffix) and entry.is_file():
+                stat = entry.stat()
+                found[entry.name[: -len(suffix)]] = (stat.st_mtime_ns, stat.st_size)
+    return found
+
+
+def _processed_from_meta(data: Mapping[str, object]) -> ProcessedDocument | None:
+    markdown_path = DATA_DIR / str(data["markdown_path"])
+    html_path = DATA_DIR / str(data["html_path"])
+    if not markdown_path.exists():
+        return None
+    return ProcessedDocument(
+        slug=str(data["slug"]),
+        url=str(data["url"]),
+        title=data.get("title"),  # type: ignore[arg-type]
+        markdown_path=markdown_path,
+        html_path=html_path,
+        text_preview=str(data.get("text_preview", "")),
+        retrieved_at=str(data.get("retrieved_at", "")),
+        links=list(data.get("links", [])),  # type: ignore[call-overload]
+    )
+
+
+def _store() -> DocumentStore | None:
+    """Открытое SQLite-хранилище или ``None`` для файлового бэкенда.
+
+    Соединение переоткрывается, если сменился каталог данных. Новая база
+    сразу заполняется метаданными из JSON-файлов, если они есть.
+    """
+
+    global _docstore
+    if STORE_BACKEND != "sqlite":
+        return None
+    path = DATA_DIR / DOCSTORE_NAME
+    if _docstore is None or _docstore.path != path:
+        close_store()
+        _docstore = DocumentStore(path)
+        if _docstore.created:
+            _import_json_metadata(_docstore)
+    return _docstore
+
+
+def _import_json_metadata(store: DocumentStore) -> None:
+    with store.transaction():
+        for meta_file in _sorted_meta_files(RAW_META_DIR):
+            data = _read_meta(meta_file)
+            store.put_raw_meta(str(data.get("slug") or meta_file.stem), data)
+        for meta_file in _sorted_meta_files(PROCESSED_META_DIR):
+            store.put_processed_meta(meta_file.stem, _read_meta(meta_file))
+
+
+def _sorted_meta_files(directory: Path, prefix: str | None = None) -> list[Path]:
+    if not directory.exists():
+        return []
+    return sorted(directory.glob(f"{prefix or ''}*.json"))
+
+
+def _read_raw_meta(slug: str) -> dict[str, object] | None:
+    store = _store()
+    if store is not None:
+        return store.raw_meta(slug)
+    meta_path = RAW_META_DIR / f"{slug}.json"
+    return _read_meta(meta_path) if meta_path.exists() else None
+
+
+def _iter_raw_meta(prefix: str | None = None) -> Iterable[dict[str, object]]:
+    store = _store()
+    if store is not None:
+        return store.iter_raw_meta(prefix)
+    return (_read_meta(path) for path in _sorted_meta_files(RAW_META_DIR, prefix))
+
+
+def _write_raw_meta(slug: str, meta: Mapping[str, object]) -> None:
+    store = _store()
+    if store is not None:
+        store.put_raw_meta(slug, meta)
+    else:
+        _write_meta(RAW_META_DIR / f"{slug}.json", meta)
+
+
+def _raw_html_exists(slug: str, meta: Mapping[str, object]) -> bool:
+    store = _store()
+    if store is not None and STORE_HTML_IN_DB:
+        return store.has_raw_html(slug)
+    if meta.get("html_blob"):
+        return _blob_store().exists(str(meta["html_blob"]))
+    return (DATA_DIR / str(meta["html_path"])).exists()
+
+
+def _read_raw_html(slug: str, meta: Mapping[str, object]) -> str | None:
+    store = _store()
+    if store is not None and STORE_HTML_IN_DB:
+        return store.raw_html(slug)
+    if meta.get("html_blob"):
+        try:
+            return _blob_store().get(str(meta["html_blob"])).decode("utf-8")
+        except FileNotFoundError:
+            return None
+    # Страницы, сохранённые до блобов, лежат файлами raw/<slug>.html.
+    html_path = DATA_DIR / str(meta["html_path"])
+    return html_path.read_text(encoding="utf-8") if html_path.exists() else None
+
+
+def _write_raw_html(slug: str, content_hash: str, content: str) -> None:
+    # Вызывается после _write_raw_meta: в базе строка документа уже есть.
+    store = _store()
+    if store is not None and STORE_HTML_IN_DB:
+        store.put_raw_html(slug, content)
+    else:
+        _blob_store().put(content.encode("utf-8"), content_hash)
+
+
+def _blob_store() -> BlobStore:
+    """Хранилище блобов HTML; переоткрывается при смене каталога данных или кодека."""
+
+    global _blobs
+    directory = RAW_DIR / RAW_BLOBS_NAME
+    if _blobs is None or _blobs.directory != directory or _blobs.codec != RAW_CODEC:
+        _blobs = BlobStore(directory, RAW_CODEC)
+    return _blobs
+
+
+def _read_meta(meta_path: Path) -> dict[str, object]:
+    return json.loads(meta_path.read_text(encoding="utf-8"))
+
+
+def _write_meta(meta_path: Path, meta: Mapping[str, object]) -> None:
+    _write_text(meta_path, json.dumps(meta, ensure_ascii=False, indent=2))
+
+
+def _write_text(path: Path, content: str) -> None:
+    """Пишет файл данных в UTF-8 и учитывает время и объём записи в метриках."""
+
+    data = content.encode("utf-8")
+    with metrics.timer("disk_write"):
+        path.write_bytes(data)
+    metrics.record_written(len(data))
+
+
+def _content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
 
 def _slug_from_url(url: str) -> str:
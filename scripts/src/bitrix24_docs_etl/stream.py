@@ -0,0 +1,261 @@
+"""Потоковый конвейер crawl → persist → normalize → chunk → index.
+
+Страница проходит все этапы сразу после загрузки. Этапы связаны очередями
+ограниченного размера: если этап не успевает, очередь перед ним
+заполняется и предыдущий этап ждёт (backpressure). Поэтому в памяти
+одновременно лежит не больше ``queue_size`` страниц на очередь, сколько бы
+их ни было на сайте, а этапы работают одновременно, и общее время близко ко
+времени самого медленного из них, а не к сумме.
+
+Запись в хранилище идёт в одном потоке, конвертация HTML — в отдельном
+потоке (или в пуле процессов при ``normalize_workers > 1``), токенизация
+для сегментного индекса — в своём потоке.
+"""
+
+from __future__ import annotations
+
+import json
+import textwrap
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Mapping, TypeVar
+
+from .chunk import ChunkStats, update_chunks
+from .segments import INDEX_FLUSH_DOCS, SegmentUpdate, SegmentUpdateStats
+from .storage import (
+    RawDocument,
+    RefreshSummary,
+    load_processed_document,
+    load_raw_document,
+    load_raw_meta,
+    persist_fetch_results,
+    persist_processed_document,
+    processed_document_exists,
+)
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from .crawl import BitrixCrawler, CrawlStats
+    from .fetch import FetchResult
+
+STREAM_QUEUE_SIZE = 32
+STREAM_STAGES = ("persist", "normalize", "chunk", "index")
+
+T = TypeVar("T")
+_DONE = object()
+
+
+@dataclass(slots=True)
+class StreamStats:
+    crawl: CrawlStats = field(default_factory=lambda: _crawl_stats())
+    refresh: RefreshSummary = field(default_factory=RefreshSummary)
+    chunks: ChunkStats = field(default_factory=ChunkStats)
+    index: SegmentUpdateStats | None = None
+    persisted: int = 0
+    normalized: int = 0
+    # Время, которое этап был занят работой; самый загруженный этап
+    # определяет скорость всего конвейера.
+    stage_seconds: dict[str, float] = field(default_factory=lambda: dict.fromkeys(STREAM_STAGES, 0.0))
+    # Наибольшая длина очереди перед этапом: упирается в queue_size,
+    # если этап — узкое место. Сохранение идёт прямо в воркерах обхода.
+    peak_queue: dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def bottleneck(self) -> str:
+        return max(self.stage_seconds, key=self.stage_seconds.__getitem__)
+
+
+async def run_stream(
+    crawler: BitrixCrawler,
+    start_paths: Iterable[str | None] = (None,),
+    manifest_path: Path | None = None,
+    normalize_workers: int = 1,
+    force: bool = False,
+    chunk: bool = True,
+    index: bool = True,
+    queue_size: int = STREAM_QUEUE_SIZE,
+    flush_docs: int = INDEX_FLUSH_DOCS,
+) -> StreamStats:
+    """Обходит сайт и сразу сохраняет, нормализует, режет и индексирует страницы.
+
+    ``refresh.gone`` — страницы прошлого обхода, ответившие 404/410 (см.
+    ``summarize_refresh``). Manifest пишется по мере сохранения страниц, а не собирается в памяти.
+    """
+
+    # Обход (httpx) и конвертация (BeautifulSoup) загружаются только здесь:
+    # CLI импортирует модуль ради STREAM_QUEUE_SIZE.
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+
+    from .normalize import convert_html, processed_meta
+
+    if queue_size < 1:
+        # asyncio.Queue(0) не ограничена: пропали бы противодавление и постоянная память.
+        raise ValueError(f"queue_size должен быть не меньше 1, получено {queue_size}")
+    stats = StreamStats()
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    to_normalize: asyncio.Queue[object] = asyncio.Queue(queue_size)
+    to_index: asyncio.Queue[object] = asyncio.Queue(queue_size)
+    workers = max(1, normalize_workers)
+    store = ThreadPoolExecutor(1, thread_name_prefix="stream-store")
+    indexer = ThreadPoolExecutor(1, thread_name_prefix="stream-index")
+    converter: Executor = (
+        ProcessPoolExecutor(workers) if workers > 1 else ThreadPoolExecutor(1, thread_name_prefix="stream-convert")
+    )
+    update = SegmentUpdate(flush_docs=flush_docs) if index else None
+    manifest = _ManifestWriter(manifest_path) if manifest_path is not None else None
+
+    async def put(queue: asyncio.Queue[object], name: str, item: object) -> None:
+        await queue.put(item)
+        stats.peak_queue[name] = max(stats.peak_queue.get(name, 0), queue.qsize())
+
+    async def timed(executor: Executor, stage: str, func: Callable[..., T], *args: object) -> T:
+        result, seconds = await loop.run_in_executor(executor, _timed_call, func, *args)
+        stats.stage_seconds[stage] += seconds
+        return result
+
+    async def accept(meta: Mapping[str, object], raw: RawDocument | None) -> None:
+        stats.refresh.add(meta)
+        if manifest is not None:
+            manifest.write(meta)
+        await put(to_normalize, "normalize", (str(meta["slug"]), raw))
+
+    async def persist(page: FetchResult) -> None:
+        # Воркер обхода ждёт записи страницы: контрольная точка краулера
+        # отмечает страницу, только когда она уже на диске.
+        meta, raw = await timed(store, "persist", _persist_page, page, force)
+        stats.persisted += 1
+        await accept(meta, raw)
+
+    async def crawl() -> None:
+        try:
+            result = await crawler.crawl(start_paths, sink=persist)
+            stats.crawl = result.stats
+            stats.refresh.gone = len(set(result.gone))
+            # Страницы, сохранённые до прерывания, догоняют остальные этапы.
+            for url in result.restored:
+                restored = await timed(store, "persist", _restore_page, url, force)
+                if restored is not None:
+                    await accept(*restored)
+        finally:
+            for _ in range(workers):
+                await to_normalize.put(_DONE)
+
+    async def normalize_stage() -> None:
+        while (item := await to_normalize.get()) is not _DONE:
+            slug, raw = item  # type: ignore[misc]
+            if raw is not None:
+                markdown, text = await timed(converter, "normalize", convert_html, raw.html)
+                await timed(store, "persist", persist_processed_document, processed_meta(raw, markdown, text), True)
+                stats.normalized += 1
+            if chunk:
+                await timed(store, "chunk", _chunk_page, slug, stats.chunks)
+            if update is not None:
+                await put(to_index, "index", slug)
+
+    async def normalize_pool() -> None:
+        try:
+            await asyncio.gather(*(normalize_stage() for _ in range(workers)))
+        finally:
+            await to_index.put(_DONE)
+
+    async def index_stage() -> None:
+        while (item := await to_index.get()) is not _DONE:
+            if update is not None:
+                await timed(indexer, "index", update.add, item)
+
+    tasks = [asyncio.ensure_future(stage()) for stage in (crawl, normalize_pool, index_stage)]
+    completed = False
+    try:
+        await asyncio.gather(*tasks)
+        if update is not None:
+            # Досматривает документы, которых не было в обходе, и пишет манифест.
+            stats.index = await timed(indexer, "index", update.finish)
+        completed = True
+    finally:
+        for task in tasks:
+            task.cancel()
+        for executor in (store, indexer, converter):
+            executor.shutdown(wait=True, cancel_futures=True)
+        if manifest is not None:
+            manifest.close(commit=completed)
+
+    stats.chunks.elapsed = stats.stage_seconds["chunk"]
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def _crawl_stats() -> CrawlStats:
+    from .crawl import CrawlStats
+
+    return CrawlStats()
+
+
+def _timed_call(func: Callable[..., T], *args: object) -> tuple[T, float]:
+    """Вызывает ``func`` и меряет время работы в потоке или процессе исполнителя."""
+
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def _persist_page(result: FetchResult, force: bool) -> tuple[dict[str, object], RawDocument | None]:
+    """Сохраняет страницу; возвращает её метаданные и документ, если его нужно нормализовать."""
+
+    meta = persist_fetch_results([result])[0]
+    return meta, _pending_raw(meta, force)
+
+
+def _restore_page(url: str, force: bool) -> tuple[dict[str, object], RawDocument | None] | None:
+    meta = load_raw_meta(url)
+    if meta is None:
+        return None
+    return {**meta, "change": "unchanged"}, _pending_raw(meta, force)
+
+
+def _pending_raw(meta: Mapping[str, object], force: bool) -> RawDocument | None:
+    """Сырой документ, если его нужно (пере)нормализовать."""
+
+    slug = str(meta["slug"])
+    if not force and processed_document_exists(slug, meta.get("content_hash")):  # type: ignore[arg-type]
+        return None
+    # HTML перечитывается с диска: у ответа 304 тела нет, а так нормализация
+    # видит ровно то, что увидел бы ``normalize_all``.
+    return load_raw_document(slug)
+
+
+def _chunk_page(slug: str, stats: ChunkStats) -> None:
+    doc = load_processed_document(slug)
+    if doc is not None:
+        update_chunks(doc, stats)
+
+
+class _ManifestWriter:
+    """Пишет manifest.json по одной записи — в том же формате, что ``json.dumps(indent=2)``."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._tmp_path = path.with_suffix(path.suffix + ".tmp")
+        self._handle = self._tmp_path.open("w", encoding="utf-8")
+        self._count = 0
+
+    def write(self, meta: Mapping[str, object]) -> None:
+        entry = textwrap.indent(json.dumps(meta, ensure_ascii=False, indent=2), "  ")
+        self._handle.write(("[\n" if self._count == 0 else ",\n") + entry)
+        self._count += 1
+
+    def close(self, commit: bool = True) -> None:
+        """Заменяет manifest.json; после сбоя прежний файл остаётся нетронутым."""
+
+        self._handle.write("\n]" if self._count else "[]")
+        self._handle.close()
+        if commit:
+            self._tmp_path.replace(self.path)
+        else:
+            self._tmp_path.unlink()
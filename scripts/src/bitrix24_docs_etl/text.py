@@ -0,0 +1,150 @@
+"""Токенизация и стемминг текстов документации (русский и английский).
+
+Стеммер русского языка повторяет алгоритм Snowball (Портер для русского),
+для английского используется облегчённое отсечение окончаний. Идентификаторы
+вида ``crm.deal.add`` или ``UF_CRM_TASK`` не стеммируются и дополнительно
+раскладываются на части, чтобы находились и по полному имени метода, и по
+отдельным словам.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Iterator
+
+_TOKEN_RE = re.compile(r"\w+(?:[.\-]\w+)*", re.UNICODE)
+_PART_RE = re.compile(r"[.\-_]")
+_CYRILLIC_RE = re.compile(r"[а-я]")
+_LATIN_RE = re.compile(r"^[a-z]+$")
+_MARKDOWN_LINK_TARGET_RE = re.compile(r"\]\([^)]*\)")
+
+_RU_VOWELS = "аеиоуыэюя"
+_RU_PERFECTIVE_GERUND = re.compile(r"((?<=[ая])(в|вши|вшись)|(ив|ивши|ившись|ыв|ывши|ывшись))$")
+_RU_REFLEXIVE = re.compile(r"(ся|сь)$")
+_RU_ADJECTIVE = r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)"
+_RU_PARTICIPLE = r"((?<=[ая])(ем|нн|вш|ющ|щ)|(ивш|ывш|ующ))"
+_RU_ADJECTIVAL = re.compile(rf"({_RU_PARTICIPLE}?{_RU_ADJECTIVE})$")
+_RU_VERB = re.compile(
+    r"((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)"
+    r"|(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю))$"
+)
+_RU_NOUN = re.compile(
+    r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$"
+)
+_RU_DERIVATIONAL = re.compile(r"(ост|ость)$")
+_RU_SUPERLATIVE = re.compile(r"(ейше|ейш)$")
+
+_EN_SUFFIXES = ("ational", "ization", "fulness", "iveness", "ations", "ation", "ments", "ment", "ness",
+                "ings", "ing", "edly", "ed", "ly", "es", "s")
+
+
+def tokenize(text: str) -> list[str]:
+    """Разбивает текст на нижнерегистровые токены без стемминга."""
+
+    return [token.lower().replace("ё", "е") for token in _TOKEN_RE.findall(text)]
+
+
+def iter_terms(text: str, start: int = 0) -> Iterator[tuple[int, str]]:
+    """Отдаёт пары (позиция, терм) для индексации.
+
+    Части составного идентификатора получают ту же позицию, что и он сам,
+    поэтому фразовые запросы не ломаются.
+    """
+
+    for position, token in enumerate(tokenize(text), start=start):
+        yield position, stem(token)
+        if _PART_RE.search(token):
+            for part in _PART_RE.split(token):
+                if part:
+                    yield position, stem(part)
+
+
+def analyze(text: str) -> list[str]:
+    """Термы запроса или документа в порядке следования."""
+
+    return [term for _, term in iter_terms(text)]
+
+
+def phrase_terms(text: str) -> list[str]:
+    """Термы фразы по одному на позицию: части составных идентификаторов
+    стоят в индексе на той же позиции, что и целый токен, и во фразу не входят."""
+
+    return [stem(token) for token in tokenize(text)]
+
+
+def strip_markdown_links(markdown: str) -> str:
+    """Убирает адреса ссылок ``[текст](url)``, оставляя текст ссылки."""
+
+    return _MARKDOWN_LINK_TARGET_RE.sub("]", markdown)
+
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    if _PART_RE.search(token) or any(char.isdigit() for char in token):
+        return token
+    if _CYRILLIC_RE.search(token):
+        return _stem_russian(token)
+    if _LATIN_RE.match(token):
+        return _stem_english(token)
+    return token
+
+
+def _stem_russian(word: str) -> str:
+    rv_start = next((i + 1 for i, char in enumerate(word) if char in _RU_VOWELS), len(word))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1: деепричастия, иначе возвратность + прилагательные/глаголы/существительные.
+    stripped = _RU_PERFECTIVE_GERUND.sub("", rv, count=1)
+    if stripped == rv:
+        rv = _RU_REFLEXIVE.sub("", rv, count=1)
+        for pattern in (_RU_ADJECTIVAL, _RU_VERB, _RU_NOUN):
+            stripped = pattern.sub("", rv, count=1)
+            if stripped != rv:
+                break
+    rv = stripped
+
+    # Шаг 2.
+    if rv.endswith("и"):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательные окончания только в R2.
+    r2_start = _russian_r2(prefix + rv) - len(prefix)
+    if r2_start >= 0 and _RU_DERIVATIONAL.search(rv[r2_start:]):
+        rv = _RU_DERIVATIONAL.sub("", rv, count=1)
+
+    # Шаг 4.
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        superlative = _RU_SUPERLATIVE.sub("", rv, count=1)
+        if superlative != rv:
+            rv = superlative[:-1] if superlative.endswith("нн") else superlative
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def _russian_r2(word: str) -> int:
+    def region_start(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in _RU_VOWELS and word[i - 1] in _RU_VOWELS:
+                return i + 1
+        return len(word)
+
+    return region_start(region_start(0))
+
+
+def _stem_english(word: str) -> str:
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("ss") or word.endswith("us"):
+        return word
+    for suffix in _EN_SUFFIXES:
+        if word.endswith(suffix):
+            stem_part = word[: -len(suffix)]
+            if len(stem_part) >= 3 and any(char in "aeiouy" for char in stem_part):
+                return stem_part
+    return word
@@ -0,0 +1,511 @@
+"""Локальный векторный индекс по нормализованному корпусу.
+
+Единицы индекса — фрагменты из ``processed/chunks`` (если документ не
+разбит, то документ целиком). Эмбеддинги считаются порциями подключаемым
+эмбеддером: по умолчанию это хэширование термов (без модели), при наличии
+``sentence-transformers`` — локальная модель на CPU.
+
+На диске (``index/vectors``) векторы лежат одним непрерывным массивом
+``.npy`` (float16 или int8 с масштабом на строку) и открываются через mmap.
+Каждая сборка пишется в отдельный каталог ``build_NNNNNN``, а текущую
+указывает ``manifest.json``, который заменяется последним.
+Поиск ближайших соседей — IVF: векторы разбиты на кластеры сферическим
+k-means и упорядочены по кластерам, запрос просматривает ``nprobe``
+ближайших кластеров. Эмбеддинги переиспользуются по хэшу текста, так что
+повторная сборка считает только изменившиеся фрагменты.
+
+NumPy — необязательная зависимость (``pip install -e .[vectors]``).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import json
+import shutil
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from itertools import chain
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Protocol, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    # NumPy загружается при первом обращении к индексу (_require_numpy):
+    # поиск по BM25 и справка CLI его не ждут.
+    np = None
+
+from .storage import INDEX_DIR, load_chunks, load_processed_documents
+from .text import analyze
+
+VECTORS_DIR = INDEX_DIR / "vectors"
+VECTOR_INDEX_VERSION = 1
+DEFAULT_EMBEDDER = "hashing"
+HASHING_DIM = 256
+EMBED_BATCH_SIZE = 64
+DTYPES = ("float16", "int8")
+# До этого числа векторов IVF не строится: полный перебор и так быстрый.
+BRUTE_FORCE_LIMIT = 4096
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50_000
+
+_OPEN: dict[Path, tuple[int, VectorIndex]] = {}
+_OPEN_LOCK = threading.Lock()
+
+
+class Embedder(Protocol):
+    name: str
+    dim: int
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        """Возвращает нормированные векторы float32 формы (len(texts), dim)."""
+        ...
+
+
+class HashingEmbedder:
+    """Хэширует термы (после стемминга) и их биграммы в вектор фиксированной длины.
+
+    Модель не нужна, результат детерминирован — подходит для тестов и как
+    запасной вариант, когда локальной модели нет.
+    """
+
+    def __init__(self, dim: int = HASHING_DIM) -> None:
+        _require_numpy()
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            terms = analyze(text)
+            buckets: dict[int, float] = {}
+            for feature in chain(terms, (f"{left} {right}" for left, right in zip(terms, terms[1:]))):
+                hashed = zlib.crc32(feature.encode("utf-8"))
+                bucket = hashed % self.dim
+                buckets[bucket] = buckets.get(bucket, 0.0) + (1.0 if hashed & 0x80000000 else -1.0)
+            if buckets:
+                vectors[row, list(buckets)] = list(buckets.values())
+        # Сублинейный вес частоты, как в TF-IDF: log(1 + |x|) со знаком.
+        np.copysign(np.log1p(np.abs(vectors)), vectors, out=vectors)
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Локальная модель ``sentence-transformers`` на CPU."""
+
+    def __init__(self, model_name: str) -> None:
+        _require_numpy()
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as exc:  # pragma: no cover - зависит от окружения
+            raise RuntimeError("Для эмбеддера st:<модель> установите пакет sentence-transformers") from exc
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+        self.name = f"st:{model_name}"
+
+    def embed(self, texts: Sequence[str]) -> "np.ndarray":
+        vectors = self._model.encode(
+            list(texts),
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+        return vectors.astype(np.float32)
+
+
+@dataclass(slots=True)
+class VectorUnit:
+    id: str
+    slug: str
+    url: str
+    title: str | None
+    heading: str | None
+    text: str
+
+
+@dataclass(slots=True)
+class VectorIndexStats:
+    units: int
+    embedded: int
+    cached: int
+    dim: int
+    nlist: int
+    output_path: Path
+    elapsed: float = 0.0
+
+
+@dataclass(slots=True)
+class VectorHit:
+    id: str
+    slug: str
+    url: str
+    title: str | None
+    heading: str | None
+    score: float
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "id": self.id,
+            "slug": self.slug,
+            "url": self.url,
+            "title": self.title,
+            "heading": self.heading,
+            "score": round(self.score, 4),
+        }
+
+
+def get_embedder(name: str = DEFAULT_EMBEDDER) -> Embedder:
+    """``hashing`` / ``hashing-<dim>`` или ``st:<имя модели>``."""
+
+    if name == "hashing":
+        return HashingEmbedder()
+    if name.startswith("hashing-"):
+        return HashingEmbedder(int(name.split("-", 1)[1]))
+    if name.startswith("st:"):
+        return SentenceTransformerEmbedder(name[3:])
+    raise ValueError(f"Неизвестный эмбеддер: {name}")
+
+
+def iter_units(use_chunks: bool = True) -> Iterator[VectorUnit]:
+    for doc in load_processed_documents():
+        chunks = load_chunks(doc.slug) if use_chunks else []
+        if not chunks:
+            markdown = doc.markdown_path.read_text(encoding="utf-8")
+            yield VectorUnit(doc.slug, doc.slug, doc.url, doc.title, None, f"{doc.title or ''}\n{markdown}")
+            continue
+        for chunk in chunks:
+            heading_path = " / ".join(chunk.get("heading_path") or [])  # type: ignore[arg-type]
+            yield VectorUnit(
+                id=str(chunk["id"]),
+                slug=doc.slug,
+                url=str(chunk["url"]),
+                title=doc.title,
+                heading=chunk.get("heading"),  # type: ignore[arg-type]
+                text=f"{doc.title or ''}\n{heading_path}\n{chunk['markdown']}",
+            )
+
+
+def build_vector_index(
+    embedder_name: str = DEFAULT_EMBEDDER,
+    use_chunks: bool = True,
+    dtype: str = "float16",
+    batch_size: int = EMBED_BATCH_SIZE,
+    nlist: int | None = None,
+    directory: Path | None = None,
+) -> VectorIndexStats:
+    """Считает эмбеддинги корпуса (с кэшем по хэшу текста) и пишет индекс."""
+
+    _require_numpy()
+    started = time.perf_counter()
+    directory = directory or VECTORS_DIR
+    embedder = get_embedder(embedder_name)
+    cache = _load_cache(directory, embedder.name)
+
+    units = list(iter_units(use_chunks))
+    keys = [_unit_key(embedder.name, unit.text) for unit in units]
+    embeddings = np.zeros((len(units), embedder.dim), dtype=np.float32)
+    missing = [row for row, key in enumerate(keys) if key not in cache]
+    for row, key in enumerate(keys):
+        if key in cache:
+            embeddings[row] = cache[key]
+    for start in range(0, len(missing), batch_size):
+        rows = missing[start : start + batch_size]
+        embeddings[rows] = embedder.embed([units[row].text for row in rows])
+
+    records = [
+        {"id": unit.id, "slug": unit.slug, "url": unit.url, "title": unit.title, "heading": unit.heading, "key": key}
+        for unit, key in zip(units, keys)
+    ]
+    used_nlist = write_vector_index(directory, records, embeddings, embedder.name, dtype=dtype, nlist=nlist)
+    return VectorIndexStats(
+        units=len(units),
+        embedded=len(missing),
+        cached=len(units) - len(missing),
+        dim=embedder.dim,
+        nlist=used_nlist,
+        output_path=directory,
+        elapsed=time.perf_counter() - started,
+    )
+
+
+def write_vector_index(
+    directory: Path,
+    records: Sequence[dict[str, object]],
+    embeddings: "np.ndarray",
+    embedder_name: str,
+    dtype: str = "float16",
+    nlist: int | None = None,
+) -> int:
+    """Строит IVF и сохраняет векторы в порядке кластеров; возвращает nlist."""
+
+    _require_numpy()
+    if dtype not in DTYPES:
+        raise ValueError(f"Неподдерживаемый тип векторов: {dtype}")
+    directory.mkdir(parents=True, exist_ok=True)
+    count, dim = embeddings.shape
+    if nlist is None:
+        nlist = int(np.sqrt(count)) if count > BRUTE_FORCE_LIMIT else 0
+    nlist = min(nlist, count)
+
+    if nlist > 1:
+        centroids = _train_centroids(embeddings, nlist)
+        assignment = _assign(embeddings, centroids)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))]).astype(np.int64)
+    else:
+        nlist = 0
+        centroids = np.zeros((0, dim), dtype=np.float32)
+        order = np.arange(count)
+        offsets = np.array([0, count], dtype=np.int64)
+
+    # Каждая сборка пишется в свой каталог, а подменяет её запись манифеста:
+    # читатель никогда не увидит ключи одной сборки рядом с векторами другой.
+    previous = _read_manifest(directory)
+    generation = int(previous.get("generation", 0)) + 1
+    build = f"build_{generation:06d}"
+    target = directory / build
+    if target.exists():
+        shutil.rmtree(target)  # остаток прерванной сборки, манифест на него не ссылается
+    target.mkdir()
+
+    ordered = embeddings[order]
+    # embeddings.npy одновременно служит кэшем эмбеддингов для следующей сборки.
+    np.save(target / "embeddings.npy", ordered.astype(np.float16))
+    if dtype == "int8":
+        scales = np.maximum(np.abs(ordered).max(axis=1), 1e-12) / 127.0
+        np.save(target / "quantized.npy", np.round(ordered / scales[:, None]).astype(np.int8))
+        np.save(target / "scales.npy", scales.astype(np.float32))
+    np.save(target / "ivf_centroids.npy", centroids.astype(np.float32))
+    np.save(target / "ivf_offsets.npy", offsets)
+    (target / "units.json").write_text(
+        json.dumps([records[row] for row in order], ensure_ascii=False, separators=(",", ":")),
+        encoding="utf-8",
+    )
+    manifest = {
+        "version": VECTOR_INDEX_VERSION,
+        "embedder": embedder_name,
+        "dim": dim,
+        "dtype": dtype,
+        "count": count,
+        "nlist": nlist,
+        "generation": generation,
+        "build": build,
+    }
+    tmp_path = directory / "manifest.json.tmp"
+    tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp_path.replace(directory / "manifest.json")
+    _remove_stale_builds(directory, build, previous)
+    return nlist
+
+
+class VectorIndex:
+    """Векторный индекс, открытый через mmap."""
+
+    def __init__(self, directory: Path | None = None) -> None:
+        _require_numpy()
+        self.directory = directory or VECTORS_DIR
+        manifest = json.loads((self.directory / "manifest.json").read_text(encoding="utf-8"))
+        if manifest.get("version") != VECTOR_INDEX_VERSION:
+            raise ValueError(f"Неподдерживаемая версия векторного индекса: {manifest.get('version')}")
+        # Файлы читаются из каталога сборки, записанной в манифесте: следующая
+        # сборка их не трогает, поэтому и ленивая загрузка units.json согласована.
+        self._files = _build_dir(self.directory, manifest)
+        self.embedder_name = str(manifest["embedder"])
+        self.dtype = str(manifest["dtype"])
+        self.count = int(manifest["count"])
+        self.nlist = int(manifest["nlist"])
+        if self.dtype == "int8":
+            self._vectors = np.load(self._files / "quantized.npy", mmap_mode="r")
+            self._scales = np.load(self._files / "scales.npy", mmap_mode="r")
+        else:
+            self._vectors = np.load(self._files / "embeddings.npy", mmap_mode="r")
+            self._scales = None
+        self._centroids = np.load(self._files / "ivf_centroids.npy")
+        self._offsets = np.load(self._files / "ivf_offsets.npy")
+        self._units: list[dict[str, object]] | None = None
+        self._embedder: Embedder | None = None
+
+    @property
+    def units(self) -> list[dict[str, object]]:
+        if self._units is None:
+            self._units = json.loads((self._files / "units.json").read_text(encoding="utf-8"))
+        return self._units
+
+    def embed_query(self, text: str) -> "np.ndarray":
+        if self._embedder is None:
+            self._embedder = get_embedder(self.embedder_name)
+        return self._embedder.embed([text])[0]
+
+    def search(self, query: str, limit: int = 10, nprobe: int = DEFAULT_NPROBE) -> list[VectorHit]:
+        hits = []
+        for row, score in self.nearest(self.embed_query(query), limit, nprobe):
+            unit = self.units[row]
+            hits.append(
+                VectorHit(
+                    id=str(unit["id"]),
+                    slug=str(unit["slug"]),
+                    url=str(unit["url"]),
+                    title=unit.get("title"),  # type: ignore[arg-type]
+                    heading=unit.get("heading"),  # type: ignore[arg-type]
+                    score=score,
+                )
+            )
+        return hits
+
+    def nearest(
+        self,
+        query: "np.ndarray",
+        limit: int = 10,
+        nprobe: int = DEFAULT_NPROBE,
+        allowed: "np.ndarray | None" = None,
+    ) -> list[tuple[int, float]]:
+        """Номера строк и косинусная близость ``limit`` ближайших векторов.
+
+        ``allowed`` — булева маска по строкам индекса: остальные строки
+        в выдачу не попадают.
+        """
+
+        query = np.asarray(query, dtype=np.float32)
+        if self.nlist:
+            probe = min(nprobe, self.nlist)
+            closest = np.argpartition(-(self._centroids @ query), probe - 1)[:probe]
+            ranges = [(int(self._offsets[c]), int(self._offsets[c + 1])) for c in closest]
+        else:
+            ranges = [(0, self.count)]
+
+        rows_parts = []
+        scores_parts = []
+        for start, end in ranges:
+            if start == end:
+                continue
+            block = np.asarray(self._vectors[start:end], dtype=np.float32) @ query
+            if self._scales is not None:
+                block *= self._scales[start:end]
+            rows_parts.append(np.arange(start, end))
+            scores_parts.append(block)
+        if not scores_parts:
+            return []
+        rows = np.concatenate(rows_parts)
+        scores = np.concatenate(scores_parts)
+        if allowed is not None:
+            keep = allowed[rows]
+            rows, scores = rows[keep], scores[keep]
+        if len(scores) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+
+def open_vector_index(directory: Path | None = None) -> VectorIndex:
+    """Открывает векторный индекс; открытый индекс кэшируется до его пересборки."""
+
+    directory = directory or VECTORS_DIR
+    mtime_ns = (directory / "manifest.json").stat().st_mtime_ns
+    with _OPEN_LOCK:
+        current = _OPEN.get(directory)
+        if current is not None and current[0] == mtime_ns:
+            return current[1]
+        index = VectorIndex(directory)
+        # Как и в search.open_index, держим только текущее поколение: прежнее
+        # (его mmap и маски разделов в hybrid) освобождается вместе с последним поиском.
+        _OPEN[directory] = (mtime_ns, index)
+    return index
+
+
+def _train_centroids(vectors: "np.ndarray", nlist: int) -> "np.ndarray":
+    """Сферический k-means по выборке векторов."""
+
+    rng = np.random.default_rng(0)
+    sample_size = min(len(vectors), max(KMEANS_SAMPLE, nlist * 4))
+    train = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = train[rng.choice(len(train), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = _assign(train, centroids)
+        counts = np.bincount(assignment, minlength=nlist)
+        order = np.argsort(assignment, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(train[order], starts[filled], axis=0)
+        # Пустые кластеры заново засеиваем случайными точками.
+        sums[~filled] = train[rng.choice(len(train), int((~filled).sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def _assign(vectors: "np.ndarray", centroids: "np.ndarray", batch: int = 16384) -> "np.ndarray":
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch):
+        assignment[start : start + batch] = np.argmax(vectors[start : start + batch] @ centroids.T, axis=1)
+    return assignment
+
+
+def _load_cache(directory: Path, embedder_name: str) -> dict[str, "np.ndarray"]:
+    manifest = _read_manifest(directory)
+    if manifest.get("embedder") != embedder_name:
+        return {}
+    files = _build_dir(directory, manifest)
+    if not (files / "embeddings.npy").exists() or not (files / "units.json").exists():
+        return {}
+    units = json.loads((files / "units.json").read_text(encoding="utf-8"))
+    stored = np.load(files / "embeddings.npy", mmap_mode="r")
+    if not len(units) == stored.shape[0] == manifest.get("count"):
+        # Ключи и векторы из разных сборок: такой кэш выдал бы чужие эмбеддинги.
+        return {}
+    return {str(unit["key"]): stored[row] for row, unit in enumerate(units)}
+
+
+def _read_manifest(directory: Path) -> dict[str, object]:
+    path = directory / "manifest.json"
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _build_dir(directory: Path, manifest: dict[str, object]) -> Path:
+    # Индексы, записанные до появления сборок, лежат прямо в каталоге.
+    build = manifest.get("build")
+    return directory / str(build) if build else directory
+
+
+def _remove_stale_builds(directory: Path, build: str, previous: dict[str, object]) -> None:
+    """Удаляет сборки, кроме текущей и предыдущей (её ещё могут читать открытые индексы)."""
+
+    keep = {build, str(previous.get("build", ""))}
+    for path in directory.iterdir():
+        if path.is_dir() and path.name.startswith("build_") and path.name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+        elif previous.get("build") and path.is_file() and (path.suffix == ".npy" or path.name == "units.json"):
+            path.unlink(missing_ok=True)
+
+
+def _unit_key(embedder_name: str, text: str) -> str:
+    return hashlib.sha256(f"{embedder_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def numpy_available() -> bool:
+    """Установлен ли NumPy; сам модуль при этом не загружается."""
+    return np is not None or importlib.util.find_spec("numpy") is not None
+
+
+def _require_numpy() -> None:
+    global np
+    if np is not None:
+        return
+    try:
+        import numpy
+    except ImportError as exc:
+        raise RuntimeError("Для векторного индекса нужен NumPy: pip install -e .[vectors]") from exc
+    np = numpy
@@ -1,4 +1,7 @@
 import importlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import pytest
 
@@ -16,10 +19,19 @@ def isolated_data_dir(tmp_path, monkeypatch):
     monkeypatch.setattr("bitrix24_docs_etl.storage.PROCESSED_DIR", base / "processed")
     monkeypatch.setattr("bitrix24_docs_etl.storage.PROCESSED_MARKDOWN_DIR", base / "processed" / "markdown")
     monkeypatch.setattr("bitrix24_docs_etl.storage.PROCESSED_META_DIR", base / "processed" / "meta")
+    monkeypatch.setattr("bitrix24_docs_etl.storage.PROCESSED_CHUNKS_DIR", base / "processed" / "chunks")
     monkeypatch.setattr("bitrix24_docs_etl.storage.INDEX_DIR", base / "index")
+    monkeypatch.setattr("bitrix24_docs_etl.storage.HTTP_CACHE_DIR", base / "http_cache")
+    monkeypatch.setattr("bitrix24_docs_etl.storage.CRAWL_CHECKPOINT_FILE", base / "raw" / "crawl_checkpoint.json")
 
     monkeypatch.setattr("bitrix24_docs_etl.index.DATA_DIR", base)
     monkeypatch.setattr("bitrix24_docs_etl.index.INDEX_DIR", base / "index")
+    monkeypatch.setattr("bitrix24_docs_etl.index.INDEX_FILE", base / "index" / "simple_index.json")
+    monkeypatch.setattr("bitrix24_docs_etl.segments.SEGMENTS_DIR", base / "index" / "segments")
+    monkeypatch.setattr("bitrix24_docs_etl.vectors.VECTORS_DIR", base / "index" / "vectors")
+    monkeypatch.setattr("bitrix24_docs_etl.github_ingest.DATA_DIR", base)
+    monkeypatch.setattr("bitrix24_docs_etl.github_ingest.GITHUB_DIR", base / "github")
+    monkeypatch.setattr("bitrix24_docs_etl.github_ingest.PROCESSED_MARKDOWN_DIR", base / "processed" / "markdown")
 
     (base / "raw" / "meta").mkdir(parents=True, exist_ok=True)
     (base / "processed" / "markdown").mkdir(parents=True, exist_ok=True)
@@ -27,3 +39,70 @@ def isolated_data_dir(tmp_path, monkeypatch):
     (base / "index").mkdir(parents=True, exist_ok=True)
 
     yield
+    storage.close_store()
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    pages: dict[str, str | bytes] = {}
+    delays: dict[str, float] = {}
+    etags: dict[str, str] = {}
+    headers_by_path: dict[str, dict[str, str]] = {}
+    # Статусы, которые путь вернёт перед нормальным ответом (по одному на запрос).
+    failures: dict[str, list[int]] = {}
+    requests: list[tuple[str, int]] = []
+
+    def do_GET(self) -> None:  # noqa: N802
+        time.sleep(self.delays.get(self.path, 0.0))
+        pending = self.failures.get(self.path)
+        if pending:
+            status = pending.pop(0)
+            self.requests.append((self.path, status))
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self._send_extra_headers()
+            self.end_headers()
+            return
+        body = self.pages.get(self.path)
+        if body is None:
+            self.requests.append((self.path, 404))
+            self.send_error(404)
+            return
+        etag = self.etags.get(self.path)
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.requests.append((self.path, 304))
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self._send_extra_headers()
+            self.end_headers()
+            return
+        self.requests.append((self.path, 200))
+        payload = body if isinstance(body, bytes) else body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        if etag:
+            self.send_header("ETag", etag)
+        self._send_extra_headers()
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_extra_headers(self) -> None:
+        for name, value in self.headers_by_path.get(self.path, {}).items():
+            self.send_header(name, value)
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+
+@pytest.fixture
+def docs_site():
+    """Локальный HTTP-сервер, подменяющий apidocs.bitrix24.ru в тестах."""
+
+    handler = type("SiteHandler", (_SiteHandler,), {"pages": {}, "delays": {}, "etags": {}, "headers_by_path": {}, "failures": {}, "requests": []})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    handler.base_url = f"http://127.0.0.1:{server.server_port}/"
+    yield handler
+    server.shutdown()
+    server.server_close()
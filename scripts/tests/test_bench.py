@@ -0,0 +1,53 @@
+import json
+
+from bitrix24_docs_etl.bench import (
+    BENCH_STAGES,
+    BenchReport,
+    StageResult,
+    compare_baseline,
+    load_report,
+    run_bench,
+    save_report,
+    synthetic_site,
+)
+
+
+def test_bench_measures_every_stage_on_synthetic_corpus(tmp_path):
+    assert len(synthetic_site(250)) == 250
+
+    report = run_bench([30], workers=4)
+    assert [result.stage for result in report.results] == list(BENCH_STAGES)
+    docs = {result.stage: result.docs for result in report.results}
+    # Индекс строится и по нормализованному HTML, и по импортированному Markdown.
+    assert docs == {"crawl": 30, "persist": 30, "normalize": 30, "ingest_markdown": 30, "index": 60}
+    assert all(result.wall_seconds > 0 and result.peak_rss_mb > 0 for result in report.results)
+
+    path = tmp_path / "report.json"
+    save_report(report, path)
+    assert json.loads(path.read_text(encoding="utf-8"))["results"][0]["docs_per_second"] > 0
+    assert load_report(path).results == report.results
+
+
+def test_compare_baseline_flags_slowdowns_and_memory_growth():
+    baseline = BenchReport(
+        [
+            StageResult(1000, "normalize", 1000, 10.0, 10.0, 100.0),
+            StageResult(1000, "persist", 1000, 0.05, 0.05, 100.0),
+        ]
+    )
+    current = BenchReport(
+        [
+            StageResult(1000, "normalize", 1000, 20.0, 20.0, 100.0),
+            # Короткий этап: вдвое медленнее, но это шум; память сравнивается всегда.
+            StageResult(1000, "persist", 1000, 0.1, 0.1, 200.0),
+            StageResult(10_000, "normalize", 10_000, 500.0, 500.0, 900.0),
+        ]
+    )
+
+    regressions = compare_baseline(current, baseline, tolerance=0.25)
+    assert [(item.stage, item.metric) for item in regressions] == [
+        ("normalize", "docs_per_second"),
+        ("persist", "peak_rss_mb"),
+    ]
+    assert regressions[0].change == -0.5
+    assert compare_baseline(current, baseline, tolerance=1.0) == []
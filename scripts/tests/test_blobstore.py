@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.blobstore import BlobStore, build_dictionary
+from bitrix24_docs_etl.cli import cli
+from bitrix24_docs_etl.fetch import FetchResult
+from bitrix24_docs_etl.storage import compact_raw_html, load_raw_documents, persist_fetch_results
+
+from test_crawl import page
+
+
+def fetched(url, title):
+    return FetchResult(url=url, status_code=200, title=title, content=page(title) * 20)
+
+
+def test_identical_pages_are_stored_once_and_read_back():
+    base = "https://apidocs.bitrix24.ru/api-reference/crm/"
+    stored = persist_fetch_results(
+        [fetched(base, "Сделки"), fetched(base + "?utm=mail", "Сделки"), fetched(base + "deal/", "Сделка")]
+    )
+
+    assert stored[0]["html_blob"] == stored[1]["html_blob"] != stored[2]["html_blob"]
+    blobs = list((storage.RAW_DIR / "blobs").glob("*/*"))
+    assert len(blobs) == 2 and not list(storage.RAW_DIR.glob("*.html"))
+    assert sum(path.stat().st_size for path in blobs) * 5 < 3 * len(page("Сделки") * 20)
+    assert {doc.url: doc.html for doc in load_raw_documents()}[base + "?utm=mail"] == page("Сделки") * 20
+
+    # Та же страница при повторном обходе ничего не пишет.
+    assert persist_fetch_results([fetched(base, "Сделки")])[0]["change"] == "unchanged"
+
+
+def test_compact_migrates_legacy_files_and_prunes_orphans():
+    slug = "apidocs_bitrix24_ru_api-reference_tasks_"
+    legacy = storage.RAW_DIR / f"{slug}.html"
+    legacy.write_text(page("Задачи"), encoding="utf-8")
+    (storage.RAW_META_DIR / f"{slug}.json").write_text(
+        json.dumps(
+            {"url": "https://apidocs.bitrix24.ru/api-reference/tasks/", "slug": slug, "title": "Задачи", "html_path": f"raw/{slug}.html"}
+        ),
+        encoding="utf-8",
+    )
+    persist_fetch_results([fetched("https://apidocs.bitrix24.ru/api-reference/crm/", "Старая")])
+    persist_fetch_results([fetched("https://apidocs.bitrix24.ru/api-reference/crm/", "Новая")])
+
+    stats = compact_raw_html()
+    assert (stats.documents, stats.migrated, stats.pruned) == (2, 1, 1)
+    assert stats.dictionary and stats.bytes_after < stats.bytes_before
+    assert not legacy.exists()
+    assert {doc.title for doc in load_raw_documents()} == {"Задачи", "Новая"}
+    assert "Задачи" in next(load_raw_documents(prefix=slug)).html
+
+
+def test_dictionary_improves_compression_of_template_pages(tmp_path):
+    pages = [page(f"Метод {number}").encode("utf-8") for number in range(20)]
+    plain, shared = BlobStore(tmp_path / "plain"), BlobStore(tmp_path / "shared")
+    dictionary = build_dictionary(pages)
+    assert b"<html" in dictionary and len(dictionary) < sum(map(len, pages))
+    shared.set_dictionary(dictionary)
+    for data in pages:
+        assert plain.get(plain.put(data)) == shared.get(shared.put(data)) == data
+    assert shared.stats.bytes_written < plain.stats.bytes_written
+
+
+def test_zstd_codec(tmp_path):
+    pytest.importorskip("zstandard")
+    store = BlobStore(tmp_path, codec="zstd")
+    store.set_dictionary(build_dictionary([page("Сделки").encode("utf-8"), page("Задачи").encode("utf-8")]))
+    digest = store.put(page("Лиды").encode("utf-8"))
+    assert BlobStore(tmp_path).get(digest) == page("Лиды").encode("utf-8")
+
+
+def test_cli_compact_raw():
+    persist_fetch_results([fetched("https://apidocs.bitrix24.ru/api-reference/crm/", "Сделки")])
+    result = CliRunner().invoke(cli, ["compact-raw", "--no-dictionary"])
+    assert result.exit_code == 0, result.output
+    assert "Страниц 1" in result.output
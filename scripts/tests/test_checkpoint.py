@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.checkpoint import CrawlCheckpoint
+from bitrix24_docs_etl.crawl import BitrixCrawler
+from bitrix24_docs_etl.stream import run_stream
+
+from test_crawl import build_site
+
+
+class Interrupted(Exception):
+    pass
+
+
+def persisting_sink(limit=None):
+    seen = []
+
+    async def sink(page):
+        if limit is not None and len(seen) == limit:
+            raise Interrupted
+        storage.persist_fetch_results([page])
+        seen.append(page.url)
+
+    return sink, seen
+
+
+def test_interrupted_crawl_resumes_without_refetching(docs_site):
+    build_site(docs_site)
+    path = storage.CRAWL_CHECKPOINT_FILE
+    crawler = BitrixCrawler(docs_site.base_url, max_depth=2, checkpoint=CrawlCheckpoint(path))
+    sink, first = persisting_sink(limit=3)
+    with pytest.raises(Interrupted):
+        asyncio.run(crawler.crawl([None], sink=sink))
+    assert len(first) == 3 and path.exists()
+
+    docs_site.requests.clear()
+    checkpoint = CrawlCheckpoint.load(path)
+    resumed = BitrixCrawler(docs_site.base_url, max_depth=2, checkpoint=checkpoint)
+    sink, second = persisting_sink()
+    result = asyncio.run(resumed.crawl([None], sink=sink))
+
+    # Четвёртая страница загружалась, но не была сохранена: её загружают снова.
+    assert result.stats.resumed == 3 and result.stats.fetched == 2
+    assert sorted(result.restored) == sorted(first) and not set(first) & set(second)
+    assert {path for path, _ in docs_site.requests} == {"/crm/deal/", "/tasks/add/"}
+    assert len(result.pages) == 5 and not path.exists()
+
+
+def test_checkpoint_is_tied_to_the_crawl(docs_site):
+    build_site(docs_site)
+    path = storage.CRAWL_CHECKPOINT_FILE
+    CrawlCheckpoint(path, base_url=docs_site.base_url, max_depth=2).save()
+
+    other = BitrixCrawler(docs_site.base_url, max_depth=3, checkpoint=CrawlCheckpoint.load(path))
+    with pytest.raises(ValueError):
+        asyncio.run(other.crawl([None]))
+
+
+def test_stream_resume_processes_restored_pages(docs_site):
+    build_site(docs_site)
+    path = storage.CRAWL_CHECKPOINT_FILE
+    sink, _ = persisting_sink(limit=2)
+    with pytest.raises(Interrupted):
+        asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=2, checkpoint=CrawlCheckpoint(path)).crawl([None], sink=sink))
+
+    crawler = BitrixCrawler(docs_site.base_url, max_depth=2, checkpoint=CrawlCheckpoint.load(path))
+    stats = asyncio.run(run_stream(crawler))
+    assert (stats.crawl.resumed, stats.crawl.fetched, stats.persisted) == (2, 3, 3)
+    assert stats.normalized == 5 and stats.index is not None and stats.index.added == 5
+
+
+def test_pages_are_journaled_and_snapshot_is_written_per_level(docs_site):
+    build_site(docs_site)
+    path = storage.CRAWL_CHECKPOINT_FILE
+    checkpoint = CrawlCheckpoint(path, every=1)
+    sink, first = persisting_sink(limit=4)
+    with pytest.raises(Interrupted):
+        asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=2, checkpoint=checkpoint).crawl([None], sink=sink))
+
+    # Снимок пишется в начале уровня и при прерывании, а не после каждой страницы.
+    assert checkpoint.saves <= 4 and "pages" not in path.read_text(encoding="utf-8")
+    journal = checkpoint.journal_path
+    assert len(journal.read_text(encoding="utf-8").splitlines()) == 4
+    # Оборванная при аварии последняя строка отбрасывается.
+    with journal.open("a", encoding="utf-8") as handle:
+        handle.write('{"key": "http')
+    restored = CrawlCheckpoint.load(path)
+    assert len(list(restored.fetched())) == 4 and journal.read_text(encoding="utf-8").endswith("\n")
+
+    result = asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=2, checkpoint=restored).crawl([None], sink=persisting_sink()[0]))
+    assert (result.stats.resumed, result.stats.fetched) == (4, 1)
+    assert not path.exists() and not journal.exists()
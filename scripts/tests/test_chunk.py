@@ -0,0 +1,77 @@
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.chunk import chunk_all
+from bitrix24_docs_etl.storage import delete_processed_document, load_chunks
+
+from test_index_build import write_processed
+
+METHOD_PAGE = """# Добавить сделку crm.deal.add
+
+Метод добавляет новую сделку.
+
+## Параметры метода {#params}
+
+| Название | Описание |
+|----------|----------|
+| fields   | Поля сделки |
+
+### Поле TITLE
+
+Название сделки.
+
+## Примеры кода
+
+```php
+# Это не заголовок
+$result = CRest::call('crm.deal.add');
+```
+
+## Параметры метода
+
+Повторный заголовок получает другой якорь.
+"""
+
+
+def test_chunks_follow_headings_with_stable_ids_and_parents():
+    write_processed("crm_deal_add", "crm.deal.add", METHOD_PAGE)
+
+    stats = chunk_all()
+
+    assert (stats.chunked, stats.chunks) == (1, 5)
+    chunks = {chunk["id"]: chunk for chunk in load_chunks("crm_deal_add")}
+    assert list(chunks) == [
+        "crm_deal_add#добавить-сделку-crmdealadd",
+        "crm_deal_add#params",
+        "crm_deal_add#поле-title",
+        "crm_deal_add#примеры-кода",
+        "crm_deal_add#параметры-метода",
+    ]
+    params = chunks["crm_deal_add#params"]
+    assert params["kind"] == "table" and params["heading"] == "Параметры метода"
+    assert params["url"].endswith("/crm_deal_add#params")
+    field_chunk = chunks["crm_deal_add#поле-title"]
+    assert field_chunk["parent"] == "crm_deal_add#params"
+    assert field_chunk["heading_path"] == ["Добавить сделку crm.deal.add", "Параметры метода", "Поле TITLE"]
+    assert chunks["crm_deal_add#примеры-кода"]["kind"] == "code"
+    assert "# Это не заголовок" in chunks["crm_deal_add#примеры-кода"]["markdown"]
+
+    assert chunk_all().skipped == 1, "неизменённый Markdown не разбивается повторно"
+
+
+def test_long_sections_split_without_breaking_blocks_and_deleted_docs_pruned():
+    paragraphs = "\n\n".join(f"Абзац {n} " + "текст " * 40 for n in range(10))
+    table = "\n".join(["| a | b |", "|---|---|"] + [f"| {n} | {n} |" for n in range(50)])
+    write_processed("long_page", "Long", f"# Длинный раздел\n\n{paragraphs}\n\n{table}\n")
+    write_processed("gone_page", "Gone", "# Удалится\n\nТекст")
+
+    chunk_all(max_chars=600)
+
+    parts = load_chunks("long_page")
+    assert len(parts) > 3 and parts[1]["id"] == "long_page#длинный-раздел~2"
+    assert all(part["markdown"].startswith("# Длинный раздел") for part in parts)
+    assert sum(part["markdown"].count("| 49 | 49 |") for part in parts) == 1
+    assert any("| a | b |" in part["markdown"] and "| 49 | 49 |" in part["markdown"] for part in parts)
+
+    delete_processed_document("gone_page")
+    assert not (storage.PROCESSED_CHUNKS_DIR / "gone_page.jsonl").exists()
+    (storage.PROCESSED_MARKDOWN_DIR / "long_page.md").unlink()
+    assert chunk_all().removed == 1
@@ -0,0 +1,46 @@
+import asyncio
+
+from bitrix24_docs_etl.crawl import BitrixCrawler
+
+
+def page(title: str, *links: str) -> str:
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return f"<html><head><title>{title}</title></head><body><main>{anchors}</main></body></html>"
+
+
+def build_site(site) -> None:
+    site.pages.update(
+        {
+            "/": page("Home", "/crm/", "/tasks/", "https://example.com/out"),
+            "/crm/": page("CRM", "/crm/deal/", "/tasks/"),
+            "/tasks/": page("Tasks", "/tasks/add/"),
+            "/crm/deal/": page("Deal", "/crm/deal/add/"),
+            "/tasks/add/": page("Task add"),
+            "/crm/deal/add/": page("Deal add"),
+        }
+    )
+    # Ранние страницы уровня отвечают медленнее, чтобы перемешать порядок завершения.
+    site.delays.update({"/crm/": 0.05, "/crm/deal/": 0.05})
+
+
+def test_concurrent_crawl_matches_sequential_order(docs_site):
+    build_site(docs_site)
+
+    sequential = asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=2).crawl([None]))
+    concurrent = asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=2, workers=4).crawl([None]))
+
+    expected = [docs_site.base_url + path.lstrip("/") for path in ("/", "/crm/", "/tasks/", "/crm/deal/", "/tasks/add/")]
+    assert list(sequential.pages) == expected
+    assert list(concurrent.pages) == expected
+    assert concurrent.stats.fetched == 5
+    assert concurrent.stats.pages_per_second > 0
+
+
+def test_crawl_respects_max_pages_and_counts_failures(docs_site):
+    build_site(docs_site)
+    docs_site.pages["/"] = page("Home", "/missing/", "/crm/", "/tasks/")
+
+    result = asyncio.run(BitrixCrawler(docs_site.base_url, max_pages=3, workers=3).crawl([None]))
+
+    assert list(result.pages) == [docs_site.base_url, docs_site.base_url + "crm/"]
+    assert result.stats.failed == 1
@@ -0,0 +1,62 @@
+import asyncio
+import gzip
+
+from bitrix24_docs_etl.crawl import BitrixCrawler
+from bitrix24_docs_etl.discovery import parse_robots, parse_sitemap
+
+from test_crawl import build_site, page
+
+URLSET = '<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{}</urlset>'
+INDEX = '<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{}</sitemapindex>'
+
+
+def locations(base_url, *paths):
+    return "".join(f"<url><loc>{base_url}{path.lstrip('/')}</loc></url>" for path in paths)
+
+
+def test_sitemap_seeds_a_flat_crawl_that_respects_robots(docs_site):
+    build_site(docs_site)
+    base = docs_site.base_url
+    docs_site.pages.update(
+        {
+            "/orphan/": page("Orphan"),
+            "/private/": page("Private"),
+            "/robots.txt": f"User-agent: *\nDisallow: /private/\nRequest-rate: 20/1\nSitemap: {base}sitemap-index.xml\n",
+            "/sitemap-index.xml": INDEX.format(f"<sitemap><loc>{base}sitemap-a.xml</loc></sitemap><sitemap><loc>{base}sitemap-b.xml.gz</loc></sitemap>"),
+            "/sitemap-a.xml": URLSET.format(locations(base, "/crm/deal/add/", "/tasks/add/", "/private/")),
+            "/sitemap-b.xml.gz": gzip.compress(URLSET.format(locations(base, "/orphan/", "https://example.com/out")).encode("utf-8")),
+        }
+    )
+
+    result = asyncio.run(
+        BitrixCrawler(base, max_depth=0, workers=4, robots=True, sitemap=True).crawl([None])
+    )
+    assert set(result.pages) == {base, base + "crm/deal/add/", base + "tasks/add/", base + "orphan/"}
+    assert result.stats.sitemap_urls == 5 and result.stats.disallowed == 1
+    # Разводящие страницы не загружались: список пришёл из sitemap.
+    fetched = {path for path, _ in docs_site.requests}
+    assert "/crm/" not in fetched and "/private/" not in fetched
+    # Request-rate 20/1 — интервал 0.05 с: четыре страницы не быстрее трёх интервалов.
+    assert result.stats.elapsed >= 0.15
+
+
+def test_missing_robots_allows_everything(docs_site):
+    build_site(docs_site)
+
+    result = asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=1, robots=True).crawl([None]))
+    assert len(result.pages) == 3 and result.stats.disallowed == 0
+    assert docs_site.requests[0] == ("/robots.txt", 404)
+
+
+def test_robots_rules_and_sitemap_parsing():
+    policy = parse_robots(
+        "User-agent: Bitrix24-Docs-MCP\nDisallow: /search\nCrawl-delay: 3\nRequest-rate: 2/1\n\n"
+        "User-agent: *\nDisallow: /\n\nSitemap: https://example.com/sitemap.xml\n"
+    )
+    assert policy.allows("https://example.com/api/") and not policy.allows("https://example.com/search?q=x")
+    assert policy.crawl_delay == 3 and policy.sitemaps == ("https://example.com/sitemap.xml",)
+
+    pages, nested = parse_sitemap(INDEX.format("<sitemap><loc> https://example.com/a.xml </loc></sitemap>").encode())
+    assert (pages, nested) == ([], ["https://example.com/a.xml"])
+    pages, nested = parse_sitemap(gzip.compress(URLSET.format("<url><loc>https://example.com/x</loc></url>").encode()))
+    assert (pages, nested) == (["https://example.com/x"], [])
@@ -0,0 +1,62 @@
+import json
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.fetch import FetchResult
+from bitrix24_docs_etl.normalize import normalize_all
+from bitrix24_docs_etl.storage import (
+    configure_store,
+    load_processed_documents,
+    load_raw_documents,
+    load_raw_metadata,
+    persist_fetch_results,
+)
+
+from test_crawl import page
+from test_index_build import write_processed
+
+
+def fetched(path: str, title: str, etag: str | None = None) -> FetchResult:
+    return FetchResult(
+        url=f"https://apidocs.bitrix24.ru/{path}",
+        status_code=200,
+        title=title,
+        content=page(title),
+        links=[],
+        etag=etag,
+    )
+
+
+def test_sqlite_store_replaces_meta_files():
+    configure_store("sqlite", html_in_db=True)
+    stored = persist_fetch_results(
+        [fetched("api-reference/crm/deal/", "Сделки"), fetched("api-reference/tasks/", "Задачи", '"t-1"')]
+    )
+    assert [meta["change"] for meta in stored] == ["new", "new"]
+    assert not list(storage.RAW_META_DIR.glob("*.json")) and not list(storage.RAW_DIR.glob("*.html"))
+    assert load_raw_metadata()["https://apidocs.bitrix24.ru/api-reference/tasks/"]["etag"] == '"t-1"'
+
+    again = persist_fetch_results([fetched("api-reference/tasks/", "Задачи", '"t-1"')])
+    assert again[0]["change"] == "unchanged"
+
+    stats = normalize_all()
+    assert (stats.processed, stats.skipped) == (2, 0)
+    assert not list(storage.PROCESSED_META_DIR.glob("*.json"))
+    assert normalize_all().skipped == 2
+
+    crm = [doc.title for doc in load_processed_documents(prefix="apidocs_bitrix24_ru_api-reference_crm")]
+    assert crm == ["Сделки"]
+    assert "Задачи" in next(load_raw_documents(prefix="apidocs_bitrix24_ru_api-reference_tasks")).html
+
+
+def test_sqlite_store_imports_existing_json_metadata():
+    write_processed("crm_deal_add", "crm.deal.add", "Метод добавляет сделку")
+    (storage.RAW_META_DIR / "page.json").write_text(
+        json.dumps({"url": "https://apidocs.bitrix24.ru/page", "slug": "page", "html_path": "raw/page.html"}),
+        encoding="utf-8",
+    )
+
+    configure_store("sqlite")
+
+    assert [doc.slug for doc in load_processed_documents()] == ["crm_deal_add"]
+    assert list(load_raw_metadata()) == ["https://apidocs.bitrix24.ru/page"]
+    assert (storage.DATA_DIR / storage.DOCSTORE_NAME).exists()
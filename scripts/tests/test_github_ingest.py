@@ -0,0 +1,116 @@
+import subprocess
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.github_ingest import import_github_docs, import_local_docs
+
+from test_index_build import write_processed
+
+
+def git(*args: str, cwd=None) -> str:
+    result = subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def commit_files(work, files: dict[str, str | None], message: str) -> None:
+    for path, content in files.items():
+        target = work / path
+        if content is None:
+            git("rm", "-q", path, cwd=work)
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content, encoding="utf-8")
+        git("add", path, cwd=work)
+    git("-c", "user.name=t", "-c", "user.email=t@example.com", "commit", "-qm", message, cwd=work)
+    git("push", "-q", "origin", "HEAD:main", cwd=work)
+
+
+def test_reimport_applies_only_git_diff(tmp_path):
+    origin = tmp_path / "origin.git"
+    work = tmp_path / "work"
+    git("init", "-q", "--bare", "-b", "main", str(origin))
+    git("clone", "-q", str(origin), str(work))
+    commit_files(
+        work,
+        {
+            "api-reference/crm/deal-add.md": "# crm.deal.add\nДобавляет сделку",
+            "api-reference/crm/lead-add.md": "# crm.lead.add\nДобавляет лид",
+            "api-reference/tasks/task-add.md": "# tasks.task.add\nДобавляет задачу",
+            "README.md": "# Не входит в импорт",
+        },
+        "initial",
+    )
+
+    first = import_github_docs(repo_url=str(origin), branch="main")
+    assert (first.added, first.modified, first.deleted, first.from_commit) == (3, 0, 0, None)
+
+    commit_files(
+        work,
+        {
+            "api-reference/crm/lead-add.md": "# crm.lead.add\nСоздаёт лид",
+            "api-reference/tasks/task-add.md": None,
+            "tutorials/webhooks.md": "# Вебхуки",
+        },
+        "update",
+    )
+    unchanged_mtime = (storage.PROCESSED_MARKDOWN_DIR / "api-reference_crm_deal-add.md").stat().st_mtime_ns
+
+    second = import_github_docs(repo_url=str(origin), branch="main")
+
+    assert (second.added, second.modified, second.deleted) == (1, 1, 1)
+    assert second.from_commit == first.to_commit
+    assert second.to_commit == git("rev-parse", "HEAD", cwd=work)
+    assert sorted(path.stem for path in storage.PROCESSED_MARKDOWN_DIR.glob("*.md")) == [
+        "api-reference_crm_deal-add",
+        "api-reference_crm_lead-add",
+        "tutorials_webhooks",
+    ]
+    assert (storage.PROCESSED_MARKDOWN_DIR / "api-reference_crm_deal-add.md").stat().st_mtime_ns == unchanged_mtime
+    assert not (storage.PROCESSED_META_DIR / "api-reference_tasks_task-add.json").exists()
+
+    third = import_github_docs(repo_url=str(origin), branch="main")
+    assert (third.imported, third.deleted) == (0, 0)
+
+
+def test_full_import_prunes_documents_gone_upstream(tmp_path):
+    origin = tmp_path / "origin.git"
+    work = tmp_path / "work"
+    git("init", "-q", "--bare", "-b", "main", str(origin))
+    git("clone", "-q", str(origin), str(work))
+    commit_files(work, {"api-reference/a.md": "# A", "api-reference/b.md": "# B"}, "initial")
+    import_github_docs(repo_url=str(origin), branch="main")
+    write_processed("apidocs_bitrix24_ru_index", "Сайт", "# Страница сайта")
+
+    commit_files(work, {"api-reference/b.md": None}, "remove b")
+    full = import_github_docs(repo_url=str(origin), branch="main", full=True)
+
+    assert (full.imported, full.deleted) == (1, 1)
+    assert sorted(path.stem for path in storage.PROCESSED_MARKDOWN_DIR.glob("*.md")) == [
+        "api-reference_a",
+        "apidocs_bitrix24_ru_index",
+    ]
+
+
+def test_parallel_import_reports_progress_and_keeps_order(tmp_path):
+    origin = tmp_path / "origin.git"
+    work = tmp_path / "work"
+    git("init", "-q", "--bare", "-b", "main", str(origin))
+    git("clone", "-q", str(origin), str(work))
+    commit_files(work, {f"api-reference/doc-{n:02d}.md": f"# Документ {n}\nТекст {n}" for n in range(30)}, "docs")
+
+    calls = []
+    stats = import_github_docs(repo_url=str(origin), branch="main", workers=4, progress=lambda *call: calls.append(call))
+
+    assert stats.added == 30
+    assert calls[-1] == (30, 30) and [done for done, _ in calls] == list(range(1, 31))
+    titles = [doc.title for doc in storage.load_processed_documents()]
+    assert titles == [f"Документ {n}" for n in range(30)]
+
+
+def test_local_checkout_outside_data_dir(tmp_path_factory):
+    checkout = tmp_path_factory.mktemp("checkout")
+    (checkout / "api-reference").mkdir()
+    (checkout / "api-reference" / "crm-deal-add.md").write_text("# Добавить сделку\nТекст", encoding="utf-8")
+
+    assert import_local_docs(checkout).imported == 1
+    [doc] = storage.load_processed_documents()
+    assert doc.title == "Добавить сделку" and doc.url.endswith("/blob/main/api-reference/crm-deal-add.md")
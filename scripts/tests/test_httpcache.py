@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.crawl import BitrixCrawler
+from bitrix24_docs_etl.fetch import BitrixDocumentationFetcher
+from bitrix24_docs_etl.httpcache import CacheMissError, HttpCache, freshness_lifetime
+
+from test_crawl import build_site, page
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def fetch(site, cache, path, offline=False, previous=None):
+    async def run():
+        fetcher = BitrixDocumentationFetcher(site.base_url, cache=cache, offline=offline)
+        try:
+            return await fetcher.fetch(path, previous)
+        finally:
+            await fetcher.aclose()
+
+    return asyncio.run(run())
+
+
+def test_recrawl_and_offline_replay_are_served_from_cache(docs_site):
+    build_site(docs_site)
+    cache = HttpCache(storage.HTTP_CACHE_DIR)
+
+    first = asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=2, workers=2, http_cache=cache).crawl([None]))
+    assert first.stats.fetched == 5 and cache.stats.stored == 5
+    docs_site.requests.clear()
+
+    again = asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=2, http_cache=cache).crawl([None]))
+    assert docs_site.requests == [] and again.stats.from_cache == 5
+    assert list(again.pages) == list(first.pages)
+
+    offline_cache = HttpCache(storage.HTTP_CACHE_DIR, default_ttl=0)
+    replay = asyncio.run(
+        BitrixCrawler(docs_site.base_url, max_depth=3, http_cache=offline_cache, offline=True).crawl([None])
+    )
+    # Страница четвёртого уровня в кэш не попадала: офлайн это ошибка загрузки.
+    assert docs_site.requests == [] and replay.stats.failed == 1
+    assert replay.stats.fetched == 5 and replay.raw_pages[docs_site.base_url].content == first.raw_pages[docs_site.base_url].content
+
+    with pytest.raises(CacheMissError):
+        fetch(docs_site, offline_cache, "/unknown/", offline=True)
+
+
+def test_cache_control_controls_storage_and_revalidation(docs_site):
+    clock = FakeClock()
+    cache = HttpCache(storage.HTTP_CACHE_DIR, clock=clock)
+    docs_site.pages.update({"/private/": page("Private"), "/revalidate/": page("Revalidate"), "/fresh/": page("Fresh")})
+    docs_site.headers_by_path.update(
+        {
+            "/private/": {"Cache-Control": "no-store"},
+            "/revalidate/": {"Cache-Control": "no-cache"},
+            "/fresh/": {"Cache-Control": "public, max-age=60"},
+        }
+    )
+    docs_site.etags["/revalidate/"] = '"r-1"'
+
+    for path in ("/private/", "/revalidate/", "/fresh/"):
+        fetch(docs_site, cache, path)
+    assert cache.stats.stored == 2 and cache.get(docs_site.base_url + "private/") is None
+    docs_site.requests.clear()
+
+    revalidated = fetch(docs_site, cache, "/revalidate/")
+    assert docs_site.requests == [("/revalidate/", 304)]
+    assert revalidated.from_cache and revalidated.title == "Revalidate" and not revalidated.not_modified
+
+    # raw/meta с тем же ETag: страница уже сохранена, результат — not_modified.
+    known = fetch(docs_site, cache, "/revalidate/", previous={"etag": '"r-1"', "title": "Revalidate", "links": []})
+    assert known.not_modified and known.from_cache
+
+    docs_site.requests.clear()
+    fetch(docs_site, cache, "/fresh/")
+    clock.now += 61
+    fetch(docs_site, cache, "/fresh/")
+    assert docs_site.requests == [("/fresh/", 200)]
+
+
+def test_corrupt_entries_are_dropped_as_misses(docs_site):
+    docs_site.pages.update({"/a/": page("A"), "/b/": page("B")})
+    cache = HttpCache(storage.HTTP_CACHE_DIR)
+    fetch(docs_site, cache, "/a/")
+    fetch(docs_site, cache, "/b/")
+    broken, truncated = (cache._path(docs_site.base_url + path) for path in ("a/", "b/"))
+    broken.write_bytes(b"{not json\n")
+    truncated.write_bytes(truncated.read_bytes()[:-5])
+
+    docs_site.requests.clear()
+    assert fetch(docs_site, cache, "/a/").title == "A" and fetch(docs_site, cache, "/b/").title == "B"
+    assert docs_site.requests == [("/a/", 200), ("/b/", 200)]
+    assert (cache.stats.hits, cache.stats.misses) == (0, 4)
+
+    # Перезаписанные записи снова отдаются из кэша.
+    fetch(docs_site, cache, "/a/")
+    assert cache.stats.hits == 1 and len(docs_site.requests) == 2
+
+
+def test_freshness_lifetime_directives():
+    now = 1_700_000_000.0
+    assert freshness_lifetime({"cache-control": "max-age=120, must-revalidate"}, 10, now) == 120
+    assert freshness_lifetime({"cache-control": "no-store"}, 10, now) is None
+    assert freshness_lifetime({"expires": "0"}, 10, now) == 0.0
+    assert freshness_lifetime({"expires": "Tue, 14 Nov 2023 22:14:20 GMT"}, 10, now) == pytest.approx(60, abs=1)
+    assert freshness_lifetime({}, 10, now) == 10
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from bitrix24_docs_etl.chunk import chunk_all
+from bitrix24_docs_etl.hybrid import LabelledQuery, evaluate, hybrid_search, load_labelled_queries, section_of
+from bitrix24_docs_etl.segments import update_index
+
+from test_index_build import write_processed
+
+
+def build_corpus() -> None:
+    write_processed(
+        "api-reference_crm_deals_crm-deal-add",
+        "crm.deal.add",
+        "# Добавить сделку\n\nМетод crm.deal.add создаёт сделку.\n\n## Параметры\n\nСтадия воронки и сумма сделки",
+    )
+    write_processed(
+        "api-reference_crm_deals_crm-deal-list",
+        "crm.deal.list",
+        "# Список сделок\n\nВозвращает сделки по фильтру и сортировке.",
+    )
+    write_processed(
+        "api-reference_tasks_tasks-task-add",
+        "tasks.task.add",
+        "# Добавить задачу\n\nСоздаёт задачу.\n\n## Параметры\n\nОтветственный, срок задачи и стадия",
+    )
+    write_processed(
+        "api-reference_user_user-get",
+        "user.get",
+        "# Получить пользователя\n\nВозвращает сотрудников портала по фильтру.",
+    )
+    update_index()
+
+
+def test_section_is_derived_from_slug():
+    assert section_of("api-reference_crm_deals_crm-deal-add") == "crm"
+    assert section_of("apidocs_bitrix24_ru_api-reference_tasks_tasks-task-add.html") == "tasks"
+    assert section_of("tutorials_crm_how-to-add-deal") == "crm"
+    assert section_of("api-reference_index") == "api-reference"
+    assert section_of("crm_deal_add") == "crm"
+
+
+def test_lexical_mode_filters_sections_and_reports_timings():
+    build_corpus()
+
+    result = hybrid_search("стадия", mode="lexical")
+    assert {hit.slug for hit in result.hits} == {
+        "api-reference_crm_deals_crm-deal-add",
+        "api-reference_tasks_tasks-task-add",
+    }
+    assert {"lexical", "fusion", "total"} <= set(result.timings)
+
+    filtered = hybrid_search("стадия", mode="hybrid", sections=["tasks"])
+    assert [hit.slug for hit in filtered.hits] == ["api-reference_tasks_tasks-task-add"]
+    assert filtered.hits[0].section == "tasks" and filtered.hits[0].lexical_rank == 1
+
+
+def test_hybrid_fuses_lexical_and_dense_rankings():
+    pytest.importorskip("numpy")
+    from bitrix24_docs_etl.vectors import build_vector_index
+
+    build_corpus()
+    chunk_all()
+    build_vector_index()
+
+    result = hybrid_search("срок задачи ответственный", limit=3)
+    assert result.dense_available
+    top = result.hits[0]
+    assert top.slug == "api-reference_tasks_tasks-task-add"
+    assert (top.lexical_rank, top.dense_rank) == (1, 1)
+    # Ссылка и заголовок берутся из лучшего фрагмента векторной выдачи.
+    assert top.heading == "Параметры" and top.url.endswith("#параметры")
+    assert {"lexical", "dense_embed", "dense_search", "fusion", "total"} <= set(result.timings)
+
+    only_crm = hybrid_search("стадия", sections=["crm"], fusion="weighted")
+    assert {hit.section for hit in only_crm.hits} == {"crm"}
+
+    queries = [
+        LabelledQuery("crm.deal.add", ["crm-deal-add"]),
+        LabelledQuery("сделки по фильтру", ["crm-deal-list"], sections=["crm"]),
+        LabelledQuery("сотрудники портала", ["user-get"]),
+        LabelledQuery("удалить лид", ["crm-lead-delete"]),
+    ]
+    reports = {report.mode: report for report in evaluate(queries, k=3)}
+    assert set(reports) == {"lexical", "dense", "hybrid"}
+    hybrid = reports["hybrid"]
+    assert hybrid.recall == pytest.approx(0.75) and hybrid.mrr == pytest.approx(0.75)
+    assert hybrid.misses == ["удалить лид"]
+
+
+def test_shipped_query_set_is_well_formed():
+    queries = load_labelled_queries()
+    assert len(queries) >= 10
+    assert all(item.query and item.relevant for item in queries)
+
+
+def test_evaluate_reads_custom_query_file(tmp_path):
+    build_corpus()
+    path = tmp_path / "queries.json"
+    path.write_text(json.dumps({"queries": [{"query": "список сделок", "relevant": ["crm-deal-list"]}]}), encoding="utf-8")
+
+    [report] = evaluate(load_labelled_queries(path), k=5, modes=["lexical"])
+    assert (report.queries, report.recall, report.mrr) == (1, 1.0, 1.0)
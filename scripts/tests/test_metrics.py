@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+from click.testing import CliRunner
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl import metrics
+from bitrix24_docs_etl.cli import cli
+from bitrix24_docs_etl.crawl import BitrixCrawler
+
+from test_crawl import build_site
+
+
+def test_crawl_records_http_statuses_bytes_and_operations(docs_site):
+    build_site(docs_site)
+    docs_site.pages["/"] = docs_site.pages["/"].replace('href="/tasks/"', 'href="/missing/"')
+
+    run = metrics.start_run("crawl")
+    try:
+        with metrics.stage("crawl") as stage:
+            result = asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=1).crawl([None]))
+            storage.persist_fetch_results(result.raw_pages.values())
+            stage.documents = result.stats.fetched
+    finally:
+        metrics.stop_run()
+
+    assert run.http_statuses == {"200": 2, "404": 1}
+    crawl = run.stages["crawl"]
+    assert crawl.documents == 2 and crawl.bytes_fetched == run.bytes_fetched > 0
+    assert crawl.bytes_written == run.bytes_written > 0
+    assert run.operations["http_request"].count == 3 and run.operations["parse"].count == 2
+    slowest = run.operations["http_request"].to_dict()["slowest"]
+    assert slowest[0]["key"] == docs_site.base_url + "crm/"
+
+    # Без активного сборщика запись метрик ничего не делает.
+    metrics.record_http(200, 10)
+    assert metrics.active() is None and run.http_statuses["200"] == 2
+
+
+def test_cli_writes_json_report_prometheus_file_and_profile(docs_site, tmp_path):
+    build_site(docs_site)
+    result = asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=2).crawl([None]))
+    storage.persist_fetch_results(result.raw_pages.values())
+    report_path, prom_path, profile_dir = tmp_path / "run.json", tmp_path / "run.prom", tmp_path / "profiles"
+
+    outcome = CliRunner().invoke(
+        cli,
+        [
+            "--metrics-json", str(report_path),
+            "--metrics-prom", str(prom_path),
+            "--profile", "normalize",
+            "--profile-dir", str(profile_dir),
+            "normalize",
+        ],
+    )  # fmt: skip
+    assert outcome.exit_code == 0, outcome.output
+
+    report = json.loads(report_path.read_text(encoding="utf-8"))
+    assert report["command"] == "normalize" and report["success"]
+    assert report["stages"]["normalize"]["documents"] == 5 and "normalize.convert" in report["stages"]
+    assert {"parse", "markdown", "disk_write"} <= set(report["operations"])
+    assert report["operations"]["markdown"]["buckets"]["+Inf"] == 5
+    assert (profile_dir / "normalize.prof").exists()
+    assert "convert_html" in (profile_dir / "normalize.txt").read_text(encoding="utf-8")
+
+    prom = prom_path.read_text(encoding="utf-8")
+    assert 'bitrix24_docs_run_info{command="normalize"} 1' in prom
+    assert "bitrix24_docs_run_success 1" in prom
+    assert 'bitrix24_docs_stage_documents{stage="normalize"} 5' in prom
+    assert 'bitrix24_docs_operation_seconds_count{operation="parse"} 5' in prom
+    assert "# TYPE bitrix24_docs_operation_seconds histogram" in prom
+    assert metrics.active() is None
@@ -0,0 +1,51 @@
+import pytest
+from click.testing import CliRunner
+
+from bitrix24_docs_etl.cli import cli
+from bitrix24_docs_etl.normalize import normalize_all
+from bitrix24_docs_etl.storage import load_processed_documents, persist_fetch_results
+from bitrix24_docs_etl.fetch import FetchResult
+
+
+def make_results(count: int) -> list[FetchResult]:
+    return [
+        FetchResult(
+            url=f"https://apidocs.bitrix24.ru/api/page-{number:02d}.html",
+            status_code=200,
+            content=f"<html><body><main><h1>Страница {number}</h1><p>Текст {number}</p></main></body></html>",
+            title=f"Страница {number}",
+        )
+        for number in range(count)
+    ]
+
+
+def snapshot() -> dict[str, str]:
+    return {doc.slug: doc.markdown_path.read_text(encoding="utf-8") for doc in load_processed_documents()}
+
+
+def test_parallel_normalize_matches_serial_and_keeps_limit_force():
+    persist_fetch_results(make_results(10))
+
+    limited = normalize_all(limit=4, workers=2, chunksize=3)
+    assert (limited.processed, limited.skipped) == (4, 0)
+
+    rest = normalize_all(workers=2, chunksize=3)
+    assert (rest.processed, rest.skipped, rest.total) == (6, 4, 10)
+    parallel = snapshot()
+
+    serial = normalize_all(force=True)
+    assert serial.processed == 10
+    assert snapshot() == parallel
+    assert parallel["apidocs_bitrix24_ru_api_page-03.html"] == "# Страница 3\n\nТекст 3"
+    assert set(serial.stage_seconds) == {"read", "convert", "write"}
+
+
+def test_chunksize_must_be_positive():
+    persist_fetch_results(make_results(2))
+    with pytest.raises(ValueError):
+        normalize_all(workers=2, chunksize=0)
+    for option in ("--chunksize", "--workers"):
+        result = CliRunner().invoke(cli, ["normalize", option, "0"])
+        assert result.exit_code == 2 and option in result.output
+    result = CliRunner().invoke(cli, ["pipeline", "--normalize-workers", "0"])
+    assert result.exit_code == 2 and "--normalize-workers" in result.output
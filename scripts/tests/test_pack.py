@@ -0,0 +1,90 @@
+import pytest
+from click.testing import CliRunner
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.cli import cli
+from bitrix24_docs_etl.pack import CorpusPack, write_pack
+from bitrix24_docs_etl.segments import update_index
+from bitrix24_docs_etl.serve import SearchService
+
+from test_index_build import write_processed
+
+
+def build_pack(tmp_path, count=50):
+    for number in range(count):
+        write_processed(f"api-reference_crm_method-{number}", f"Метод {number}", f"# Метод {number}\n\nОписание ✓ {number}")
+    return write_pack(tmp_path / "corpus.pack")
+
+
+def test_pack_round_trip_and_zero_copy_reads(tmp_path):
+    stats = build_pack(tmp_path)
+    assert stats.documents == 50 and stats.bytes == (tmp_path / "corpus.pack").stat().st_size
+
+    with CorpusPack(tmp_path / "corpus.pack") as pack:
+        assert len(pack) == 50 and pack.info["documents"] == 50
+        assert sorted(pack.slugs()) == sorted(f"api-reference_crm_method-{number}" for number in range(50))
+        for number in range(50):
+            slug = f"api-reference_crm_method-{number}"
+            assert slug in pack
+            body = pack.body(slug)
+            assert isinstance(body, memoryview) and body.readonly
+            assert bytes(body) == f"# Метод {number}\n\nОписание ✓ {number}".encode("utf-8")
+            body.release()
+            meta = pack.meta(slug)
+            assert meta["title"] == f"Метод {number}" and meta["url"].endswith(slug)
+            same_meta, same_body = pack.document(slug)
+            with same_body:
+                assert same_meta == meta and same_body.tobytes().startswith(f"# Метод {number}".encode("utf-8"))
+        assert "nope" not in pack and pack.body("nope") is None and pack.meta("nope") is None
+        assert pack.document("nope") is None
+
+
+def test_empty_and_foreign_files(tmp_path):
+    assert write_pack(tmp_path / "empty.pack").documents == 0
+    with CorpusPack(tmp_path / "empty.pack") as pack:
+        assert len(pack) == 0 and pack.text("anything") is None
+
+    (tmp_path / "other.bin").write_bytes(b"not a pack at all, definitely")
+    with pytest.raises(ValueError):
+        CorpusPack(tmp_path / "other.bin")
+
+
+def test_search_service_fetches_from_pack(tmp_path):
+    build_pack(tmp_path, count=3)
+    with CorpusPack(tmp_path / "corpus.pack") as pack:
+        # Упакованный корпус самодостаточен: processed/ можно удалить.
+        for path in storage.PROCESSED_MARKDOWN_DIR.glob("*.md"):
+            path.unlink()
+        service = SearchService(workers=1, pack=pack)
+        try:
+            document = service.fetch("api-reference/crm/method-2.md")
+        finally:
+            service.close()
+    assert document["slug"] == "api-reference_crm_method-2"
+    assert document["title"] == "Метод 2" and document["content"].startswith("# Метод 2")
+
+
+def test_pack_notices_index_rebuilt_after_export(tmp_path):
+    build_pack(tmp_path, count=2)
+    update_index()
+    write_pack(tmp_path / "corpus.pack")
+    with CorpusPack(tmp_path / "corpus.pack") as pack:
+        assert pack.is_current()
+        write_processed("api-reference_crm_method-new", "Новый", "# Новый метод")
+        update_index()
+        assert not pack.is_current()
+
+        service = SearchService(workers=1, pack=pack)
+        try:
+            assert service.handle("GET", "/health")["pack"]["current"] is False
+        finally:
+            service.close()
+
+
+def test_cli_export(tmp_path):
+    write_processed("api-reference_crm_deal", "Сделка", "# Сделка")
+    result = CliRunner().invoke(cli, ["export", "--output", str(tmp_path / "out.pack")])
+    assert result.exit_code == 0, result.output
+    assert "Упаковано документов 1" in result.output
+    with CorpusPack(tmp_path / "out.pack") as pack:
+        assert pack.text("api-reference_crm_deal") == "# Сделка"
@@ -0,0 +1,50 @@
+import asyncio
+
+from bitrix24_docs_etl.crawl import BitrixCrawler
+from bitrix24_docs_etl.normalize import convert_html, normalize_all
+from bitrix24_docs_etl.parse import parse_html
+from bitrix24_docs_etl.storage import load_processed_documents, persist_fetch_results
+
+PAGE = """<html><head><title> crm.deal.add </title><script>var x = 1;</script></head>
+<body><nav><a href="/crm/">CRM</a><a href="#top">top</a></nav>
+<main><h1>crm.deal.add</h1><p>Метод <b>добавляет</b> сделку, см.
+<a href="update.html#fields">crm.deal.update</a> и <a href="mailto:docs@example.com">почту</a>.</p>
+<a href="https://example.com/external">внешняя</a></main><footer>подвал</footer></body></html>"""
+
+SOURCE_URL = "https://apidocs.bitrix24.ru/api/crm/add.html"
+
+
+def test_parse_html_extracts_everything_from_single_tree():
+    page = parse_html(PAGE, SOURCE_URL, "https://apidocs.bitrix24.ru/")
+
+    assert page.title == "crm.deal.add"
+    assert page.links == (
+        "https://apidocs.bitrix24.ru/api/crm/update.html",
+        "https://apidocs.bitrix24.ru/crm/",
+    )
+    assert page.markdown.startswith("# crm.deal.add")
+    assert "**добавляет**" in page.markdown
+    assert "CRM" not in page.markdown and "var x" not in page.markdown
+    assert page.text.startswith("crm.deal.add Метод добавляет сделку")
+    assert "подвал" not in page.text
+
+
+def test_parse_html_without_conversion_and_normalize_wrapper():
+    page = parse_html(PAGE, SOURCE_URL, convert=False)
+    assert page.markdown is None and page.text is None
+    assert len(page.links) == 2
+
+    markdown_text, text_content = convert_html(PAGE)
+    assert markdown_text == parse_html(PAGE).markdown
+    assert text_content == parse_html(PAGE).text
+
+
+def test_normalize_on_fetch_persists_processed_documents(docs_site):
+    docs_site.pages["/"] = PAGE
+    result = asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=0, normalize=True).crawl([None]))
+    persist_fetch_results(result.iter_fetch_results())
+
+    processed = list(load_processed_documents())
+    assert [doc.title for doc in processed] == ["crm.deal.add"]
+    assert processed[0].markdown_path.read_text(encoding="utf-8").startswith("# crm.deal.add")
+    assert normalize_all().skipped == 1
@@ -0,0 +1,44 @@
+from bitrix24_docs_etl.querycache import QueryCache, normalize_query
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = QueryCache(max_entries=2, max_bytes=100)
+    cache.put("a", 1, 10)
+    cache.put("b", 2, 10)
+    assert cache.get("a") == 1  # "b" становится самым старым
+    cache.put("c", 3, 10)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+
+    cache.put("big", 4, 95)
+    assert len(cache) == 1 and cache.get("big") == 4
+    assert not cache.put("huge", 5, 101)
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions, stats.entries, stats.bytes) == (4, 1, 3, 1, 95)
+
+
+def test_ttl_and_generation_invalidation():
+    clock = FakeClock()
+    cache = QueryCache(ttl=10.0, clock=clock)
+    cache.put("q", "old", 1, generation=1)
+    clock.now = 9.9
+    assert cache.get("q", generation=1) == "old"
+    clock.now = 10.0
+    assert cache.get("q", generation=1) is None
+
+    cache.put("q", "fresh", 1, generation=1)
+    assert cache.get("q", generation=2) is None
+    stats = cache.stats()
+    assert (stats.expirations, stats.invalidations, stats.entries, stats.bytes) == (1, 1, 0, 0)
+
+
+def test_normalized_query_ignores_case_and_spacing():
+    assert normalize_query("  CRM.deal.add   Вебхук ") == normalize_query("crm.deal.add вебхук")
@@ -0,0 +1,66 @@
+import asyncio
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.crawl import BitrixCrawler
+from bitrix24_docs_etl.storage import load_raw_metadata, persist_fetch_results, summarize_refresh
+
+from test_crawl import page
+
+
+def crawl_and_persist(site, **options):
+    known = load_raw_metadata()
+    result = asyncio.run(BitrixCrawler(site.base_url, known_pages=known, **options).crawl([None]))
+    stored = persist_fetch_results(result.iter_fetch_results())
+    return result, summarize_refresh(stored, result.gone)
+
+
+def test_recrawl_uses_validators_and_skips_unchanged_writes(docs_site):
+    docs_site.pages.update({"/": page("Home", "/a/", "/b/"), "/a/": page("A"), "/b/": page("B")})
+    docs_site.etags.update({"/": '"home-1"', "/a/": '"a-1"'})
+
+    _, first = crawl_and_persist(docs_site)
+    assert (first.new, first.changed, first.unchanged, first.gone) == (3, 0, 0, 0)
+
+    home_meta = next(storage.RAW_META_DIR.glob("*_index.json"))
+    home_mtime = home_meta.stat().st_mtime_ns
+    docs_site.requests.clear()
+    docs_site.pages["/b/"] = page("B", "updated")
+    docs_site.pages.pop("/a/")
+
+    result, second = crawl_and_persist(docs_site)
+
+    assert ("/", 304) in docs_site.requests
+    assert result.stats.not_modified == 1
+    assert (second.new, second.changed, second.unchanged, second.gone) == (0, 1, 1, 1)
+    assert home_meta.stat().st_mtime_ns == home_mtime
+
+
+def test_pages_cut_off_by_limits_are_not_gone(docs_site):
+    docs_site.pages.update({"/": page("Home", "/a/", "/b/"), "/a/": page("A"), "/b/": page("B")})
+    crawl_and_persist(docs_site)
+
+    _, limited = crawl_and_persist(docs_site, max_pages=1)
+    assert (limited.unchanged, limited.gone) == (1, 0)
+    _, shallow = crawl_and_persist(docs_site, max_depth=0)
+    assert shallow.gone == 0
+
+
+def test_not_modified_page_with_lost_html_is_refetched(docs_site):
+    docs_site.pages["/"] = page("Home")
+    docs_site.etags["/"] = '"home-1"'
+    crawl_and_persist(docs_site)
+    for blob in (storage.RAW_DIR / "blobs").glob("*/*"):
+        blob.unlink()
+
+    # Сервер отвечает 304, но HTML потерян: пустое тело не сохраняется,
+    # а валидаторы сбрасываются.
+    result, _ = crawl_and_persist(docs_site)
+    assert result.stats.not_modified == 1
+    assert not list((storage.RAW_DIR / "blobs").glob("*/*"))
+    assert storage.load_raw_meta(docs_site.base_url + "/")["etag"] is None
+
+    docs_site.requests.clear()
+    _, third = crawl_and_persist(docs_site)
+    assert docs_site.requests == [("/", 200)]
+    assert third.changed == 1
+    assert "Home" in next(storage.load_raw_documents()).html
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from bitrix24_docs_etl.crawl import BitrixCrawler
+from bitrix24_docs_etl.fetch import BitrixDocumentationFetcher
+from bitrix24_docs_etl.retry import CircuitBreaker, RetryPolicy, retry_after_seconds
+
+from test_crawl import build_site, page
+
+FAST = RetryPolicy(attempts=3, base_delay=0.01, max_delay=0.05)
+
+
+def fetch(site, path, retry=FAST, breaker=None):
+    async def run():
+        fetcher = BitrixDocumentationFetcher(site.base_url, retry=retry, breaker=breaker)
+        try:
+            return await fetcher.fetch(path), fetcher.retries
+        finally:
+            await fetcher.aclose()
+
+    return asyncio.run(run())
+
+
+def test_transient_errors_are_retried_until_success(docs_site):
+    docs_site.pages["/flaky/"] = page("Flaky")
+    docs_site.failures["/flaky/"] = [503, 502]
+
+    result, retries = fetch(docs_site, "/flaky/")
+    assert result.title == "Flaky" and retries == 2
+    assert docs_site.requests == [("/flaky/", 503), ("/flaky/", 502), ("/flaky/", 200)]
+
+    docs_site.requests.clear()
+    docs_site.failures["/flaky/"] = [500, 500, 500]
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch(docs_site, "/flaky/")
+    assert len(docs_site.requests) == 3
+
+    # 404 не временная ошибка: повторять бесполезно.
+    docs_site.requests.clear()
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch(docs_site, "/missing/")
+    assert docs_site.requests == [("/missing/", 404)]
+
+
+def test_retry_after_pauses_the_host(docs_site):
+    docs_site.pages["/busy/"] = page("Busy")
+    docs_site.failures["/busy/"] = [429]
+    docs_site.headers_by_path["/busy/"] = {"Retry-After": "0.3"}
+    breaker = CircuitBreaker()
+
+    started = time.perf_counter()
+    result, retries = fetch(docs_site, "/busy/", breaker=breaker)
+    assert result.title == "Busy" and retries == 1
+    assert time.perf_counter() - started >= 0.3 and breaker.trips == 1
+
+
+def test_huge_retry_after_is_clamped(docs_site):
+    docs_site.pages["/down/"] = page("Down")
+    docs_site.failures["/down/"] = [503]
+    docs_site.headers_by_path["/down/"] = {"Retry-After": "86400"}
+    breaker = CircuitBreaker(max_cooldown=0.2)
+    policy = RetryPolicy(attempts=2, max_retry_after=0.2)
+
+    started = time.perf_counter()
+    result, retries = fetch(docs_site, "/down/", retry=policy, breaker=breaker)
+    assert result.title == "Down" and retries == 1
+    assert time.perf_counter() - started < 5
+
+    breaker.record_failure("h", retry_after=86400)
+    assert breaker.is_open("h")
+    asyncio.run(asyncio.wait_for(breaker.wait("h"), timeout=5))
+
+
+def test_crawl_survives_transient_failures(docs_site):
+    build_site(docs_site)
+    docs_site.failures["/crm/"] = [503]
+    docs_site.failures["/tasks/"] = [503, 503, 503, 503]
+
+    result = asyncio.run(BitrixCrawler(docs_site.base_url, max_depth=1, workers=2, retry=FAST).crawl([None]))
+    assert docs_site.base_url + "crm/" in result.pages and docs_site.base_url + "tasks/" not in result.pages
+    assert result.stats.failed == 1 and result.stats.retries == 3
+
+
+def test_backoff_and_breaker_policy():
+    policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+    for attempt, ceiling in [(0, 1.0), (1, 2.0), (2, 4.0), (5, 4.0)]:
+        assert ceiling / 2 <= policy.delay(attempt) <= ceiling
+    assert policy.delay(0, retry_after=500) == policy.max_retry_after
+
+    breaker = CircuitBreaker(threshold=2, cooldown=10.0)
+    breaker.record_failure("h")
+    assert not breaker.is_open("h")
+    breaker.record_failure("h")
+    assert breaker.is_open("h") and breaker.trips == 1
+    breaker.record_success("h")
+    assert breaker.is_open("h")  # успех не отменяет уже начатую паузу
+
+    response = httpx.Response(503, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    assert retry_after_seconds(response) == 0.0
+    assert retry_after_seconds(httpx.Response(503, headers={"Retry-After": "12"})) == 12.0
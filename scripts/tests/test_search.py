@@ -0,0 +1,82 @@
+from bitrix24_docs_etl.binary_index import BinaryIndex, write_binary_index
+from bitrix24_docs_etl.index import IndexBuilder, document_metadata
+from bitrix24_docs_etl.search import open_index, parse_query, search, search_index
+from bitrix24_docs_etl.segments import update_index
+from bitrix24_docs_etl.storage import load_processed_documents
+
+from test_index_build import write_processed
+
+
+def build_corpus() -> None:
+    write_processed(
+        "crm_deal_add",
+        "crm.deal.add",
+        "# Добавить сделку\n\nМетод crm.deal.add добавляет новую сделку.\n\n## Параметры\n\n| FIELDS | object |",
+    )
+    write_processed(
+        "crm_deal_list",
+        "crm.deal.list",
+        "# Список сделок\n\nМетод возвращает список сделок по фильтру. См. [crm.deal.add](crm_deal_add.md).",
+    )
+    write_processed(
+        "events_webhooks",
+        "Вебхуки",
+        "# Входящие вебхуки\n\nВебхук позволяет вызывать методы REST без приложения.\n\nИсходящий вебхук отправляет события.",
+    )
+    write_processed("tasks_task_add", "tasks.task.add", "# Добавить задачу\n\nСоздаёт задачу для пользователя.")
+
+
+def build_in_memory():
+    builder = IndexBuilder()
+    for doc in load_processed_documents():
+        builder.add(document_metadata(doc), doc.title, doc.markdown_path.read_text(encoding="utf-8"))
+    return builder.build()
+
+
+def test_inverted_index_stores_field_frequencies_and_positions():
+    build_corpus()
+    assert update_index().added == 4
+
+    index = open_index()
+    postings = {index.document(p[0])["slug"]: p for p in index.postings("сделк")}
+    # "Добавить сделку" — подзаголовок, "сделку" в теле — ещё одно вхождение.
+    assert postings["crm_deal_add"][1:4] == [0, 1, 1]
+    assert index.postings("crm.deal.add")
+    assert "crm_deal_add.md" not in set(build_in_memory().terms())
+
+
+def test_search_ranks_with_stemming_title_boost_and_phrases():
+    build_corpus()
+    update_index()
+
+    assert [hit.slug for hit in search("вебхук")][:1] == ["events_webhooks"]
+    assert search("crm.deal.add")[0].slug == "crm_deal_add"
+    assert search("сделки")[0].slug in {"crm_deal_add", "crm_deal_list"}
+    assert [hit.slug for hit in search('"добавляет новую сделку"')] == ["crm_deal_add"]
+    assert search("несуществующее") == []
+    assert parse_query('"Список сделок" crm').phrases == [["список", "сделок"]]
+
+
+def test_phrase_with_dotted_method_name():
+    build_corpus()
+    update_index()
+
+    assert parse_query('"метод crm.deal.add"').phrases == [["метод", "crm.deal.add"]]
+    assert [hit.slug for hit in search('"crm.deal.add добавляет"')] == ["crm_deal_add"]
+    assert [hit.slug for hit in search('"метод crm.deal.add"')] == ["crm_deal_add"]
+
+
+def test_binary_index_matches_json_index(tmp_path):
+    build_corpus()
+    json_index = build_in_memory()
+
+    with BinaryIndex(write_binary_index(json_index, tmp_path / "index.bin")) as binary:
+        assert binary.doc_count == json_index.doc_count
+        assert sorted(binary.terms()) == sorted(json_index.terms())
+        for term in json_index.terms():
+            assert binary.postings(term) == json_index.postings(term)
+            assert [p[:4] for p in binary.postings(term, positions=False)] == [p[:4] for p in json_index.postings(term)]
+        assert binary.postings("отсутствует") == ()
+        assert binary.avg_field_lengths == json_index.avg_field_lengths
+        for query in ("сделка", "вебхук", '"добавляет новую сделку"', "tasks.task.add"):
+            assert search_index(binary, query) == search_index(json_index, query)
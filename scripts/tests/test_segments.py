@@ -0,0 +1,117 @@
+import gc
+import json
+import os
+
+import pytest
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.search import open_index, search
+from bitrix24_docs_etl.segments import SegmentedIndex, load_manifest, update_index
+
+from test_index_build import write_processed
+
+
+def remove_processed(slug: str) -> None:
+    (storage.PROCESSED_MARKDOWN_DIR / f"{slug}.md").unlink()
+    (storage.PROCESSED_META_DIR / f"{slug}.json").unlink()
+
+
+def test_update_index_touches_only_changed_documents():
+    write_processed("crm_deal_add", "crm.deal.add", "Метод добавляет сделку")
+    write_processed("crm_lead_add", "crm.lead.add", "Метод добавляет лид")
+    write_processed("tasks_task_add", "tasks.task.add", "Метод добавляет задачу")
+
+    first = update_index()
+    assert (first.added, first.segments, first.generation) == (3, 1, 1)
+    assert update_index().generation == 1, "повторный запуск без изменений не меняет индекс"
+
+    write_processed("crm_lead_add", "crm.lead.add", "Метод создаёт лид через вебхук")
+    write_processed("user_get", "user.get", "Возвращает пользователя")
+    remove_processed("tasks_task_add")
+    # Файл переписан тем же содержимым: mtime другой, хэш прежний.
+    write_processed("crm_deal_add", "crm.deal.add", "Метод добавляет сделку")
+    os.utime(storage.PROCESSED_MARKDOWN_DIR / "crm_deal_add.md", ns=(1, 1))
+
+    second = update_index(merge_max_segments=8)
+    assert (second.added, second.changed, second.deleted, second.unchanged) == (1, 1, 1, 1)
+    # Удалено 2 из 5 документов в сегментах — выше порога, сегменты слиты.
+    assert second.merged and second.segments == 1
+
+    assert [hit.slug for hit in search("вебхук")] == ["crm_lead_add"]
+    assert {hit.slug for hit in search("добавляет")} == {"crm_deal_add"}
+    assert open_index().doc_count == 3
+
+
+def test_update_index_merges_segments_and_full_rebuild():
+    for number in range(3):
+        write_processed(f"doc_{number}", f"Документ {number}", f"Текст документа номер {number}")
+        update_index(merge_max_segments=2)
+
+    manifest = load_manifest()
+    assert len(manifest["segments"]) == 1, "третий сегмент должен был вызвать слияние"
+    assert sorted(hit.slug for hit in search("документ")) == ["doc_0", "doc_1", "doc_2"]
+
+    rebuilt = update_index(full=True)
+    assert (rebuilt.added, rebuilt.segments) == (3, 1)
+    assert len(list((storage.INDEX_DIR / "segments").glob("seg_*.bin"))) == 1
+
+
+def test_metadata_only_change_reaches_the_index():
+    write_processed("crm_deal_add", "crm.deal.add", "Метод добавляет сделку")
+    update_index()
+
+    meta_path = storage.PROCESSED_META_DIR / "crm_deal_add.json"
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    meta_path.write_text(json.dumps({**meta, "title": "Создание сделки"}, ensure_ascii=False), encoding="utf-8")
+
+    stats = update_index()
+    assert (stats.changed, stats.unchanged) == (1, 0)
+    assert [hit.title for hit in search("создание")] == ["Создание сделки"]
+
+
+def test_document_without_metadata_leaves_the_index():
+    write_processed("crm_deal_add", "crm.deal.add", "Метод добавляет сделку")
+    write_processed("tasks_task_add", "tasks.task.add", "Метод добавляет задачу")
+    update_index()
+
+    (storage.PROCESSED_META_DIR / "crm_deal_add.json").unlink()
+    stats = update_index()
+    assert (stats.deleted, stats.unchanged) == (1, 1)
+    assert "crm_deal_add" not in load_manifest()["documents"]
+    assert [hit.slug for hit in search("добавляет")] == ["tasks_task_add"]
+
+
+def test_average_field_lengths_skip_deleted_documents():
+    for number in range(4):
+        write_processed(f"doc_{number}", f"Документ {number}", f"# Раздел\n\nКороткий текст {number}")
+    write_processed("long_doc", "Длинный", "# Раздел\n\n" + "слово " * 500)
+    update_index()
+    write_processed("long_doc", "Длинный", "# Раздел\n\nТеперь короткий")
+    assert not update_index(merge_max_segments=8).merged
+
+    index = SegmentedIndex()
+    incremental = index.avg_field_lengths
+    index.close()
+    update_index(full=True)
+    rebuilt = SegmentedIndex()
+    assert rebuilt.avg_field_lengths == pytest.approx(incremental)
+    rebuilt.close()
+
+
+def test_previous_index_generation_is_closed():
+    write_processed("crm_deal_add", "crm.deal.add", "Метод добавляет сделку")
+    update_index()
+    old = open_index()
+    assert open_index() is old
+    old_file = old._segments[0]._file
+
+    write_processed("user_get", "user.get", "Возвращает пользователя")
+    update_index()
+    new = open_index()
+    assert new is not old and new.doc_count == 2
+    # Пока прежнее поколение используется, оно открыто; потом закрывается.
+    assert not old_file.closed and old.doc_count == 1
+    del old
+    gc.collect()
+    assert old_file.closed
+    assert [hit.slug for hit in search("пользователя")] == ["user_get"]
@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.segments import update_index
+from bitrix24_docs_etl.serve import SearchService, start_server
+
+from test_hybrid import build_corpus
+from test_index_build import write_processed
+
+
+async def request(reader, writer, target: str, method: str = "GET", body: bytes = b"", close: bool = False):
+    headers = f"{method} {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n"
+    if close:
+        headers += "Connection: close\r\n"
+    writer.write(headers.encode("latin-1") + b"\r\n" + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    response_headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(response_headers["content-length"]))
+    return int(status_line.split()[1]), response_headers, json.loads(payload)
+
+
+def run_with_server(scenario):
+    async def main():
+        service = SearchService(workers=2, default_mode="lexical")
+        server = await start_server(service, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await scenario(port)
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+
+    return asyncio.run(main())
+
+
+def test_search_and_fetch_share_one_keep_alive_connection():
+    build_corpus()
+
+    async def scenario(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, headers, found = await request(reader, writer, "/search?q=%D1%81%D1%82%D0%B0%D0%B4%D0%B8%D1%8F&section=tasks")
+        assert status == 200 and headers["connection"] == "keep-alive"
+        assert [result["slug"] for result in found["results"]] == ["api-reference_tasks_tasks-task-add"]
+        assert found["results"][0]["title"] == "tasks.task.add" and "стадия" in found["results"][0]["snippet"]
+        assert "lexical" in found["timings_ms"]
+
+        body = json.dumps({"query": "список сделок", "limit": 1}).encode("utf-8")
+        status, _, posted = await request(reader, writer, "/search", method="POST", body=body)
+        assert status == 200 and posted["results"][0]["slug"] == "api-reference_crm_deals_crm-deal-list"
+
+        status, _, document = await request(reader, writer, "/fetch?id=api-reference/user/user-get.md")
+        assert status == 200 and document["slug"] == "api-reference_user_user-get"
+        assert document["content"].startswith("# Получить пользователя")
+
+        status, headers, missing = await request(reader, writer, "/fetch?id=nope", close=True)
+        assert status == 404 and "error" in missing and headers["connection"] == "close"
+        assert await reader.read() == b""
+        writer.close()
+
+    run_with_server(scenario)
+
+
+def test_concurrent_clients_are_counted_in_latency_stats():
+    build_corpus()
+
+    async def client(port, queries):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        statuses = [(await request(reader, writer, f"/search?q={query}"))[0] for query in queries]
+        writer.close()
+        return statuses
+
+    async def scenario(port):
+        results = await asyncio.gather(*(client(port, ["crm.deal.add", "user.get", ""]) for _ in range(5)))
+        assert all(statuses == [200, 200, 400] for statuses in results)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        status, _, stats = await request(reader, writer, "/stats", close=True)
+        writer.close()
+        return stats
+
+    stats = run_with_server(scenario)
+    assert stats["requests"] == 15 and stats["errors"] == 0
+    assert 0 < stats["p50_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+
+
+def test_repeated_search_is_cached_until_index_rebuild():
+    build_corpus()
+
+    async def scenario(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        _, _, first = await request(reader, writer, "/search?q=crm.deal.add")
+        _, _, second = await request(reader, writer, "/search?q=%20CRM.deal.add")
+        assert (first["cached"], second["cached"]) == (False, True)
+        assert second["results"] == first["results"] and set(second["timings_ms"]) == {"cache"}
+
+        write_processed("api-reference_crm_deals_crm-deal-add", "crm.deal.add", "# Добавить сделку\n\nНовый текст")
+        update_index()
+        _, _, rebuilt = await request(reader, writer, "/search?q=crm.deal.add")
+        assert rebuilt["cached"] is False and "Новый текст" in rebuilt["results"][0]["snippet"]
+
+        _, _, stats = await request(reader, writer, "/stats", close=True)
+        writer.close()
+        return stats["cache"]
+
+    cache = run_with_server(scenario)
+    assert (cache["hits"], cache["misses"], cache["invalidations"]) == (1, 2, 1)
+
+
+def test_fetch_rejects_paths_outside_processed():
+    build_corpus()
+    (storage.PROCESSED_DIR / "secret.json").write_text('{"slug": "secret", "url": "x", "title": "x"}', encoding="utf-8")
+
+    async def scenario(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for identifier in ("../secret", "..%2Fsecret", "..%5Csecret", "api-reference/../../secret.md", "https://example.com/../secret"):
+            status, _, body = await request(reader, writer, f"/fetch?id={identifier}")
+            assert status == 400 and "error" in body, identifier
+        status, _, _ = await request(reader, writer, "/fetch?id=api-reference_user_user-get", close=True)
+        assert status == 200
+        writer.close()
+
+    run_with_server(scenario)
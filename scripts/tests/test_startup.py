@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+# Тяжёлые зависимости, которые не должны загружаться ради --help и index.
+HEAVY_MODULES = ("httpx", "bs4", "lxml", "markdownify", "rich", "numpy", "asyncio", "http.server")
+# Бюджет на импорт CLI в долях импорта click из того же процесса (по
+# -X importtime): так проверка не зависит от скорости машины. Сейчас CLI
+# вместе с click — около 4.5 click, httpx + bs4 + rich добавили бы ещё ~12.
+IMPORT_BUDGET_CLICKS = 10
+
+
+def run_python(code, tmp_path, *flags):
+    env = {**os.environ, "BITRIX24_DOCS_DATA_DIR": str(tmp_path)}
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code], env=env, check=True, capture_output=True, text=True
+    )
+
+
+def loaded_after(command, tmp_path):
+    code = (
+        "import json, sys\n"
+        "from bitrix24_docs_etl.cli import cli\n"
+        f"cli.main({command!r}, standalone_mode=False)\n"
+        "print(json.dumps(sorted(sys.modules)))\n"
+    )
+    return set(json.loads(run_python(code, tmp_path).stdout.splitlines()[-1]))
+
+
+def heavy(modules, allowed=()):
+    names = set(HEAVY_MODULES) - set(allowed)
+    return sorted(name for name in modules if name.split(".")[0] in names or name in names)
+
+
+def test_help_and_index_do_not_load_heavy_dependencies(tmp_path):
+    assert heavy(loaded_after(["--help"], tmp_path)) == []
+    # rich загружается только для вывода итогов команды.
+    assert heavy(loaded_after(["index"], tmp_path), allowed=("rich",)) == []
+    assert (tmp_path / "index" / "simple_index.json").exists()
+
+
+def test_cli_import_time_within_budget(tmp_path):
+    stderr = run_python("import bitrix24_docs_etl.cli", tmp_path, "-X", "importtime").stderr
+    # Строки вида "import time: self | cumulative | module", время в мкс.
+    cumulative = {
+        parts[2].strip(): int(parts[1])
+        for line in stderr.splitlines()
+        if line.startswith("import time:") and (parts := line[len("import time:") :].split("|"))[1].strip().isdigit()
+    }
+    # Главная проверка — отсутствие тяжёлых модулей; время лишь грубая страховка.
+    assert not heavy(cumulative)
+    assert cumulative["bitrix24_docs_etl.cli"] < IMPORT_BUDGET_CLICKS * cumulative["click"]
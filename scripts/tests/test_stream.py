@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import pytest
+from click.testing import CliRunner
+
+import bitrix24_docs_etl.storage as storage
+from bitrix24_docs_etl.cli import cli
+from bitrix24_docs_etl.chunk import chunk_all
+from bitrix24_docs_etl.crawl import BitrixCrawler
+from bitrix24_docs_etl.normalize import normalize_all
+from bitrix24_docs_etl.search import search
+from bitrix24_docs_etl.segments import load_manifest
+from bitrix24_docs_etl.stream import run_stream
+
+from test_crawl import build_site, page
+
+
+def stream(site, **options):
+    crawler = BitrixCrawler(site.base_url, max_depth=2, workers=2, known_pages=storage.load_raw_metadata())
+    return asyncio.run(run_stream(crawler, **options))
+
+
+def test_stream_matches_batch_pipeline_and_bounds_queues(docs_site):
+    build_site(docs_site)
+    manifest_path = storage.DATA_DIR / "raw" / "manifest.json"
+
+    stats = stream(docs_site, manifest_path=manifest_path, queue_size=1, flush_docs=2, normalize_workers=2)
+    assert (stats.crawl.fetched, stats.persisted, stats.normalized) == (5, 5, 5)
+    assert stats.refresh.new == 5 and stats.chunks.chunked == 5
+    assert stats.index is not None and stats.index.added == 5 and len(load_manifest()["segments"]) == 3
+    assert max(stats.peak_queue.values()) <= 1
+    assert {entry["url"] for entry in json.loads(manifest_path.read_text(encoding="utf-8"))} == {
+        docs_site.base_url + path for path in ("", "crm/", "tasks/", "crm/deal/", "tasks/add/")
+    }
+    assert search("Deal")[0].title == "Deal"
+
+    # Пакетные этапы после потокового прохода ничего не переделывают.
+    assert normalize_all().processed == 0 and chunk_all().chunked == 0
+
+
+def test_repeated_stream_skips_unchanged_pages(docs_site):
+    build_site(docs_site)
+    stream(docs_site)
+    docs_site.pages["/tasks/add/"] = page("Task create", "/crm/")
+
+    again = stream(docs_site)
+    assert (again.refresh.new, again.refresh.changed, again.refresh.unchanged) == (0, 1, 4)
+    assert again.normalized == 1 and again.chunks.chunked == 1
+    assert (again.index.changed, again.index.unchanged) == (1, 4)
+    assert [hit.title for hit in search("create")] == ["Task create"]
+
+
+def test_queue_size_must_be_positive(docs_site):
+    with pytest.raises(ValueError):
+        asyncio.run(run_stream(BitrixCrawler(docs_site.base_url), queue_size=0))
+    result = CliRunner().invoke(cli, ["pipeline", "--stream", "--queue-size", "0"])
+    assert result.exit_code == 2 and "--queue-size" in result.output
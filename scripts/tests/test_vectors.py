@@ -0,0 +1,95 @@
+import json
+import os
+import weakref
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from bitrix24_docs_etl import vectors
+from bitrix24_docs_etl.chunk import chunk_all
+from bitrix24_docs_etl.vectors import HashingEmbedder, VectorIndex, build_vector_index, write_vector_index
+
+from test_index_build import write_processed
+
+
+def test_vector_index_finds_sections_and_reuses_cached_embeddings():
+    write_processed("crm_deal_add", "crm.deal.add", "# Добавить сделку\n\n## Параметры\n\nПоля сделки и стадии воронки")
+    write_processed("tasks_task_add", "tasks.task.add", "# Добавить задачу\n\n## Параметры\n\nОтветственный и срок задачи")
+    write_processed("user_get", "user.get", "# Получить пользователя\n\nВозвращает список сотрудников портала")
+    chunk_all()
+
+    first = build_vector_index(dtype="int8")
+    assert (first.units, first.embedded, first.cached, first.nlist) == (5, 5, 0, 0)
+
+    hits = VectorIndex().search("срок задачи ответственный", limit=2)
+    assert hits[0].id == "tasks_task_add#параметры" and hits[0].heading == "Параметры"
+
+    write_processed("user_get", "user.get", "# Получить пользователя\n\nВозвращает сотрудника по идентификатору")
+    chunk_all()
+    second = build_vector_index()
+    assert (second.embedded, second.cached) == (1, 4)
+    assert VectorIndex().search("сотрудник идентификатор", limit=1)[0].slug == "user_get"
+
+
+def test_ivf_search_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(20, 32))
+    vectors = (centers[rng.integers(0, 20, 3000)] + rng.normal(scale=0.3, size=(3000, 32))).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    records = [{"id": str(row), "slug": str(row), "url": "", "title": None, "heading": None, "key": str(row)} for row in range(3000)]
+
+    assert write_vector_index(tmp_path / "ivf", records, vectors, "test", nlist=30) == 30
+    write_vector_index(tmp_path / "flat", records, vectors, "test", nlist=0)
+    ivf, flat = VectorIndex(tmp_path / "ivf"), VectorIndex(tmp_path / "flat")
+
+    recall = []
+    for query in vectors[:50]:
+        exact = {flat.units[row]["id"] for row, _ in flat.nearest(query, 10)}
+        approx = {ivf.units[row]["id"] for row, _ in ivf.nearest(query, 10, nprobe=6)}
+        recall.append(len(exact & approx) / 10)
+    assert np.mean(recall) > 0.9
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = HashingEmbedder(dim=64)
+    first, second = embedder.embed(["crm.deal.add добавляет сделку", ""]), embedder.embed(["crm.deal.add добавляет сделку"])
+    assert np.allclose(first[0], second[0])
+    assert np.linalg.norm(first[0]) == pytest.approx(1.0, abs=1e-5) and not first[1].any()
+
+
+def test_rebuild_keeps_open_index_consistent_and_rejects_mismatched_cache():
+    write_processed("crm_deal_add", "crm.deal.add", "# Добавить сделку\n\nПоля сделки")
+    write_processed("user_get", "user.get", "# Получить пользователя\n\nСписок сотрудников")
+    build_vector_index(use_chunks=False)
+    opened = VectorIndex()
+
+    write_processed("tasks_task_add", "tasks.task.add", "# Добавить задачу\n\nСрок задачи")
+    assert build_vector_index(use_chunks=False).cached == 2
+    # Открытый индекс читает свою сборку, даже если units.json загружается после пересборки.
+    assert len(opened.units) == opened.count == 2
+    assert VectorIndex().count == 3
+
+    build_vector_index(use_chunks=False)
+    assert sorted(path.name for path in vectors.VECTORS_DIR.iterdir()) == ["build_000002", "build_000003", "manifest.json"]
+
+    # Ключи не от тех векторов кэш не дают: эмбеддинги считаются заново.
+    manifest = json.loads((vectors.VECTORS_DIR / "manifest.json").read_text(encoding="utf-8"))
+    units = json.loads((vectors.VECTORS_DIR / manifest["build"] / "units.json").read_text(encoding="utf-8"))
+    (vectors.VECTORS_DIR / manifest["build"] / "units.json").write_text(json.dumps(units[:2]), encoding="utf-8")
+    assert build_vector_index(use_chunks=False).cached == 0
+
+
+def test_open_vector_index_keeps_only_current_generation():
+    write_processed("crm_deal_add", "crm.deal.add", "# Добавить сделку\n\nПоля сделки")
+    build_vector_index(use_chunks=False)
+    old = vectors.open_vector_index()
+    assert vectors.open_vector_index() is old
+    released = weakref.ref(old)
+
+    write_processed("user_get", "user.get", "# Получить пользователя\n\nСписок сотрудников")
+    build_vector_index(use_chunks=False)
+    os.utime(vectors.VECTORS_DIR / "manifest.json", ns=(1, 1))  # mtime точно отличается от прежнего
+    del old
+    current = vectors.open_vector_index()
+    assert current.count == 2 and released() is None